@@ -0,0 +1,127 @@
+"""
+Micro-benchmark do utils/database.py: operações por segundo do padrão antigo
+(uma conexão nova + commit em modo rollback-journal a cada chamada) contra o
+gerenciador de conexões atual (conexão persistente por thread, WAL, pragmas
+e executemany).
+
+Uso (a partir da raiz do projeto):
+    python benchmarks/bench_database.py --n 2000
+"""
+import os
+import sys
+import time
+import sqlite3
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from utils import database  # noqa: E402
+
+
+# ---------- Implementação antiga (referência) ----------
+
+def _antigo_conectar(caminho):
+    return sqlite3.connect(caminho)
+
+def _antigo_insert_user(caminho, nome, data_nascimento, cpf, imagem_facial):
+    conn = _antigo_conectar(caminho)
+    cursor = conn.cursor()
+    cursor.execute('INSERT INTO usuarios (nome, data_nascimento, cpf, imagem_facial) VALUES (?, ?, ?, ?)',
+                   (nome, data_nascimento, cpf, imagem_facial))
+    conn.commit()
+    conn.close()
+
+def _antigo_get_user_by_cpf(caminho, cpf):
+    conn = _antigo_conectar(caminho)
+    cursor = conn.cursor()
+    cursor.execute('SELECT * FROM usuarios WHERE cpf = ?', (cpf,))
+    user = cursor.fetchone()
+    conn.close()
+    return user
+
+def _antigo_update_user(caminho, cpf, nome=None, data_nascimento=None, imagem_facial=None):
+    conn = _antigo_conectar(caminho)
+    cursor = conn.cursor()
+    if nome:
+        cursor.execute('UPDATE usuarios SET nome = ? WHERE cpf = ?', (nome, cpf))
+    if data_nascimento:
+        cursor.execute('UPDATE usuarios SET data_nascimento = ? WHERE cpf = ?', (data_nascimento, cpf))
+    if imagem_facial:
+        cursor.execute('UPDATE usuarios SET imagem_facial = ? WHERE cpf = ?', (imagem_facial, cpf))
+    conn.commit()
+    conn.close()
+
+def _antigo_insert_login(caminho, cpf, nome, acuracia, data_hora):
+    conn = _antigo_conectar(caminho)
+    cursor = conn.cursor()
+    cursor.execute('INSERT INTO logins (cpf, nome, acuracia, data_hora) VALUES (?, ?, ?, ?)',
+                   (cpf, nome, acuracia, data_hora))
+    conn.commit()
+    conn.close()
+
+def _criar_tabelas(caminho):
+    conn = sqlite3.connect(caminho)
+    conn.execute('CREATE TABLE usuarios (id INTEGER PRIMARY KEY AUTOINCREMENT, nome TEXT NOT NULL, '
+                 'data_nascimento TEXT NOT NULL, cpf TEXT NOT NULL UNIQUE, imagem_facial TEXT NOT NULL)')
+    conn.execute('CREATE TABLE logins (id INTEGER PRIMARY KEY AUTOINCREMENT, cpf TEXT NOT NULL, '
+                 'nome TEXT, acuracia INTEGER, data_hora TEXT NOT NULL)')
+    conn.commit()
+    conn.close()
+
+
+# ---------- Medição ----------
+
+def _medir(funcao, n):
+    inicio = time.perf_counter()
+    for i in range(n):
+        funcao(i)
+    return n / (time.perf_counter() - inicio)
+
+def _cpf(i):
+    return f"{i:011d}"
+
+def rodar(n):
+    """Retorna {operação: (ops/s antes, ops/s depois)}."""
+    resultados = {}
+    with tempfile.TemporaryDirectory() as pasta:
+        antigo = os.path.join(pasta, "antigo.db")
+        novo = os.path.join(pasta, "novo.db")
+        _criar_tabelas(antigo)
+        database.DATABASE_PATH = novo
+        database.create_user_table()
+        database.create_login_table()
+
+        resultados["insert_user"] = (
+            _medir(lambda i: _antigo_insert_user(antigo, "Nome", "01/01/1990", _cpf(i), "a.jpg"), n),
+            _medir(lambda i: database.insert_user("Nome", "01/01/1990", _cpf(i), "a.jpg"), n),
+        )
+        resultados["get_user_by_cpf"] = (
+            _medir(lambda i: _antigo_get_user_by_cpf(antigo, _cpf(i)), n),
+            _medir(lambda i: database.get_user_by_cpf(_cpf(i)), n),
+        )
+        resultados["update_user (3 campos)"] = (
+            _medir(lambda i: _antigo_update_user(antigo, _cpf(i), "Outro", "02/02/1990", "b.jpg"), n),
+            _medir(lambda i: database.update_user(_cpf(i), "Outro", "02/02/1990", "b.jpg"), n),
+        )
+        resultados["insert_login"] = (
+            _medir(lambda i: _antigo_insert_login(antigo, _cpf(i), "Nome", 90, "01/01/2024 08:00:00"), n),
+            _medir(lambda i: database.insert_login(_cpf(i), "Nome", 90, "01/01/2024 08:00:00"), n),
+        )
+
+        # executemany: uma transação para n logins
+        inicio = time.perf_counter()
+        database.insert_logins_bulk([(_cpf(i), "Nome", 90, "01/01/2024 08:00:00") for i in range(n)])
+        resultados["insert_logins_bulk"] = (resultados["insert_login"][0], n / (time.perf_counter() - inicio))
+        database.close_connection()
+    return resultados
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ops/s do banco: padrão antigo x gerenciador de conexões.")
+    parser.add_argument("--n", type=int, default=2000, help="Operações por medição")
+    args = parser.parse_args()
+
+    print(f"{'operação':<24} {'antes (ops/s)':>14} {'depois (ops/s)':>15} {'ganho':>7}")
+    for operacao, (antes, depois) in rodar(args.n).items():
+        print(f"{operacao:<24} {antes:>14.0f} {depois:>15.0f} {depois / antes:>6.1f}x")
@@ -0,0 +1,275 @@
+"""
+Suíte de benchmarks reprodutível do cadastro, da identificação e do banco.
+Não precisa de webcam nem de GPU: a galeria (embeddings unitários aleatórios
+com ruído por usuário) e os rostos (desenhos sintéticos 224x224) são gerados
+com semente fixa, e tudo roda numa pasta temporária (faces/ e cadastro.db).
+
+Por padrão o ArcFace é trocado por uma rede falsa (projeção aleatória fixa
+da imagem reduzida), o que mede só o custo do código Python/NumPy em volta
+do modelo. Com --modelo arcface a rede real do DeepFace é usada.
+
+Uso (a partir da raiz do projeto):
+    python benchmarks/bench_suite.py --usuarios 2000 --saida antes.json
+    python benchmarks/bench_suite.py --usuarios 2000 --saida depois.json
+    python benchmarks/bench_suite.py --comparar antes.json depois.json
+
+A comparação usa a mediana de cada medição e as tolerâncias de
+benchmarks/limites.json; o código de saída é 1 se houver regressão.
+"""
+import io
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+import contextlib
+
+import numpy as np
+import cv2
+
+RAIZ = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(RAIZ, "..", "src"))
+
+from utils import database, modelo, cache_embeddings  # noqa: E402
+from utils.armazem_embeddings import ArmazemEmbeddings  # noqa: E402
+from utils.galeria import GaleriaFacial, ServicoGaleria  # noqa: E402
+from utils.indice_ivf import gerar_embeddings_sinteticos, gerar_consultas  # noqa: E402
+
+VERSAO_FORMATO = 1
+ARQUIVO_LIMITES = os.path.join(RAIZ, "limites.json")
+
+
+# ---------- Modelo falso ----------
+
+class RedeFalsa:
+    """
+    Substitui a rede Keras do ArcFace: projeção aleatória fixa da entrada
+    reduzida para 512 dimensões. A mesma imagem gera sempre o mesmo embedding.
+    """
+
+    def __init__(self, dim=512, passo=8, semente=0):
+        self.passo = passo
+        altura, largura = modelo.TAMANHO_ENTRADA
+        entrada = len(range(0, altura, passo)) * len(range(0, largura, passo)) * 3
+        self.projecao = np.random.default_rng(semente).normal(size=(entrada, dim)).astype(np.float32)
+
+    def predict_on_batch(self, entradas):
+        reduzidas = np.asarray(entradas, dtype=np.float32)[:, ::self.passo, ::self.passo, :]
+        return reduzidas.reshape(len(reduzidas), -1) @ self.projecao
+
+
+def usar_modelo_falso():
+    """Faz gerar_embeddings_lote (e tudo que usa o modelo em lote) usar a RedeFalsa."""
+    modelo._rede = RedeFalsa()
+    modelo._pronto.set()
+
+
+# ---------- Dados sintéticos ----------
+
+def gerar_rosto(rng, lado=224):
+    """Desenho de rosto (elipse, olhos, boca) com tom de pele e ruído aleatórios."""
+    imagem = np.full((lado, lado, 3), rng.integers(20, 80), dtype=np.uint8)
+    centro = (lado // 2 + int(rng.integers(-10, 11)), lado // 2 + int(rng.integers(-10, 11)))
+    pele = tuple(int(c) for c in rng.integers(90, 230, size=3))
+    cv2.ellipse(imagem, centro, (int(lado * 0.3), int(lado * 0.4)), 0, 0, 360, pele, -1)
+    for lado_olho in (-1, 1):
+        olho = (centro[0] + lado_olho * int(lado * 0.12), centro[1] - int(lado * 0.08))
+        cv2.circle(imagem, olho, int(lado * 0.04), (40, 40, 40), -1)
+    cv2.ellipse(imagem, (centro[0], centro[1] + int(lado * 0.18)), (int(lado * 0.1), int(lado * 0.04)),
+                0, 0, 180, (60, 40, 120), -1)
+    ruido = rng.normal(0, 6, size=imagem.shape)
+    return np.clip(imagem + ruido, 0, 255).astype(np.uint8)
+
+
+def _cpf(i):
+    return f"{i:011d}"
+
+
+def popular_galeria(n_usuarios, por_usuario=8):
+    """Grava no armazém de faces/ a galeria sintética; retorna a matriz gerada."""
+    embeddings, cpfs, _ = gerar_embeddings_sinteticos(n_usuarios, por_usuario=por_usuario)
+    armazem = ArmazemEmbeddings("faces")
+    for inicio in range(0, n_usuarios, 1000):
+        fim = min(n_usuarios, inicio + 1000)
+        armazem.substituir_varios([(_cpf(i), embeddings[i * por_usuario:(i + 1) * por_usuario])
+                                   for i in range(inicio, fim)])
+    return embeddings, cpfs
+
+
+# ---------- Medição ----------
+
+def medir(funcao, repeticoes, aquecimento=1):
+    """
+    Chama funcao(i) `repeticoes` vezes e devolve as estatísticas em ms.
+    As `aquecimento` primeiras chamadas não entram na conta.
+    """
+    for i in range(aquecimento):
+        funcao(-1 - i)
+    tempos = []
+    for i in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao(i)
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    tempos = np.asarray(tempos)
+    return {
+        "n": int(repeticoes),
+        "mediana_ms": float(np.median(tempos)),
+        "p95_ms": float(np.percentile(tempos, 95)),
+        "media_ms": float(tempos.mean()),
+        "min_ms": float(tempos.min()),
+    }
+
+
+def rodar(n_usuarios=1000, repeticoes=50, modelo_real=False, semente=0):
+    """Executa todas as medições numa pasta temporária. Retorna {nome: estatísticas}."""
+    if not modelo_real:
+        usar_modelo_falso()
+    import cadastro  # depois do modelo falso: importa o tkinter e o detector
+
+    rng = np.random.default_rng(semente)
+    rostos = [gerar_rosto(rng) for _ in range(8)]
+    resultados = {}
+    diretorio_original = os.getcwd()
+    with tempfile.TemporaryDirectory() as pasta:
+        os.chdir(pasta)
+        try:
+            database.DATABASE_PATH = os.path.join(pasta, "cadastro.db")
+            database.create_user_table()
+            database.create_login_table()
+            popular_galeria(n_usuarios)
+
+            # ---------- Modelo / cadastro ----------
+            resultados["gerar_embeddings_lote (8 rostos)"] = medir(
+                lambda i: modelo.gerar_embeddings_lote(rostos, usar_cache=False), repeticoes)
+            resultados["embeddings do cache (8 rostos)"] = medir(
+                lambda i: modelo.gerar_embeddings_lote(rostos), repeticoes)
+            base_cpf = 10 ** 10
+            # salvar_embeddings imprime a vazão a cada chamada: a saída vai para um buffer
+            with contextlib.redirect_stdout(io.StringIO()):
+                resultados["salvar_embeddings (8 rostos)"] = medir(
+                    lambda i: cadastro.salvar_embeddings(rostos, _cpf(base_cpf + i)), repeticoes)
+                resultados["Cadastro.cadastrar_usuario (4 rostos)"] = medir(
+                    lambda i: cadastro.Cadastro("Usuário Teste", "01/01/1990", _cpf(2 * base_cpf + i + 1),
+                                                rostos[:4]).cadastrar_usuario(), repeticoes)
+
+            # ---------- Galeria ----------
+            resultados["carregar_galeria (+1a busca)"] = medir(
+                lambda i: GaleriaFacial.carregar_de_pasta("faces").buscar(rng.normal(size=512)),
+                max(3, repeticoes // 10))
+            galeria = GaleriaFacial.carregar_de_pasta("faces")
+            consultas = gerar_consultas(galeria, max(repeticoes, 2))
+            resultados["busca 1:N (buscar)"] = medir(
+                lambda i: galeria.buscar(consultas[i % len(consultas)]), repeticoes)
+            resultados["busca 1:N (buscar_top_k 5)"] = medir(
+                lambda i: galeria.buscar_top_k(consultas[i % len(consultas)], 5), repeticoes)
+            from motor_reconhecimento import MotorReconhecimento
+            motor = MotorReconhecimento(galeria=ServicoGaleria("faces"))
+            resultados["motor.identificar_embedding"] = medir(
+                lambda i: motor.identificar_embedding(consultas[i % len(consultas)]), repeticoes)
+            resultados["verificacao 1:1 (verificar)"] = medir(
+                lambda i: galeria.verificar(consultas[i % len(consultas)], _cpf(i % n_usuarios)), repeticoes)
+
+            # ---------- Banco ----------
+            n_banco = repeticoes * 4
+            base_banco = 3 * base_cpf
+            resultados["database.insert_user"] = medir(
+                lambda i: database.insert_user("Nome", "01/01/1990", _cpf(base_banco + i + 1), "a.jpg"),
+                n_banco)
+            resultados["database.get_user_by_cpf"] = medir(
+                lambda i: database.get_user_by_cpf(_cpf(base_banco + i % n_banco + 1)), n_banco)
+            resultados["database.update_user"] = medir(
+                lambda i: database.update_user(_cpf(base_banco + i % n_banco + 1), nome="Outro"), n_banco)
+            resultados["database.get_all_users"] = medir(lambda i: database.get_all_users(), repeticoes)
+            resultados["database.insert_login"] = medir(
+                lambda i: database.insert_login(_cpf(i % n_usuarios), "Nome", 90, "01/01/2024 08:00:00"),
+                n_banco)
+            resultados["database.delete_user"] = medir(
+                lambda i: database.delete_user(_cpf(base_banco + i + 1)), repeticoes, aquecimento=0)
+            database.close_connection()
+        finally:
+            # O cache de embeddings do processo aponta para a pasta temporária
+            if cache_embeddings._cache is not None:
+                cache_embeddings._cache.fechar()
+                cache_embeddings._cache = None
+            os.chdir(diretorio_original)
+    return resultados
+
+
+def gerar_relatorio(resultados, parametros):
+    """Monta o documento JSON (resultados + ambiente) de uma execução."""
+    return {
+        "formato": VERSAO_FORMATO,
+        "data": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "ambiente": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "opencv": cv2.__version__,
+            "plataforma": platform.platform(),
+            "processador": platform.processor() or platform.machine(),
+        },
+        "parametros": parametros,
+        "resultados": resultados,
+    }
+
+
+# ---------- Comparação entre execuções ----------
+
+def carregar_limites(caminho=ARQUIVO_LIMITES):
+    """Tolerâncias de regressão: {"padrao": 0.15, "por_medicao": {nome: tolerância}}."""
+    if not os.path.exists(caminho):
+        return {"padrao": 0.15, "por_medicao": {}}
+    with open(caminho, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def comparar(base, novo, limites):
+    """
+    Compara a mediana de cada medição presente nas duas execuções.
+    Retorna uma lista de (nome, mediana base, mediana nova, razão, regressão?).
+    """
+    linhas = []
+    for nome, estatisticas in novo["resultados"].items():
+        if nome not in base["resultados"]:
+            continue
+        antes = base["resultados"][nome]["mediana_ms"]
+        depois = estatisticas["mediana_ms"]
+        razao = depois / antes if antes > 0 else float("inf")
+        tolerancia = limites.get("por_medicao", {}).get(nome, limites.get("padrao", 0.15))
+        linhas.append((nome, antes, depois, razao, razao > 1.0 + tolerancia))
+    return linhas
+
+
+def _ler_json(caminho):
+    with open(caminho, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks do cadastro, da identificação e do banco.")
+    parser.add_argument("--usuarios", type=int, default=1000, help="Usuários na galeria sintética (8 linhas cada)")
+    parser.add_argument("--repeticoes", type=int, default=50, help="Repetições por medição")
+    parser.add_argument("--modelo", choices=("falso", "arcface"), default="falso",
+                        help="falso: mede só o código em volta do modelo; arcface: usa o DeepFace")
+    parser.add_argument("--saida", default=None, help="Arquivo JSON com os resultados")
+    parser.add_argument("--comparar", nargs=2, metavar=("BASE", "NOVO"), help="Compara dois JSONs e sai")
+    parser.add_argument("--limites", default=ARQUIVO_LIMITES, help="Tolerâncias de regressão (JSON)")
+    args = parser.parse_args()
+
+    if args.comparar:
+        linhas = comparar(_ler_json(args.comparar[0]), _ler_json(args.comparar[1]), carregar_limites(args.limites))
+        print(f"{'medição':<40} {'base (ms)':>10} {'novo (ms)':>10} {'razão':>7}")
+        for nome, antes, depois, razao, regressao in linhas:
+            print(f"{nome:<40} {antes:>10.3f} {depois:>10.3f} {razao:>6.2f}x{'  REGRESSÃO' if regressao else ''}")
+        sys.exit(1 if any(linha[4] for linha in linhas) else 0)
+
+    parametros = {"usuarios": args.usuarios, "repeticoes": args.repeticoes, "modelo": args.modelo}
+    resultados = rodar(args.usuarios, args.repeticoes, modelo_real=args.modelo == "arcface")
+    print(f"{'medição':<40} {'mediana':>9} {'p95':>9} {'n':>5}")
+    for nome, estatisticas in resultados.items():
+        print(f"{nome:<40} {estatisticas['mediana_ms']:>8.3f}ms {estatisticas['p95_ms']:>7.3f}ms {estatisticas['n']:>5}")
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as f:
+            json.dump(gerar_relatorio(resultados, parametros), f, indent=2, ensure_ascii=False)
+        print(f"Resultados gravados em {args.saida}")
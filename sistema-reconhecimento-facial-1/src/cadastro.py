@@ -3,10 +3,14 @@
 # ---------------------------
 import cv2              # OpenCV - usado para capturar e processar imagens/vídeo
 import os               # Para manipular pastas e caminhos de arquivos
-import sqlite3          # Banco de dados SQLite (armazenamento local)
+import shutil           # Para apagar a pasta de fotos antigas na troca de fotos
 from tkinter import messagebox  # Pop-ups para mostrar mensagens ao usuário
-from deepface import DeepFace   # Biblioteca para reconhecimento facial e geração de embeddings
-import numpy as np      # Biblioteca para manipulação de vetores/matrizes (usada para salvar embeddings)
+from utils.modelo import gerar_embeddings_lote, estatisticas_lote, recortar_rosto  # ArcFace em lote (DeepFace importado sob demanda)
+from utils.database import create_user_table, get_user_by_cpf, insert_user  # Banco SQLite (armazenamento local)
+from utils.armazem_embeddings import ArmazemEmbeddings  # Armazém único de embeddings (faces/galeria.*)
+from utils.galeria import servico_galeria_carregado     # Galeria em memória usada pelo login
+from utils.detector import obter_detector               # Detector de rostos compartilhado
+from utils.fontes import criar_fonte                    # Webcam (ou a fonte de RF_FONTE)
 
 
 # ---------------------------
@@ -14,18 +18,75 @@ import numpy as np      # Biblioteca para manipulação de vetores/matrizes (usa
 # ---------------------------
 def salvar_embeddings(imagens, cpf):
     """
-    Gera e salva um arquivo de embedding (vetor numérico do rosto)
-    para cada imagem facial capturada do usuário.
+    Gera o embedding (vetor numérico do rosto) de cada imagem facial
+    capturada do usuário, em lote, e grava todos no armazém empacotado de
+    faces/, substituindo os embeddings anteriores desse CPF.
     """
-    pasta = os.path.join("faces", cpf)  # Pasta do usuário, ex: faces/12345678901
-    os.makedirs(pasta, exist_ok=True)   # Cria a pasta se não existir
+    # As imagens já são rostos recortados: um único forward do ArcFace para todas
+    embeddings = gerar_embeddings_lote(imagens)
+    estatisticas = estatisticas_lote()
+    print(f"Embeddings de {cpf}: {estatisticas['imagens']} imagens ({estatisticas['do_cache']} do cache) em "
+          f"{estatisticas['segundos']:.2f}s ({estatisticas['imagens_por_segundo']:.1f} img/s)")
 
-    for i, img in enumerate(imagens):
-        # Gera o embedding usando o modelo ArcFace
-        embedding = DeepFace.represent(img, model_name="ArcFace")[0]["embedding"]
+    gravar_embeddings(cpf, embeddings)
 
-        # Salva o embedding como arquivo .npy (NumPy)
-        np.save(os.path.join(pasta, f"embedding_{i+1}.npy"), embedding)
+
+def gravar_embeddings(cpf, embeddings):
+    """
+    Grava embeddings já calculados de um CPF no armazém (substituindo os
+    anteriores) e avisa a galeria em memória.
+    """
+    # Grava todos de uma vez no armazém (faces/galeria.*)
+    ArmazemEmbeddings("faces").substituir(cpf, embeddings)
+
+    # Atualiza a galeria em memória (se já carregada) sem recarregar tudo
+    servico = servico_galeria_carregado()
+    if servico is not None:
+        servico.substituir_usuario(cpf, embeddings)
+
+
+def substituir_fotos(cpf, imagens):
+    """
+    Troca todas as fotos do usuário: apaga faces/<cpf>/, salva os novos
+    rostos recortados como JPG e substitui os embeddings do CPF.
+    Retorna os caminhos salvos (para o campo imagem_facial do banco).
+    """
+    pasta_cpf = os.path.join("faces", cpf)
+    if os.path.exists(pasta_cpf):
+        shutil.rmtree(pasta_cpf)
+    os.makedirs(pasta_cpf, exist_ok=True)
+    imagem_paths = []
+    for i, imagem in enumerate(imagens):
+        imagem_path = os.path.join(pasta_cpf, f"{cpf}_{i+1}.jpg")
+        cv2.imwrite(imagem_path, imagem)
+        imagem_paths.append(imagem_path)
+    salvar_embeddings(imagens, cpf)
+    return imagem_paths
+
+
+# ---------------------------
+# VARIAÇÕES DAS FOTOS
+# ---------------------------
+def gerar_variacao_unica(imagem, indice):
+    """Gera uma variação diferente para cada foto do cadastro."""
+    if indice == 0:
+        # Cinza + equalização
+        img_cinza = cv2.cvtColor(imagem, cv2.COLOR_BGR2GRAY)
+        img_eq = cv2.equalizeHist(img_cinza)
+        return cv2.cvtColor(img_eq, cv2.COLOR_GRAY2BGR)
+    elif indice == 1:
+        # Espelhamento horizontal
+        return cv2.flip(imagem, 1)
+    elif indice == 2:
+        # Leve desfoque
+        return cv2.GaussianBlur(imagem, (5, 5), 0)
+    elif indice == 3:
+        # Pequena rotação
+        h, w = imagem.shape[:2]
+        M = cv2.getRotationMatrix2D((w//2, h//2), 7, 1)
+        return cv2.warpAffine(imagem, M, (w, h))
+    else:
+        return imagem
 
 
 # ---------------------------
@@ -74,35 +135,16 @@ class Cadastro:
         # ---------------------------
         # BANCO DE DADOS
         # ---------------------------
-        conn = sqlite3.connect("cadastro.db")  # Conecta (ou cria) banco SQLite
-        cursor = conn.cursor()
-
         # Cria tabela de usuários se não existir
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS usuarios (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                nome TEXT NOT NULL,
-                data_nascimento TEXT NOT NULL,
-                cpf TEXT NOT NULL UNIQUE,
-                imagem_facial TEXT NOT NULL
-            )
-        """)
+        create_user_table()
 
         # Verifica se o CPF já existe no banco
-        cursor.execute("SELECT * FROM usuarios WHERE cpf = ?", (self.cpf,))
-        if cursor.fetchone():  # Se retornou algo, CPF já está cadastrado
+        if get_user_by_cpf(self.cpf):  # Se retornou algo, CPF já está cadastrado
             print("CPF já cadastrado!")
-            conn.close()
             return False
 
-        # Insere novo usuário
-        cursor.execute("""
-            INSERT INTO usuarios (nome, data_nascimento, cpf, imagem_facial)
-            VALUES (?, ?, ?, ?)
-        """, (self.nome, self.data_nascimento, self.cpf, imagens_str))
-
-        conn.commit()  # Salva as mudanças
-        conn.close()   # Fecha a conexão
+        # Insere novo usuário (conexão persistente, commit em uma transação)
+        insert_user(self.nome, self.data_nascimento, self.cpf, imagens_str)
 
         # ---------------------------
         # GERA E SALVA EMBEDDINGS
@@ -131,27 +173,29 @@ class Cadastro:
 
         fotos_capturadas = []
 
-        # Abre a webcam
-        cap = cv2.VideoCapture(0)
+        # Abre a webcam (ou a fonte definida em RF_FONTE)
+        fonte = criar_fonte()
+        if not fonte.abrir():
+            messagebox.showerror("Erro", "Erro ao acessar a câmera.")
+            return fotos_capturadas
 
-        # Carrega o classificador Haar Cascade para detecção de rostos
-        face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+        # Detector de rostos compartilhado (Haar Cascade carregado uma vez só)
+        detector = obter_detector()
+        rosto_anterior = None
 
         # Percorre cada instrução
         for passo, instrucao in enumerate(instrucoes):
             messagebox.showinfo("Instrução", instrucao)  # Mostra instrução na tela
 
             while True:
-                ret, frame = cap.read()  # Lê imagem da câmera
+                ret, frame = fonte.ler()  # Lê imagem da câmera
                 if not ret:
                     messagebox.showerror("Erro", "Erro ao acessar a câmera.")
                     break
 
-                # Converte para escala de cinza (necessário para Haar Cascade)
-                gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-
-                # Detecta rostos no frame
-                faces = face_cascade.detectMultiScale(gray, 1.1, 4)
+                # Detecta rostos no frame (em volta do rosto anterior, se houver)
+                faces = detector.detectar(frame, anterior=rosto_anterior)
+                rosto_anterior = faces[0] if len(faces) > 0 else None
 
                 # Desenha retângulo no primeiro rosto detectado
                 for (x, y, w, h) in faces:
@@ -166,14 +210,8 @@ class Cadastro:
 
                 if key == ord(' '):  # Espaço → capturar foto
                     if len(faces) > 0:
-                        # Pega as coordenadas do rosto detectado
-                        x, y, w, h = faces[0]
-
-                        # Recorta apenas o rosto
-                        rosto = frame[y:y+h, x:x+w]
-
-                        # Redimensiona para 224x224
-                        imagem_tratada = cv2.resize(rosto, (224, 224))
+                        # Recorta apenas o rosto e redimensiona para 224x224 (o mesmo recorte do login)
+                        imagem_tratada = recortar_rosto(frame, faces[0])
 
                         # Adiciona à lista de fotos
                         fotos_capturadas.append(imagem_tratada)
@@ -189,6 +227,6 @@ class Cadastro:
             cv2.destroyAllWindows()
 
         # Libera a câmera
-        cap.release()
+        fonte.fechar()
 
         return fotos_capturadas
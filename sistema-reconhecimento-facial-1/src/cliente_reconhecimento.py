@@ -0,0 +1,247 @@
+import json
+import time
+import base64
+import socket
+import threading
+import http.client
+from urllib.parse import urlsplit, quote
+
+import cv2
+from motor_reconhecimento import MotorReconhecimento, ResultadoReconhecimento
+
+# ---------- Cliente do servidor de reconhecimento ----------
+#
+# Mesma interface do MotorReconhecimento (identificar, verificar,
+# identificar_trilha...), mas o trabalho é feito pelo servidor.py: o quiosque
+# não importa o DeepFace nem carrega o TensorFlow. Cada thread mantém uma
+# conexão persistente (keep-alive) com o servidor.
+
+
+class ErroServidor(RuntimeError):
+    """Resposta de erro do servidor de reconhecimento."""
+
+    def __init__(self, status, mensagem):
+        super().__init__(f"Servidor respondeu {status}: {mensagem}")
+        self.status = status
+
+
+class ServidorOcupado(ErroServidor):
+    """O servidor respondeu 503: a fila de micro-lotes está cheia."""
+
+
+class _ConexaoUnix(http.client.HTTPConnection):
+    def __init__(self, caminho, timeout):
+        super().__init__("localhost", timeout=timeout)
+        self.caminho = caminho
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.caminho)
+
+
+class ClienteReconhecimento(MotorReconhecimento):
+    """
+    url: "http://host:porta" ou "unix:///caminho/do.sock".
+    Erros de rede e respostas de erro do servidor viram exceções, como as
+    falhas do modelo no motor local.
+    """
+
+    def __init__(self, url, timeout=10.0, qualidade_jpeg=90, tentativas_ocupado=3):
+        # Sem MotorReconhecimento.__init__: limiar calibrado (limiar.json) e
+        # galeria são os do servidor, e o quiosque não lê nada disso localmente
+        self.url = url
+        self.timeout = timeout
+        self.qualidade_jpeg = qualidade_jpeg
+        self.tentativas_ocupado = tentativas_ocupado
+        self._local = threading.local()
+
+    @property
+    def galeria(self):
+        return None  # a galeria fica no servidor
+
+    def pronto(self):
+        return True
+
+    # ---------- HTTP ----------
+
+    def _conexao(self):
+        conexao = getattr(self._local, "conexao", None)
+        if conexao is None:
+            partes = urlsplit(self.url)
+            if partes.scheme == "unix":
+                conexao = _ConexaoUnix(partes.path, self.timeout)
+            else:
+                conexao = http.client.HTTPConnection(partes.hostname, partes.port or 80, timeout=self.timeout)
+            self._local.conexao = conexao
+        return conexao
+
+    def _requisitar(self, metodo, caminho, corpo=None, tipo="image/jpeg"):
+        cabecalhos = {"Content-Type": tipo} if corpo is not None else {}
+        for tentativa in range(self.tentativas_ocupado + 1):
+            conexao = self._conexao()
+            try:
+                conexao.request(metodo, caminho, body=corpo, headers=cabecalhos)
+                resposta = conexao.getresponse()
+                status, dados = resposta.status, resposta.read()
+            except (http.client.HTTPException, OSError):
+                # Conexão caiu (ex.: servidor reiniciado): reabre uma vez e tenta de novo
+                conexao.close()
+                self._local.conexao = None
+                if tentativa > 0 or self.tentativas_ocupado == 0:
+                    raise
+                continue
+            if status == 503 and tentativa < self.tentativas_ocupado:
+                time.sleep(0.05 * (tentativa + 1))
+                continue
+            conteudo = json.loads(dados) if dados else {}
+            if status == 503:
+                raise ServidorOcupado(status, conteudo.get("erro", "Servidor ocupado."))
+            if status >= 400:
+                raise ErroServidor(status, conteudo.get("erro", ""))
+            return status, conteudo
+
+    def _jpeg(self, imagem):
+        ok, dados = cv2.imencode(".jpg", imagem, [cv2.IMWRITE_JPEG_QUALITY, self.qualidade_jpeg])
+        if not ok:
+            raise ValueError("Imagem inválida para reconhecimento.")
+        return dados.tobytes()
+
+    def _enviar_frame(self, caminho, frame, caixa=None):
+        """
+        POST de um frame pré-processado. A caixa do rosto, se conhecida, vai
+        em ?caixa=x,y,w,h nas coordenadas do JPEG enviado, para o servidor
+        não detectar de novo.
+        """
+        imagem = self.preprocessar(frame)
+        if caixa is not None:
+            escala = imagem.shape[1] / frame.shape[1]  # < 1 se o frame foi reduzido
+            caminho += "?caixa=" + ",".join(str(int(round(v * escala))) for v in caixa)
+        return self._requisitar("POST", caminho, self._jpeg(imagem))[1]
+
+    # ---------- API do motor ----------
+
+    def identificar(self, frame, caixa=None):
+        inicio = time.perf_counter()
+        dados = self._enviar_frame("/identify", frame, caixa)
+        resultado = ResultadoReconhecimento(**dados)
+        resultado.tempos["rede"] = (time.perf_counter() - inicio) * 1000
+        return resultado
+
+    def identificar_rostos(self, frame, tamanho_minimo=None, maximo=None):
+        # Tamanho mínimo e limite de rostos são os do servidor
+        inicio = time.perf_counter()
+        imagem = self.preprocessar(frame)
+        _, dados = self._requisitar("POST", "/identify/all", self._jpeg(imagem))
+        escala = frame.shape[1] / imagem.shape[1]  # caixas voltam na resolução enviada
+        resultados = []
+        for item in dados["rostos"]:
+            resultado = ResultadoReconhecimento(**item)
+            resultado.caixa = tuple(int(round(v * escala)) for v in resultado.caixa)
+            resultado.tempos["rede"] = (time.perf_counter() - inicio) * 1000
+            resultados.append(resultado)
+        return resultados
+
+    def verificar(self, frame, cpf, imagens_cadastradas=None, caixa=None):
+        inicio = time.perf_counter()
+        dados = self._enviar_frame("/verify/" + quote(str(cpf)), frame, caixa)
+        resultado = ResultadoReconhecimento(**dados)
+        resultado.tempos["rede"] = (time.perf_counter() - inicio) * 1000
+        return resultado
+
+    def reconhecer_lote(self, frames, cpfs=None, caixas=None):
+        # O servidor já agrupa em lote os pedidos de todos os clientes; cada
+        # frame segue com a sua caixa, que o servidor usa em vez de detectar
+        cpfs = cpfs or [None] * len(frames)
+        caixas = caixas or [None] * len(frames)
+        return [self.identificar(frame, caixa) if cpf is None else self.verificar(frame, cpf, caixa=caixa)
+                for frame, cpf, caixa in zip(frames, cpfs, caixas)]
+
+    def cpfs_sem_embeddings(self, cpfs):
+        return set()  # o servidor mantém os embeddings de quem está cadastrado lá
+
+    def garantir_embeddings(self, cpf, imagens_cadastradas):
+        return True
+
+    def cadastrar(self, nome, data_nascimento, cpf, imagens, recortadas=True):
+        """
+        Cadastra o usuário no servidor. Retorna False se o CPF já existir.
+        imagens: rostos recortados (como os da janela de cadastro) ou, com
+        recortadas=False, frames inteiros.
+        """
+        pedido = {
+            "cpf": cpf, "nome": nome, "data_nascimento": data_nascimento, "recortadas": recortadas,
+            "imagens": [base64.b64encode(self._jpeg(imagem)).decode("ascii") for imagem in imagens],
+        }
+        try:
+            self._requisitar("POST", "/enroll", json.dumps(pedido).encode("utf-8"), "application/json")
+        except ErroServidor as e:
+            if e.status == 409:
+                return False
+            raise
+        return True
+
+    def substituir_fotos(self, cpf, imagens, recortadas=True):
+        """
+        Troca as fotos e os embeddings de um usuário já cadastrado no
+        servidor. Retorna False se o CPF não existir lá.
+        """
+        pedido = {
+            "recortadas": recortadas,
+            "imagens": [base64.b64encode(self._jpeg(imagem)).decode("ascii") for imagem in imagens],
+        }
+        try:
+            self._requisitar("POST", "/reenroll/" + quote(str(cpf)), json.dumps(pedido).encode("utf-8"),
+                             "application/json")
+        except ErroServidor as e:
+            if e.status == 404:
+                return False
+            raise
+        return True
+
+    # ---------- Usuários (tela de edição do quiosque) ----------
+    #
+    # Mesmos formatos das funções de utils/database.py, para a tela de edição
+    # tratar o banco local e o do servidor do mesmo jeito.
+
+    def buscar_usuario(self, cpf):
+        """(id, nome, data_nascimento, cpf, None) como get_user_by_cpf, ou None se não existir."""
+        try:
+            dados = self._requisitar("GET", "/users/" + quote(str(cpf)))[1]
+        except ErroServidor as e:
+            if e.status == 404:
+                return None
+            raise
+        # As fotos ficam no servidor: o caminho delas não serve ao quiosque
+        return dados["id"], dados["nome"], dados["data_nascimento"], dados["cpf"], None
+
+    def listar_usuarios(self):
+        """[(id, nome, cpf)] como get_all_users."""
+        return [(u["id"], u["nome"], u["cpf"]) for u in self._requisitar("GET", "/users")[1]["usuarios"]]
+
+    def alterar_usuario(self, cpf, nome=None, data_nascimento=None):
+        """Altera nome e data de nascimento. Retorna False se o CPF não existir no servidor."""
+        pedido = json.dumps({"nome": nome, "data_nascimento": data_nascimento}).encode("utf-8")
+        try:
+            self._requisitar("PUT", "/users/" + quote(str(cpf)), pedido, "application/json")
+        except ErroServidor as e:
+            if e.status == 404:
+                return False
+            raise
+        return True
+
+    def excluir_usuario(self, cpf):
+        """
+        Exclui o usuário no servidor (banco, fotos, armazém e galeria).
+        Retorna False se o CPF não existir lá.
+        """
+        try:
+            self._requisitar("DELETE", "/users/" + quote(str(cpf)))
+        except ErroServidor as e:
+            if e.status == 404:
+                return False
+            raise
+        return True
+
+    def saude(self):
+        return self._requisitar("GET", "/saude")[1]
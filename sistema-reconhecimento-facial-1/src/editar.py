@@ -5,6 +5,7 @@ import cv2
 import os
 import shutil
 from utils.database import get_user_by_cpf, update_user, delete_user
+from utils.detector import obter_detector
 from cadastro import salvar_embeddings, gerar_variacao_unica
 
 # ---------------------------------------------------
@@ -52,14 +53,8 @@ class Editar:
         Localiza e recorta o rosto detectado na imagem (frame).
         Retorna apenas a região do rosto ou None se nenhum rosto for encontrado.
         """
-        # Carrega o classificador Haar Cascade para detectar rostos
-        face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-
-        # Converte para escala de cinza para melhorar a detecção
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-
-        # Detecta rostos na imagem
-        faces = face_cascade.detectMultiScale(gray, 1.1, 4)
+        # Detecta rostos com o detector compartilhado (cascade carregado uma vez só)
+        faces = obter_detector().detectar(frame)
 
         # Se pelo menos um rosto foi encontrado, retorna o primeiro
         if len(faces) > 0:
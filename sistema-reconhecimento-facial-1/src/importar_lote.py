@@ -0,0 +1,252 @@
+"""
+Importação em lote de usuários a partir de fotos já existentes (ex.: fotos
+de crachá), sem webcam nem interface gráfica.
+
+Entrada:
+  - um CSV com as colunas cpf, nome, data_nascimento, imagens (caminhos
+    separados por ";" e relativos à pasta do CSV), ou
+  - uma pasta com uma subpasta por pessoa, chamada "<cpf>" ou "<cpf>_<nome>",
+    contendo as fotos dela (a data de nascimento fica em branco).
+
+Para cada pessoa: detecta e recorta o rosto de cada foto, gera a variação de
+gerar_variacao_unica, salva os JPGs em faces/<cpf>/ e calcula os embeddings
+em processos separados. O processo principal grava os resultados em lotes
+(uma transação no banco e um append no armazém por lote). CPFs que já estão
+no banco são pulados, então basta rodar de novo para retomar.
+
+Uso (a partir da raiz do projeto):
+    python src/importar_lote.py fotos/manifesto.csv --processos 4
+    python src/importar_lote.py fotos/ --ja-recortadas
+"""
+import os
+import re
+import csv
+import sys
+import time
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from utils.database import create_user_table, get_all_users, insert_users_bulk
+from utils.armazem_embeddings import ArmazemEmbeddings
+
+EXTENSOES_IMAGEM = (".jpg", ".jpeg", ".png", ".bmp")
+MAX_FOTOS_POR_PESSOA = 4  # como no cadastro pela webcam: 4 fotos + 4 variações
+
+
+# ---------- Leitura da entrada ----------
+
+def ler_csv(caminho):
+    """Lê o manifesto CSV e devolve a lista de pessoas."""
+    base = os.path.dirname(os.path.abspath(caminho))
+    pessoas = []
+    with open(caminho, newline="", encoding="utf-8-sig") as f:
+        for linha in csv.DictReader(f):
+            imagens = [os.path.join(base, p.strip()) for p in (linha.get("imagens") or "").split(";") if p.strip()]
+            pessoas.append({
+                "cpf": linha["cpf"].strip(),
+                "nome": (linha.get("nome") or "").strip(),
+                "data_nascimento": (linha.get("data_nascimento") or "").strip(),
+                "imagens": imagens,
+            })
+    return pessoas
+
+
+def ler_pasta(pasta):
+    """Uma subpasta por pessoa: "<cpf>" ou "<cpf>_<nome>"."""
+    pessoas = []
+    for nome_pasta in sorted(os.listdir(pasta)):
+        caminho = os.path.join(pasta, nome_pasta)
+        if not os.path.isdir(caminho):
+            continue
+        cpf, _, nome = nome_pasta.partition("_")
+        imagens = [os.path.join(caminho, a) for a in sorted(os.listdir(caminho))
+                   if a.lower().endswith(EXTENSOES_IMAGEM)]
+        pessoas.append({"cpf": cpf.strip(), "nome": nome.strip() or cpf.strip(),
+                        "data_nascimento": "", "imagens": imagens})
+    return pessoas
+
+
+def validar(pessoas):
+    """Separa as pessoas válidas das que têm CPF inválido ou nenhuma foto."""
+    validas, falhas, vistos = [], [], set()
+    for pessoa in pessoas:
+        # Aceita CPF formatado (123.456.789-01): guarda só os dígitos, como o armazém espera
+        cpf = pessoa["cpf"] = re.sub(r"\D", "", pessoa["cpf"])
+        if not re.fullmatch(r"\d{11}", cpf):
+            falhas.append((cpf, "CPF inválido"))
+        elif cpf in vistos:
+            falhas.append((cpf, "CPF repetido na entrada"))
+        elif not pessoa["imagens"]:
+            falhas.append((cpf, "nenhuma imagem"))
+        else:
+            vistos.add(cpf)
+            validas.append(pessoa)
+    return validas, falhas
+
+
+# ---------- Processos de trabalho ----------
+
+_ja_recortadas = False
+
+
+def _iniciar_processo(ja_recortadas):
+    global _ja_recortadas
+    os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
+    _ja_recortadas = ja_recortadas
+    from utils.modelo import obter_rede
+    obter_rede()  # carrega o ArcFace uma vez por processo
+
+
+def _rostos_da_pessoa(pessoa):
+    """Lê as fotos, recorta o rosto e gera as variações (imagens 224x224)."""
+    import cv2
+    from cadastro import gerar_variacao_unica
+    from utils.detector import obter_detector
+    from utils.modelo import recortar_rosto, TAMANHO_RECORTE
+
+    detector = obter_detector()
+    rostos = []
+    for caminho in pessoa["imagens"]:
+        if len(rostos) >= 2 * MAX_FOTOS_POR_PESSOA:
+            break
+        imagem = cv2.imread(caminho)
+        if imagem is None:
+            continue
+        if _ja_recortadas:
+            rosto = cv2.resize(imagem, TAMANHO_RECORTE[::-1])
+        else:
+            caixa = detector.primeiro_rosto(imagem)
+            if caixa is None:
+                continue
+            rosto = recortar_rosto(imagem, caixa)
+        rostos.append(rosto)
+        rostos.append(gerar_variacao_unica(rosto, len(rostos) // 2))
+    return rostos
+
+
+def processar_pessoas(pessoas):
+    """
+    Roda em um processo de trabalho. Para cada pessoa recorta os rostos, salva
+    os JPGs em faces/<cpf>/ e calcula os embeddings de todas as pessoas do
+    grupo em um único lote. Retorna (resultados, falhas, total de imagens).
+    """
+    import cv2
+    from utils.modelo import gerar_embeddings_lote
+
+    preparadas, falhas = [], []
+    for pessoa in pessoas:
+        try:
+            rostos = _rostos_da_pessoa(pessoa)
+        except Exception as e:
+            falhas.append((pessoa["cpf"], f"erro ao ler fotos: {e}"))
+            continue
+        if not rostos:
+            falhas.append((pessoa["cpf"], "nenhum rosto detectado"))
+            continue
+        preparadas.append((pessoa, rostos))
+
+    if not preparadas:
+        return [], falhas, 0
+    todas = [rosto for _, rostos in preparadas for rosto in rostos]
+    embeddings = gerar_embeddings_lote(todas)
+
+    resultados, inicio = [], 0
+    for pessoa, rostos in preparadas:
+        cpf = pessoa["cpf"]
+        pasta_cpf = os.path.join("faces", cpf)
+        os.makedirs(pasta_cpf, exist_ok=True)
+        caminhos = []
+        for i, rosto in enumerate(rostos):
+            caminho = os.path.join(pasta_cpf, f"{cpf}_{i+1}.jpg")
+            cv2.imwrite(caminho, rosto)
+            caminhos.append(caminho)
+        resultados.append({
+            "usuario": (pessoa["nome"], pessoa["data_nascimento"], cpf, ";".join(caminhos)),
+            "embeddings": embeddings[inicio:inicio + len(rostos)],
+        })
+        inicio += len(rostos)
+    return resultados, falhas, len(todas)
+
+
+# ---------- Processo principal ----------
+
+def _gravar(resultados):
+    """Embeddings primeiro, banco depois: o banco é o marcador de retomada."""
+    ArmazemEmbeddings("faces").substituir_varios([(r["usuario"][2], r["embeddings"]) for r in resultados])
+    insert_users_bulk([r["usuario"] for r in resultados])
+
+
+def importar(pessoas, processos=None, pessoas_por_tarefa=8, lote_gravacao=64, ja_recortadas=False):
+    """Importa as pessoas ainda não cadastradas. Retorna (importadas, falhas)."""
+    create_user_table()
+    cadastrados = {cpf for _, _, cpf in get_all_users()}
+    pessoas, falhas = validar(pessoas)
+    pendentes = [p for p in pessoas if p["cpf"] not in cadastrados]
+    print(f"{len(pessoas)} pessoas na entrada, {len(pessoas) - len(pendentes)} já cadastradas, "
+          f"{len(pendentes)} a importar.")
+    if not pendentes:
+        return 0, falhas
+
+    processos = processos or max(1, (os.cpu_count() or 2) // 2)
+    tarefas = [pendentes[i:i + pessoas_por_tarefa] for i in range(0, len(pendentes), pessoas_por_tarefa)]
+    importadas, imagens, a_gravar = 0, 0, []
+    inicio = ultimo_relatorio = time.perf_counter()
+
+    # "spawn": cada processo carrega o próprio TensorFlow, sem herdar estado do pai
+    contexto = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=processos, mp_context=contexto,
+                             initializer=_iniciar_processo, initargs=(ja_recortadas,)) as executor:
+        futuros = [executor.submit(processar_pessoas, tarefa) for tarefa in tarefas]
+        for concluidas, futuro in enumerate(as_completed(futuros), start=1):
+            try:
+                resultados, falhas_tarefa, n_imagens = futuro.result()
+            except Exception as e:
+                print("Erro em um processo de trabalho:", e)
+                continue
+            falhas.extend(falhas_tarefa)
+            a_gravar.extend(resultados)
+            imagens += n_imagens
+            if len(a_gravar) >= lote_gravacao or concluidas == len(futuros):
+                _gravar(a_gravar)
+                importadas += len(a_gravar)
+                a_gravar = []
+            agora = time.perf_counter()
+            if agora - ultimo_relatorio >= 2.0 or concluidas == len(futuros):
+                ultimo_relatorio = agora
+                decorrido = agora - inicio
+                print(f"[{concluidas}/{len(futuros)} tarefas] {importadas} importadas, "
+                      f"{len(falhas)} falhas, {imagens} imagens, "
+                      f"{imagens / decorrido:.1f} img/s")
+    if a_gravar:
+        _gravar(a_gravar)
+        importadas += len(a_gravar)
+    return importadas, falhas
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Importa usuários em lote a partir de fotos.")
+    parser.add_argument("entrada", help="Manifesto CSV ou pasta com uma subpasta por pessoa")
+    parser.add_argument("--processos", type=int, default=None, help="Processos de trabalho (padrão: metade dos núcleos)")
+    parser.add_argument("--pessoas-por-tarefa", type=int, default=8, help="Pessoas por forward do ArcFace")
+    parser.add_argument("--lote", type=int, default=64, help="Pessoas por transação de gravação")
+    parser.add_argument("--ja-recortadas", action="store_true", help="As fotos já são só o rosto (não detecta)")
+    parser.add_argument("--falhas", default="falhas_importacao.csv", help="Arquivo com os CPFs que falharam")
+    args = parser.parse_args()
+
+    if os.path.isdir(args.entrada):
+        pessoas = ler_pasta(args.entrada)
+    elif os.path.isfile(args.entrada):
+        pessoas = ler_csv(args.entrada)
+    else:
+        sys.exit(f"Entrada não encontrada: {args.entrada}")
+
+    inicio = time.perf_counter()
+    importadas, falhas = importar(pessoas, args.processos, args.pessoas_por_tarefa, args.lote, args.ja_recortadas)
+    print(f"Concluído em {time.perf_counter() - inicio:.1f}s: {importadas} importadas, {len(falhas)} falhas.")
+    if falhas:
+        with open(args.falhas, "w", newline="", encoding="utf-8") as f:
+            escritor = csv.writer(f)
+            escritor.writerow(["cpf", "motivo"])
+            escritor.writerows(falhas)
+        print(f"Falhas registradas em {args.falhas}")
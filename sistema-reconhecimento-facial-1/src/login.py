@@ -1,14 +1,15 @@
-from deepface import DeepFace
 import cv2
 import os
 import numpy as np
-from utils.database import get_user_by_cpf, update_user
+from utils.database import update_user
+from motor_reconhecimento import obter_motor
+from utils.fontes import capturar_frame
 
 class Login:
     """
     Classe responsável por autenticação facial no sistema.
-    Utiliza a biblioteca DeepFace para verificar similaridade entre o rosto
-    capturado e os rostos salvos no banco de dados (e em disco).
+    Utiliza o motor de reconhecimento (ArcFace) para comparar o rosto
+    capturado com os embeddings dos usuários cadastrados.
     """
 
     def __init__(self):
@@ -68,8 +69,8 @@ class Login:
 
     def _autenticar_por_imagem(self, imagem, retornar_acuracia=False):
         """
-        Compara a imagem capturada com todas as imagens cadastradas no sistema.
-        Percorre todos os usuários e suas fotos para encontrar correspondência.
+        Identifica a imagem capturada na galeria de embeddings cadastrados,
+        usando o motor de reconhecimento compartilhado com o restante do sistema.
 
         Parâmetros:
             imagem (np.ndarray): Imagem capturada (frame da webcam).
@@ -81,33 +82,15 @@ class Login:
                 - (CPF, acurácia) se `retornar_acuracia=True`
                 - None se não encontrar correspondência.
         """
-        imagem = cv2.resize(imagem, self.tamanho_imagem)
-
-        for usuario in get_user_by_cpf():
-            cpf = usuario['cpf']
-            pasta_usuario = os.path.join(self.pasta_faces, cpf)
-
-            if not os.path.exists(pasta_usuario):
-                continue
-
-            for arquivo in os.listdir(pasta_usuario):
-                caminho_img_cadastrada = os.path.join(pasta_usuario, arquivo)
-
-                try:
-                    resultado = DeepFace.verify(
-                        img1_path=imagem,
-                        img2_path=caminho_img_cadastrada,
-                        model_name="ArcFace",
-                        detector_backend="opencv",
-                        enforce_detection=False
-                    )
-                except Exception:
-                    continue
-
-                if resultado["verified"]:
-                    if retornar_acuracia:
-                        return cpf, resultado["distance"]
-                    return cpf
+        try:
+            resultado = obter_motor().identificar(imagem)
+        except Exception:
+            return None
+
+        if resultado.reconhecido:
+            if retornar_acuracia:
+                return resultado.cpf, resultado.acuracia
+            return resultado.cpf
 
         return None
 
@@ -115,18 +98,11 @@ class Login:
 
     def _capturar_imagem(self):
         """
-        Abre a webcam e captura um único frame.
+        Abre a fonte padrão (webcam ou RF_FONTE) e captura um único frame.
         Retorna:
             np.ndarray | None: Frame capturado ou None se não conseguir.
         """
-        cap = cv2.VideoCapture(0)
-        if not cap.isOpened():
-            return None
-
-        ret, frame = cap.read()
-        cap.release()
-
-        return frame if ret else None
+        return capturar_frame()
 
     def salvar_imagens_cadastradas(self, cpf, imagens):
         """
@@ -1,42 +1,39 @@
+import time
+INICIO_PROCESSO = time.perf_counter()  # Marca o início do processo (medição de inicialização)
+
 from tkinter import Tk, Label, Button, Entry, messagebox, Toplevel, Frame, Listbox
-from cadastro import Cadastro
-from utils.database import update_user, delete_user, get_user_by_cpf, connect_to_database, insert_login, create_login_table
+from cadastro import Cadastro, gerar_variacao_unica, substituir_fotos
+from utils.database import update_user, delete_user, get_user_by_cpf, get_all_users, create_login_table
+from utils.auditoria import obter_registrador
+from utils.captura import CapturaCamera
+from utils.detector import obter_detector
+from utils.rastreador import RastreadorRosto
+from utils.qualidade import obter_avaliador, obter_contadores, JanelaMelhorFrame
+from utils.metricas import obter_metricas, iniciar_exportacao
+from motor_reconhecimento import obter_motor, usando_servidor
+from utils.modelo import iniciar_aquecimento, recortar_rosto
 from login import Login
 import cv2
 from PIL import Image, ImageTk
 import threading
-import time
 import os
-from deepface import DeepFace
-import numpy as np
 import datetime
 import warnings
 
 warnings.filterwarnings("ignore")
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'  # Suprime avisos e infos do TensorFlow
 
-# ----------- Funções auxiliares -----------
-
-def gerar_variacao_unica(imagem, indice):
-    """Gera uma variação diferente para cada foto do cadastro."""
-    if indice == 0:
-        # Cinza + equalização
-        img_cinza = cv2.cvtColor(imagem, cv2.COLOR_BGR2GRAY)
-        img_eq = cv2.equalizeHist(img_cinza)
-        return cv2.cvtColor(img_eq, cv2.COLOR_GRAY2BGR)
-    elif indice == 1:
-        # Espelhamento horizontal
-        return cv2.flip(imagem, 1)
-    elif indice == 2:
-        # Leve desfoque
-        return cv2.GaussianBlur(imagem, (5, 5), 0)
-    elif indice == 3:
-        # Pequena rotação
-        h, w = imagem.shape[:2]
-        M = cv2.getRotationMatrix2D((w//2, h//2), 7, 1)
-        return cv2.warpAffine(imagem, M, (w, h))
-    else:
-        return imagem
+INTERVALO_VIDEO_MS = 33  # Atualização da imagem na tela (~30 fps), independente da captura
+
+# Com RF_VARIOS_ROSTOS=1 o login identifica todos os rostos do frame (ex.: catraca
+# com várias pessoas na frente), pinta cada caixa pelo resultado e libera o maior reconhecido
+VARIOS_ROSTOS = os.environ.get("RF_VARIOS_ROSTOS", "") not in ("", "0")
+VALIDADE_ROSTOS_S = 1.5  # por quanto tempo as caixas de uma identificação ficam na tela
+
+# Etapas mostradas no overlay de depuração do login (com RF_METRICAS=1)
+ETAPAS_OVERLAY = ("captura.idade_frame", "deteccao.haar", "login.rastreador", "login.qualidade",
+                  "login.sondagem", "motor.embedding", "motor.busca", "login.reconhecimento",
+                  "banco.get_user_by_cpf", "login.ate_liberar")
 
 # ----------- Classe principal -----------
 
@@ -70,6 +67,18 @@ class SistemaReconhecimentoFacial:
         self.frame_editar.pack_forget()
         self.frame_menu.pack(expand=True, fill="both")
 
+    def fechar_com_captura(self, janela, captura):
+        """
+        Para a captura quando a janela fecha, inclusive pelo X da barra de
+        título (senão a thread continua lendo e segura a webcam). Retorna a
+        função de fechar, usada também pelos botões.
+        """
+        def fechar():
+            captura.parar()
+            janela.destroy()
+        janela.protocol("WM_DELETE_WINDOW", fechar)
+        return fechar
+
     # --- Cadastro ---
     def mostrar_cadastro(self):
         self.frame_menu.pack_forget()
@@ -123,20 +132,24 @@ class SistemaReconhecimentoFacial:
             label_instrucao = Label(camera_window, text=instrucoes[0], font=("Arial", 14, "bold"), bg="#f0f0f0", fg="#2196f3")
             label_instrucao.pack(pady=15)
 
-            cap = cv2.VideoCapture(0)
-            face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+            captura = CapturaCamera()
+            captura.iniciar()
+            fechar_camera = self.fechar_com_captura(camera_window, captura)
+            detector = obter_detector()
 
             def tirar_foto():
-                ret, frame = cap.read()
-                if not ret:
+                frame, _, _ = captura.ultimo_frame()
+                if frame is None:
                     messagebox.showerror("Erro", "Não foi possível capturar a imagem.")
                     return
-                gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-                faces = face_cascade.detectMultiScale(gray, 1.1, 4)
+                faces = detector.detectar(frame)
                 if len(faces) > 0:
-                    x, y, w, h = faces[0]
-                    rosto = frame[y:y+h, x:x+w]
-                    rosto = cv2.resize(rosto, (224, 224))
+                    # Mesmo filtro do login: foto borrada, escura, pequena ou de lado não entra no cadastro
+                    avaliacao = obter_avaliador().avaliar(frame, faces[0])
+                    if not avaliacao.aprovado:
+                        messagebox.showwarning("Atenção", f"Foto recusada: {avaliacao.mensagem}.")
+                        return
+                    rosto = recortar_rosto(frame, faces[0])
                     fotos_capturadas.append(rosto)  # original
                     # Adiciona a variação específica para este passo
                     variacao = gerar_variacao_unica(rosto, passo[0])
@@ -146,33 +159,39 @@ class SistemaReconhecimentoFacial:
                         label_instrucao.config(text=instrucoes[passo[0]])
                         messagebox.showinfo("Foto tirada", "Foto capturada com sucesso!\n" + ("Próxima orientação: " + instrucoes[passo[0]]))
                     else:
-                        cap.release()
-                        camera_window.destroy()
+                        fechar_camera()
                         self.imagens_faciais_capturadas = fotos_capturadas.copy()
                         foto_status_label.config(text="Fotos salvas: Sim", fg="green")
                 else:
                     messagebox.showwarning("Atenção", "Nenhum rosto detectado. Tente novamente.")
                     return
 
+            ultima_exibida = [-1]
+            rosto_anterior = [None]  # restringe a detecção à região do último rosto
+
             def mostrar_video():
-                ret, frame = cap.read()
-                if ret:
-                    face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-                    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-                    faces = face_cascade.detectMultiScale(gray, 1.1, 4)
+                if not camera_window.winfo_exists():
+                    captura.parar()  # janela destruída junto com a janela pai
+                    return
+                frame, _, sequencia = captura.ultimo_frame()
+                if frame is not None and sequencia != ultima_exibida[0]:
+                    ultima_exibida[0] = sequencia
+                    faces = detector.detectar(frame, anterior=rosto_anterior[0])
+                    rosto_anterior[0] = faces[0] if len(faces) > 0 else None
+                    # Desenha na cópia RGB: o frame é do buffer compartilhado da captura
+                    frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
                     for (x, y, w, h) in faces:
-                        cv2.rectangle(frame, (x, y), (x+w, y+h), (0, 255, 0), 2)
+                        cv2.rectangle(frame_rgb, (x, y), (x+w, y+h), (0, 255, 0), 2)
                         break
-                    frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
                     img = Image.fromarray(frame_rgb)
                     imgtk = ImageTk.PhotoImage(image=img)
                     l_video.imgtk = imgtk
                     l_video.configure(image=imgtk)
-                l_video.after(100, mostrar_video)
+                l_video.after(INTERVALO_VIDEO_MS, mostrar_video)
 
             Button(camera_window, text="Tirar Foto", command=tirar_foto,
                    bg="#4caf50", fg="white", font=("Arial", 12, "bold")).pack(pady=10)
-            Button(camera_window, text="Fechar", command=lambda: [cap.release(), camera_window.destroy()],
+            Button(camera_window, text="Fechar", command=fechar_camera,
                    bg="#f44336", fg="white", font=("Arial", 12, "bold")).pack(pady=10)
 
             mostrar_video()
@@ -186,7 +205,11 @@ class SistemaReconhecimentoFacial:
             if hasattr(self, "imagens_faciais_capturadas") and len(self.imagens_faciais_capturadas) == 8:
                 cadastro = Cadastro(nome, data_nascimento, cpf, self.imagens_faciais_capturadas)
                 if cadastro.validar_cpf():
-                    cadastro.cadastrar_usuario()
+                    if usando_servidor():
+                        # Quiosque: o cadastro (fotos, banco e embeddings) fica no servidor
+                        obter_motor().cadastrar(nome, data_nascimento, cpf, self.imagens_faciais_capturadas)
+                    else:
+                        cadastro.cadastrar_usuario()
                     messagebox.showinfo("Cadastro", "Cadastro realizado com sucesso!")
                     self.imagens_faciais_capturadas = []
                     self.frame_cadastro.pack_forget()  # <-- Troque destroy() por pack_forget()
@@ -216,9 +239,19 @@ class SistemaReconhecimentoFacial:
         entry_cpf = Entry(self.frame_editar, font=("Arial", 14), width=30)
         entry_cpf.pack(pady=10)
 
+        # Quiosque (RF_SERVIDOR): os usuários ficam no servidor, não no cadastro.db local
+        def buscar_usuario(cpf):
+            return obter_motor().buscar_usuario(cpf) if usando_servidor() else get_user_by_cpf(cpf)
+
+        def excluir_usuario(cpf):
+            if usando_servidor():
+                return obter_motor().excluir_usuario(cpf)
+            delete_user(cpf)
+            return True
+
         def alterar():
             cpf = entry_cpf.get()
-            usuario = get_user_by_cpf(cpf)
+            usuario = buscar_usuario(cpf)
             if usuario:
                 alterar_window = Toplevel(self.frame_editar)
                 alterar_window.title("Alterar Usuário")
@@ -261,20 +294,24 @@ class SistemaReconhecimentoFacial:
                     label_instrucao = Label(camera_window, text=instrucoes[0], font=("Arial", 14, "bold"), bg="#f0f0f0", fg="#2196f3")
                     label_instrucao.pack(pady=15)
 
-                    cap = cv2.VideoCapture(0)
-                    face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+                    captura = CapturaCamera()
+                    captura.iniciar()
+                    fechar_camera = self.fechar_com_captura(camera_window, captura)
+                    detector = obter_detector()
 
                     def tirar_foto():
-                        ret, frame = cap.read()
-                        if not ret:
+                        frame, _, _ = captura.ultimo_frame()
+                        if frame is None:
                             messagebox.showerror("Erro", "Não foi possível capturar a imagem.")
                             return
-                        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-                        faces = face_cascade.detectMultiScale(gray, 1.1, 4)
+                        faces = detector.detectar(frame)
                         if len(faces) > 0:
-                            x, y, w, h = faces[0]
-                            rosto = frame[y:y+h, x:x+w]
-                            rosto = cv2.resize(rosto, (224, 224))
+                            # Mesmo filtro do login: foto borrada, escura, pequena ou de lado não entra no cadastro
+                            avaliacao = obter_avaliador().avaliar(frame, faces[0])
+                            if not avaliacao.aprovado:
+                                messagebox.showwarning("Atenção", f"Foto recusada: {avaliacao.mensagem}.")
+                                return
+                            rosto = recortar_rosto(frame, faces[0])
                             fotos_capturadas.append(rosto)  # original
                             variacao = gerar_variacao_unica(rosto, passo[0])
                             fotos_capturadas.append(variacao)
@@ -283,47 +320,46 @@ class SistemaReconhecimentoFacial:
                                 label_instrucao.config(text=instrucoes[passo[0]])
                                 messagebox.showinfo("Foto tirada", "Foto capturada com sucesso!\n" + ("Próxima orientação: " + instrucoes[passo[0]]))
                             else:
-                                cap.release()
-                                camera_window.destroy()
-                                # Apaga as imagens antigas e salva as novas
-                                pasta_cpf = os.path.join("faces", usuario[3])
-                                import shutil
-                                if os.path.exists(pasta_cpf):
-                                    shutil.rmtree(pasta_cpf)
-                                os.makedirs(pasta_cpf, exist_ok=True)
-                                imagem_paths = []
-                                for i, imagem in enumerate(fotos_capturadas):
-                                    imagem_path = os.path.join(pasta_cpf, f"{usuario[3]}_{i+1}.jpg")
-                                    cv2.imwrite(imagem_path, imagem)
-                                    imagem_paths.append(imagem_path)
-                                novas_imagens_faciais.clear()
-                                novas_imagens_faciais.extend(imagem_paths)
-                                # Salva novos embeddings
-                                from cadastro import salvar_embeddings
-                                salvar_embeddings(fotos_capturadas, usuario[3])
+                                fechar_camera()
+                                if usando_servidor():
+                                    # Quiosque: fotos, banco e embeddings ficam no servidor, como no cadastro
+                                    if not obter_motor().substituir_fotos(usuario[3], fotos_capturadas):
+                                        messagebox.showerror("Erro", "Usuário não encontrado no servidor.")
+                                        return
+                                else:
+                                    # Apaga as imagens antigas, salva as novas e troca os embeddings
+                                    novas_imagens_faciais.clear()
+                                    novas_imagens_faciais.extend(substituir_fotos(usuario[3], fotos_capturadas))
                                 messagebox.showinfo("Captura", "Novas fotos e embeddings salvos com sucesso!")
                         else:
                             messagebox.showwarning("Atenção", "Nenhum rosto detectado. Tente novamente.")
 
+                    ultima_exibida = [-1]
+                    rosto_anterior = [None]  # restringe a detecção à região do último rosto
+
                     def mostrar_video():
-                        ret, frame = cap.read()
-                        if ret:
-                            face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-                            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-                            faces = face_cascade.detectMultiScale(gray, 1.1, 4)
+                        if not camera_window.winfo_exists():
+                            captura.parar()  # janela destruída junto com a janela "Alterar Usuário"
+                            return
+                        frame, _, sequencia = captura.ultimo_frame()
+                        if frame is not None and sequencia != ultima_exibida[0]:
+                            ultima_exibida[0] = sequencia
+                            faces = detector.detectar(frame, anterior=rosto_anterior[0])
+                            rosto_anterior[0] = faces[0] if len(faces) > 0 else None
+                            # Desenha na cópia RGB: o frame é do buffer compartilhado da captura
+                            frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
                             for (x, y, w, h) in faces:
-                                cv2.rectangle(frame, (x, y), (x+w, y+h), (0, 255, 0), 2)
+                                cv2.rectangle(frame_rgb, (x, y), (x+w, y+h), (0, 255, 0), 2)
                                 break
-                            frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
                             img = Image.fromarray(frame_rgb)
                             imgtk = ImageTk.PhotoImage(image=img)
                             l_video.imgtk = imgtk
                             l_video.configure(image=imgtk)
-                        l_video.after(100, mostrar_video)
+                        l_video.after(INTERVALO_VIDEO_MS, mostrar_video)
 
                     Button(camera_window, text="Tirar Foto", command=tirar_foto,
                            bg="#4caf50", fg="white", font=("Arial", 12, "bold")).pack(pady=10)
-                    Button(camera_window, text="Fechar", command=lambda: [cap.release(), camera_window.destroy()],
+                    Button(camera_window, text="Fechar", command=fechar_camera,
                            bg="#f44336", fg="white", font=("Arial", 12, "bold")).pack(pady=10)
 
                     mostrar_video()
@@ -333,7 +369,13 @@ class SistemaReconhecimentoFacial:
                 def salvar_alteracao():
                     novo_nome = entry_nome.get()
                     nova_data = entry_data.get()
-                    update_user(usuario[3], nome=novo_nome, data_nascimento=nova_data)
+                    if usando_servidor():
+                        # As fotos novas já foram para o servidor em salvar_novas_fotos
+                        if not obter_motor().alterar_usuario(usuario[3], novo_nome, nova_data):
+                            messagebox.showerror("Erro", "Usuário não encontrado no servidor.")
+                            return
+                    else:
+                        update_user(usuario[3], nome=novo_nome, data_nascimento=nova_data)
                     if novas_imagens_faciais:
                         imagens_str = ";".join(novas_imagens_faciais)
                         update_user(usuario[3], imagem_facial=imagens_str)
@@ -346,9 +388,7 @@ class SistemaReconhecimentoFacial:
 
         def excluir():
             cpf = entry_cpf.get()
-            usuario = get_user_by_cpf(cpf)
-            if usuario:
-                delete_user(cpf)
+            if buscar_usuario(cpf) and excluir_usuario(cpf):
                 messagebox.showinfo("Excluir", "Usuário excluído com sucesso!")
             else:
                 messagebox.showerror("Erro", "Usuário não encontrado!")
@@ -362,11 +402,7 @@ class SistemaReconhecimentoFacial:
             lista_window.geometry("400x400")
             lista_window.configure(bg="#f0f0f0")
 
-            conn = connect_to_database()
-            cursor = conn.cursor()
-            cursor.execute("SELECT id, nome, cpf FROM usuarios")
-            usuarios = cursor.fetchall()
-            conn.close()
+            usuarios = obter_motor().listar_usuarios() if usando_servidor() else get_all_users()
 
             Label(lista_window, text="Selecione um usuário:", font=("Arial", 14, "bold"), bg="#f0f0f0").pack(pady=10)
             listbox = Listbox(lista_window, font=("Arial", 12), width=40)
@@ -388,8 +424,10 @@ class SistemaReconhecimentoFacial:
                 Label(opcoes_window, text=f"{usuario[1]}\nCPF: {usuario[2]}", font=("Arial", 14, "bold"), bg="#f0f0f0").pack(pady=20)
 
                 def excluir_selecionado():
-                    delete_user(usuario[2])
-                    messagebox.showinfo("Excluir", "Usuário excluído com sucesso!")
+                    if excluir_usuario(usuario[2]):
+                        messagebox.showinfo("Excluir", "Usuário excluído com sucesso!")
+                    else:
+                        messagebox.showerror("Erro", "Usuário não encontrado!")
                     opcoes_window.destroy()
                     lista_window.destroy()
 
@@ -421,97 +459,155 @@ class SistemaReconhecimentoFacial:
         l_video = Label(frame_video, bg="#222")
         l_video.pack(expand=True)
 
-        cap = cv2.VideoCapture(0)
-        cap.set(cv2.CAP_PROP_FRAME_WIDTH, 320)
-        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 240)
+        captura = CapturaCamera(largura=320, altura=240)
+        captura.iniciar()
+        self.fechar_com_captura(login_window, captura)
 
         autenticado = [False]
         ultima_verificacao = [time.time()]
-        ultimo_frame = [None]
-        lock = threading.Lock()
-
-        def carregar_embeddings():
-            embeddings = {}
-            if not os.path.exists("faces"):
-                return embeddings
-            for cpf in os.listdir("faces"):
-                for arquivo in os.listdir(os.path.join("faces", cpf)):
-                    if arquivo.endswith(".npy"):
-                        emb_path = os.path.join("faces", cpf, arquivo)
-                        embeddings.setdefault(cpf, []).append(np.load(emb_path))
-            return embeddings
-
-        embeddings_cadastrados = carregar_embeddings()
-
-        ultimo_rosto_presente = [None]
+        ultima_exibida = [-1]
+
+        motor = obter_motor()
+        # Detecção completa a cada 10 frames; entre elas o rosto é seguido por template matching
+        rastreador = RastreadorRosto(intervalo_deteccao=10)
+        trilha_atual = [None]  # trilha do rosto na tela (id estável enquanto ele for seguido)
         tempo_espera = 4.0  # segundos
+        # Filtro de qualidade: só frames nítidos, bem expostos e de frente chegam ao ArcFace
+        avaliador = obter_avaliador()
+        contadores = obter_contadores()
+        melhor_frame = JanelaMelhorFrame(validade_s=1.5)
+        metricas = obter_metricas()
+        overlay = [[], 0.0]  # linhas do overlay de métricas e quando foram calculadas
+        trilha_sondada = [None]  # id da última trilha cuja espera já foi medida
+        rostos_atuais = [None]  # (time.time(), resultados) da última identificação de vários rostos
 
         label_posicione = Label(
             login_window,
-            text="Posicione o rosto",
+            text="Posicione o rosto" if motor.pronto() else "Carregando modelo...",
             font=("Arial", 22, "bold"),
-            fg="#00ff88",
+            fg="#00ff88" if motor.pronto() else "#ffcc00",
             bg="#222"
         )
         label_posicione.place(relx=0.5, rely=0.12, anchor="center")
 
         def mostrar_video():
+            if not login_window.winfo_exists():
+                captura.parar()
+                return
             if not autenticado[0]:
-                ret, frame = cap.read()
-                if ret:
-                    face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-                    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-                    faces = face_cascade.detectMultiScale(gray, 1.1, 4)
-                    agora = time.time()
-                    if len(faces) > 0:
-                        x, y, w, h = faces[0]
-                        cor = (0, 255, 0) if autenticado[0] else (0, 0, 255)
-                        cv2.rectangle(frame, (x, y), (x+w, y+h), cor, 2)
-                        if ultimo_rosto_presente[0] is None:
-                            ultimo_rosto_presente[0] = agora
-                    else:
-                        ultimo_rosto_presente[0] = None
-                    with lock:
-                        ultimo_frame[0] = frame.copy()
-                    frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                    img = Image.fromarray(frame_rgb)
-                    imgtk = ImageTk.PhotoImage(image=img)
-                    l_video.imgtk = imgtk
-                    l_video.configure(image=imgtk)
-                l_video.after(100, mostrar_video)
+                frame, instante, sequencia = captura.ultimo_frame()
+                if frame is not None and sequencia != ultima_exibida[0]:
+                    ultima_exibida[0] = sequencia
+                    if metricas.ativo:
+                        metricas.registrar("captura.idade_frame", (time.perf_counter() - instante) * 1000)
+                    with metricas.span("login.rastreador"):
+                        trilha = rastreador.atualizar(frame)
+                    trilha_atual[0] = trilha
+                    mensagem, cor_mensagem = "Posicione o rosto", "#00ff88"
+                    if trilha is not None:
+                        with metricas.span("login.qualidade"):
+                            avaliacao = avaliador.avaliar(frame, trilha.caixa)
+                            aprovado = melhor_frame.oferecer(frame, trilha.caixa, avaliacao)
+                        if not aprovado and not avaliacao.aprovado:
+                            mensagem, cor_mensagem = avaliacao.mensagem, "#ffcc00"
+                    if motor.pronto() and label_posicione.cget("text") != mensagem:
+                        label_posicione.config(text=mensagem, fg=cor_mensagem)
+                    with metricas.span("login.exibicao"):
+                        # Desenha na cópia RGB: o frame é do buffer compartilhado da captura
+                        frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+                        rostos = rostos_atuais[0]
+                        if rostos is not None and time.time() - rostos[0] < VALIDADE_ROSTOS_S:
+                            # Uma caixa por rosto: verde reconhecido, vermelho desconhecido
+                            for rosto in rostos[1]:
+                                x, y, w, h = rosto.caixa
+                                cor = (0, 255, 0) if rosto.reconhecido else (255, 0, 0)
+                                cv2.rectangle(frame_rgb, (x, y), (x+w, y+h), cor, 2)
+                                rotulo = f"{rosto.acuracia}%" if rosto.reconhecido else "?"
+                                cv2.putText(frame_rgb, rotulo, (x, max(10, y - 4)), cv2.FONT_HERSHEY_PLAIN,
+                                            0.9, cor, 1, cv2.LINE_AA)
+                        elif trilha is not None:
+                            x, y, w, h = trilha.caixa
+                            cor = (0, 255, 0) if autenticado[0] or trilha.identificada else (255, 0, 0)
+                            cv2.rectangle(frame_rgb, (x, y), (x+w, y+h), cor, 2)
+                        if metricas.ativo:
+                            # Overlay de depuração: p50/p95/p99 (ms) por etapa, recalculado a cada 0,5 s
+                            if time.perf_counter() - overlay[1] > 0.5:
+                                overlay[0] = ["etapa                   p50     p95     p99"] + \
+                                    metricas.linhas_overlay(ETAPAS_OVERLAY)
+                                overlay[1] = time.perf_counter()
+                            for i, linha in enumerate(overlay[0]):
+                                cv2.putText(frame_rgb, linha, (4, 12 + 11 * i), cv2.FONT_HERSHEY_PLAIN,
+                                            0.7, (255, 255, 0), 1, cv2.LINE_AA)
+                        img = Image.fromarray(frame_rgb)
+                        imgtk = ImageTk.PhotoImage(image=img)
+                        l_video.imgtk = imgtk
+                        l_video.configure(image=imgtk)
+                l_video.after(INTERVALO_VIDEO_MS, mostrar_video)
 
         def reconhecimento_em_background():
             tempo_inicio = time.time()
             tempo_limite = 30  # segundos
             while not autenticado[0]:
                 time.sleep(0.1)
+                if captura.encerrada:
+                    break  # janela fechada pelo usuário
+                if not motor.pronto():
+                    # O tempo limite só começa a contar com o modelo carregado
+                    tempo_inicio = time.time()
+                    continue
                 if time.time() - ultima_verificacao[0] > 1.0:
-                    with lock:
-                        frame = ultimo_frame[0].copy() if ultimo_frame[0] is not None else None
-                    if frame is not None and ultimo_rosto_presente[0] is not None:
-                        if time.time() - ultimo_rosto_presente[0] >= tempo_espera:
+                    trilha = trilha_atual[0]
+                    if trilha is not None and time.time() - trilha.inicio >= tempo_espera:
+                        if metricas.ativo and trilha_sondada[0] != trilha.id:
+                            trilha_sondada[0] = trilha.id
+                            # Atraso da sondagem de 1 s depois dos `tempo_espera` segundos obrigatórios
+                            metricas.registrar("login.sondagem",
+                                               (time.time() - trilha.inicio - tempo_espera) * 1000)
+                        # Melhor frame aprovado do último 1,5 s (já é uma cópia)
+                        candidato = melhor_frame.retirar()
+                        if candidato is None:
+                            contadores.registrar_evitada()
+                        else:
+                            frame, caixa, _ = candidato
                             try:
-                                embedding_atual = DeepFace.represent(frame, model_name="ArcFace")[0]["embedding"]
-                                for cpf, lista_embs in embeddings_cadastrados.items():
-                                    for emb_cad in lista_embs:
-                                        dist = np.linalg.norm(np.array(emb_cad) - np.array(embedding_atual))
-                                        if dist < 7:
-                                            acuracia = max(0, int((1 - dist/10) * 100))
-                                            if acuracia >= 70:
-                                                autenticado[0] = True
-                                                cap.release()
-                                                usuario = get_user_by_cpf(cpf)
-                                                nome = usuario[1] if usuario else "Usuário"
-                                                login_window.after(0, lambda: self.mostrar_acesso_liberado(cpf, nome, acuracia))
-                                                login_window.after(0, login_window.destroy)
-                                                break
-                                    if autenticado[0]:
-                                        break
+                                if VARIOS_ROSTOS:
+                                    # Todos os rostos do frame em um lote; o maior reconhecido é liberado
+                                    inicio_inferencia = time.perf_counter()
+                                    rostos = motor.identificar_rostos(frame)
+                                    milissegundos = (time.perf_counter() - inicio_inferencia) * 1000
+                                    contadores.registrar_inferencia(milissegundos)
+                                    metricas.registrar("login.reconhecimento", milissegundos)
+                                    if rostos:
+                                        metricas.registrar_tempos("motor", rostos[0].tempos)
+                                    rostos_atuais[0] = (time.time(), rostos)
+                                    resultado = next((rosto for rosto in rostos if rosto.reconhecido), None)
+                                else:
+                                    # Mesma trilha = mesma pessoa: reaproveita a identificação dela
+                                    tentativas = trilha.tentativas
+                                    inicio_inferencia = time.perf_counter()
+                                    # Embeda a caixa aprovada pela janela de qualidade, sem nova detecção
+                                    resultado = motor.identificar_trilha(frame, trilha, caixa=caixa)
+                                    if trilha.tentativas != tentativas:
+                                        milissegundos = (time.perf_counter() - inicio_inferencia) * 1000
+                                        contadores.registrar_inferencia(milissegundos)
+                                        metricas.registrar("login.reconhecimento", milissegundos)
+                                        metricas.registrar_tempos("motor", resultado.tempos)
+                                if resultado is not None and resultado.reconhecido:
+                                    cpf, acuracia = resultado.cpf, resultado.acuracia
+                                    autenticado[0] = True
+                                    contadores.registrar_liberacao(time.time() - trilha.inicio)
+                                    metricas.registrar("login.ate_liberar", (time.time() - trilha.inicio) * 1000)
+                                    captura.parar()
+                                    with metricas.span("banco.get_user_by_cpf"):
+                                        usuario = get_user_by_cpf(cpf) if resultado.nome is None else None
+                                    nome = resultado.nome or (usuario[1] if usuario else "Usuário")
+                                    login_window.after(0, lambda: self.mostrar_acesso_liberado(cpf, nome, acuracia))
+                                    login_window.after(0, login_window.destroy)
                             except Exception as e:
                                 print("Erro:", e)
                     ultima_verificacao[0] = time.time()
                 if time.time() - tempo_inicio > tempo_limite:
-                    cap.release()
+                    captura.parar()
                     login_window.after(0, lambda: messagebox.showwarning("Atenção", "Nenhum rosto reconhecido."))
                     login_window.after(0, login_window.destroy)
                     break
@@ -567,21 +663,23 @@ class SistemaReconhecimentoFacial:
         threading.Thread(target=animacao).start()
 
     def registrar_login(self, cpf, nome, acuracia):
-        agora = datetime.datetime.now()
-        data_hora = agora.strftime("%d/%m/%Y %H:%M:%S")
-        insert_login(cpf, nome, acuracia, data_hora)
-        pasta_log = "logins"
-        if not os.path.exists(pasta_log):
-            os.makedirs(pasta_log)
-        nome_arquivo = agora.strftime("%d-%m-%Y") + ".txt"
-        caminho_log = os.path.join(pasta_log, nome_arquivo)
-        with open(caminho_log, "a", encoding="utf-8") as f:
-            f.write(f"{data_hora} | CPF: {cpf} | Nome: {nome} | Acurácia: {acuracia}%\n")
+        # Só enfileira: o banco e o arquivo do dia são gravados pela thread de auditoria
+        with obter_metricas().span("auditoria.registrar"):
+            obter_registrador().registrar(cpf, nome, acuracia, datetime.datetime.now())
 
 if __name__ == "__main__":
     create_login_table()
+    iniciar_exportacao()  # métricas por etapa (só com RF_METRICAS=1)
+    if not usando_servidor():
+        # Carrega a galeria uma única vez, em segundo plano, antes do primeiro login
+        threading.Thread(target=lambda: obter_motor().galeria, daemon=True).start()
+        # Importa o DeepFace e aquece o ArcFace em segundo plano; a janela não espera
+        iniciar_aquecimento(INICIO_PROCESSO)
     root = Tk()
     sistema = SistemaReconhecimentoFacial(root)
+    root.after(0, lambda: print(f"[inicialização] primeira janela em {time.perf_counter() - INICIO_PROCESSO:.2f}s"))
     print("Sistema iniciado!")
     root.mainloop()
+    obter_registrador().encerrar()  # Grava os logins que ainda estiverem na fila
+    print("[qualidade]", obter_contadores().resumo(), dict(obter_avaliador().reprovados))
     print("Programa finalizado!")
\ No newline at end of file
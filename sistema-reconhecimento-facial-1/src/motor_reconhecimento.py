@@ -0,0 +1,346 @@
+import os
+import time
+import threading
+from dataclasses import dataclass, field
+from typing import Optional
+
+import cv2
+from utils.modelo import modelo_pronto, gerar_embeddings_lote, recortar_rosto
+from utils.detector import obter_detector
+from utils.galeria import obter_servico_galeria
+from utils.calibracao import carregar_limiar, ARQUIVO_LIMIAR
+from cadastro import gravar_embeddings
+
+# ---------- Política única de reconhecimento ----------
+# Distância euclidiana entre embeddings ArcFace (a mesma do login original):
+# aceita se dist < 7 e a acurácia (1 - dist/10) for de pelo menos 70%.
+# Na prática vale dist <= 3. Um limiar calibrado na galeria (faces/limiar.json,
+# ou RF_LIMIAR_ARQUIVO, gravado por utils/calibracao.py) substitui os dois.
+METRICA = "euclidiana"
+LIMIAR_DISTANCIA = 7.0
+ACURACIA_MINIMA = 70
+
+# Busca aproximada (índice IVF) para galerias muito grandes: número de listas
+# sondadas por consulta. 0 mantém a busca exata. Ex.: RF_N_SONDAS=8
+N_SONDAS_IVF = int(os.environ.get("RF_N_SONDAS", "0"))
+
+# Busca em cascata: quantos usuários (pelo centróide) passam para a
+# comparação exata com todas as suas linhas. 0 desliga. Ex.: RF_CANDIDATOS=32
+N_CANDIDATOS = int(os.environ.get("RF_CANDIDATOS", "0"))
+
+# Galeria quantizada: "float16" (metade da memória) ou "int8" (um quarto),
+# com as melhores linhas reordenadas em float32. Vazio mantém só float32.
+QUANTIZACAO = os.environ.get("RF_QUANTIZACAO", "")
+
+# Frames maiores que isso são reduzidos antes da detecção/embedding
+LADO_MAXIMO = 640
+
+# Identificação de vários rostos (identificar_rostos): rostos menores que
+# isso (lado em pixels do frame) são ignorados, e no máximo MAXIMO_ROSTOS
+# (os maiores) entram no lote do ArcFace.
+TAMANHO_MINIMO_ROSTO = 60
+MAXIMO_ROSTOS = 8
+
+# Servidor de reconhecimento (servidor.py) compartilhado entre quiosques.
+# Se definido, obter_motor() devolve um cliente HTTP em vez de carregar o
+# ArcFace neste processo. Ex.: RF_SERVIDOR=http://127.0.0.1:8765
+URL_SERVIDOR = os.environ.get("RF_SERVIDOR", "")
+
+
+@dataclass
+class ResultadoReconhecimento:
+    """Resultado de uma identificação (1:N) ou verificação (1:1)."""
+    cpf: Optional[str] = None
+    distancia: Optional[float] = None
+    acuracia: int = 0
+    reconhecido: bool = False
+    tempos: dict = field(default_factory=dict)  # milissegundos por etapa
+    nome: Optional[str] = None                  # preenchido pelo servidor de reconhecimento
+    caixa: Optional[tuple] = None               # (x, y, w, h) no frame, em identificar_rostos
+
+
+class MotorReconhecimento:
+    """
+    Motor de reconhecimento compartilhado por main.py, login.Login e
+    ReconhecimentoFacial: pré-processamento, embedding ArcFace, busca na
+    galeria e limiares ficam todos aqui.
+    """
+
+    def __init__(self, galeria=None, metrica=METRICA, limiar=None, acuracia_minima=None):
+        self._galeria = galeria
+        self.metrica = metrica
+        calibrado = carregar_limiar(metrica=metrica) if limiar is None and acuracia_minima is None else None
+        if calibrado is not None:
+            print(f"[calibração] limiar {calibrado['limiar']:.3f} de {ARQUIVO_LIMIAR} "
+                  f"(FPIR {calibrado.get('fpir', float('nan')):.2g})")
+            limiar = float(calibrado["limiar"])
+            acuracia_minima = calibrado.get("acuracia_minima", 0)
+        self.limiar = LIMIAR_DISTANCIA if limiar is None else limiar
+        self.acuracia_minima = ACURACIA_MINIMA if acuracia_minima is None else acuracia_minima
+        # CPFs cujas imagens não geraram nenhum embedding (evita tentar a cada busca)
+        self._cpfs_sem_embeddings = set()
+
+    @property
+    def galeria(self):
+        if self._galeria is None:
+            self._galeria = obter_servico_galeria("faces", n_sondas=N_SONDAS_IVF or None,
+                                                  n_candidatos=N_CANDIDATOS or None,
+                                                  quantizacao=QUANTIZACAO or None)
+        return self._galeria
+
+    # ---------- Etapas ----------
+
+    def preprocessar(self, frame):
+        """Valida o frame, garante 3 canais BGR e reduz frames muito grandes."""
+        if frame is None:
+            raise ValueError("Imagem inválida para reconhecimento.")
+        if frame.ndim == 2:
+            frame = cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)
+        h, w = frame.shape[:2]
+        if max(h, w) > LADO_MAXIMO:
+            escala = LADO_MAXIMO / max(h, w)
+            frame = cv2.resize(frame, (int(w * escala), int(h * escala)), interpolation=cv2.INTER_AREA)
+        return frame
+
+    def gerar_embedding(self, imagem, tempos=None, caixa=None):
+        """
+        Embedding ArcFace do rosto na `caixa` ou, sem ela, do maior rosto da
+        imagem, por embeddings_de_frames (o mesmo caminho do cadastro). Sem
+        rosto, levanta ValueError.
+        """
+        embedding = self.embeddings_de_frames([imagem], tempos, [caixa])[0]
+        if embedding is None:
+            raise ValueError("Nenhum rosto detectado na imagem.")
+        return embedding
+
+    def calcular_acuracia(self, distancia):
+        """Converte a distância em uma acurácia de 0 a 100."""
+        if self.metrica == "cosseno":
+            return max(0, int((1 - distancia) * 100))
+        return max(0, int((1 - distancia / 10) * 100))
+
+    def _avaliar(self, cpf, distancia, tempos):
+        resultado = ResultadoReconhecimento(cpf=cpf, distancia=distancia, tempos=tempos)
+        if distancia is not None:
+            resultado.acuracia = self.calcular_acuracia(distancia)
+            resultado.reconhecido = distancia < self.limiar and resultado.acuracia >= self.acuracia_minima
+        return resultado
+
+    def recortar_rosto(self, frame, caixa=None):
+        """
+        Recorte 224x224 (utils.modelo.recortar_rosto) de um frame original:
+        na `caixa` (x, y, w, h, nas coordenadas do frame) ou, sem ela, no
+        maior rosto detectado. Retorna None se não houver rosto.
+        """
+        imagem = self.preprocessar(frame)
+        if caixa is None:
+            caixa = obter_detector().primeiro_rosto(imagem)
+            if caixa is None:
+                return None
+        else:
+            escala = imagem.shape[1] / frame.shape[1]  # < 1 se o frame foi reduzido
+            altura, largura = imagem.shape[:2]
+            x, y, w, h = (int(round(v * escala)) for v in caixa)
+            x0, y0 = max(0, x), max(0, y)
+            x1, y1 = min(largura, x + w), min(altura, y + h)
+            if x1 <= x0 or y1 <= y0:
+                return None
+            caixa = (x0, y0, x1 - x0, y1 - y0)
+        return recortar_rosto(imagem, caixa)
+
+    def embeddings_de_frames(self, frames, tempos=None, caixas=None):
+        """
+        Caminho único dos embeddings de consulta (identificar, verificar,
+        reconhecer_lote, identificar_rostos e servidor): cada frame é
+        pré-processado e recortado como no cadastro, e todos os recortes vão
+        para um único forward do ArcFace. `caixas`, opcional e alinhada com
+        `frames`, dá a caixa do rosto em cada frame (ex.: a do rastreador);
+        onde falta, o maior rosto é detectado.
+        Retorna uma lista alinhada com `frames` (None onde não há rosto).
+        """
+        tempos = {} if tempos is None else tempos
+        caixas = caixas or [None] * len(frames)
+        inicio = time.perf_counter()
+        recortes = [self.recortar_rosto(frame, caixa) for frame, caixa in zip(frames, caixas)]
+        validos = [i for i, recorte in enumerate(recortes) if recorte is not None]
+        meio = time.perf_counter()
+        embeddings = gerar_embeddings_lote([recortes[i] for i in validos], usar_cache=False) if validos else []
+        tempos["preprocessamento"] = (meio - inicio) * 1000
+        tempos["embedding"] = (time.perf_counter() - meio) * 1000
+        saida = [None] * len(frames)
+        for i, embedding in zip(validos, embeddings):
+            saida[i] = embedding
+        return saida
+
+    def pronto(self):
+        """True quando o modelo já pode atender consultas."""
+        return modelo_pronto()
+
+    # ---------- API pública ----------
+
+    def identificar_embedding(self, embedding, tempos=None):
+        """Busca 1:N de um embedding já calculado."""
+        tempos = {} if tempos is None else tempos
+        inicio = time.perf_counter()
+        melhor = self.galeria.buscar(embedding, self.metrica)
+        tempos["busca"] = (time.perf_counter() - inicio) * 1000
+        if melhor is None:
+            return self._avaliar(None, None, tempos)
+        return self._avaliar(melhor[0], melhor[1], tempos)
+
+    def reconhecer_lote(self, frames, cpfs=None, caixas=None):
+        """
+        Reconhece vários frames com um único forward do ArcFace. Para cada
+        frame, cpf None faz identificação 1:N e um CPF faz verificação 1:1.
+        `caixas` (opcional) é a caixa já conhecida do rosto em cada frame,
+        como em embeddings_de_frames: onde ela vem, não há nova detecção.
+        """
+        cpfs = cpfs or [None] * len(frames)
+        tempos = {}
+        embeddings = self.embeddings_de_frames(frames, tempos, caixas)
+        resultados = []
+        for embedding, cpf in zip(embeddings, cpfs):
+            if embedding is None:
+                resultados.append(self._avaliar(cpf, None, dict(tempos)))
+            elif cpf is None:
+                resultados.append(self.identificar_embedding(embedding, dict(tempos)))
+            else:
+                resultados.append(self._avaliar(cpf, self.galeria.verificar(embedding, cpf, self.metrica), dict(tempos)))
+        return resultados
+
+    def identificar_rostos(self, frame, tamanho_minimo=TAMANHO_MINIMO_ROSTO, maximo=MAXIMO_ROSTOS):
+        """
+        Identifica (1:N) todos os rostos do frame, e não só o maior: os
+        recortes vão para um único forward do ArcFace e a galeria é
+        consultada com um único produto de matrizes. Retorna um resultado
+        por rosto, do maior para o menor, com a `caixa` nas coordenadas do frame.
+        """
+        inicio = time.perf_counter()
+        tempos = {}
+        imagem = self.preprocessar(frame)
+        escala = frame.shape[1] / imagem.shape[1]  # > 1 se o frame foi reduzido
+        caixas = obter_detector().detectar(imagem, tamanho_minimo=max(1, int(tamanho_minimo / escala)))
+        caixas = [tuple(int(v) for v in caixa) for caixa in caixas[:maximo]]
+        tempos["deteccao"] = (time.perf_counter() - inicio) * 1000
+        if not caixas:
+            return []
+        embeddings = self.embeddings_de_frames([imagem] * len(caixas), tempos, caixas)
+        inicio_busca = time.perf_counter()
+        melhores = self.galeria.buscar_lote(embeddings, self.metrica)
+        tempos["busca"] = (time.perf_counter() - inicio_busca) * 1000
+        tempos["total"] = (time.perf_counter() - inicio) * 1000
+        resultados = []
+        for (x, y, w, h), melhor in zip(caixas, melhores):
+            resultado = self._avaliar(*(melhor or (None, None)), dict(tempos))
+            resultado.caixa = tuple(int(round(v * escala)) for v in (x, y, w, h))
+            resultados.append(resultado)
+        return resultados
+
+    def identificar(self, frame, caixa=None):
+        """
+        Identifica quem está no frame (1:N). `caixa` (opcional) é a caixa já
+        conhecida do rosto, como em embeddings_de_frames. Erros do modelo são
+        propagados.
+        """
+        inicio = time.perf_counter()
+        tempos = {}
+        embedding = self.gerar_embedding(frame, tempos, caixa)
+        resultado = self.identificar_embedding(embedding, tempos)
+        tempos["total"] = (time.perf_counter() - inicio) * 1000
+        return resultado
+
+    def identificar_trilha(self, frame, trilha, intervalo_nova_tentativa=3.0, caixa=None):
+        """
+        Identificação ligada a uma trilha do rastreador (utils/rastreador.py).
+        Um rosto já reconhecido reaproveita o resultado da trilha sem nova
+        inferência; um rosto não reconhecido só é tentado de novo depois de
+        `intervalo_nova_tentativa` segundos. `caixa` é a do rosto no `frame`
+        (padrão: trilha.caixa), embedada sem nova detecção. Retorna o
+        ResultadoReconhecimento da trilha (None se ela ainda não foi
+        identificada nenhuma vez).
+        """
+        if not trilha.reservar_identificacao(intervalo_nova_tentativa):
+            return trilha.resultado
+        resultado = None
+        try:
+            resultado = self.identificar(frame, trilha.caixa if caixa is None else caixa)
+        finally:
+            trilha.concluir_identificacao(resultado)
+        return resultado
+
+    def verificar(self, frame, cpf, imagens_cadastradas=None, caixa=None):
+        """
+        Verifica se o frame é do CPF informado (1:1) com uma única inferência.
+        Se o usuário só tiver JPGs (`imagens_cadastradas`), os embeddings
+        dele são gerados uma vez e guardados antes da comparação.
+        """
+        inicio = time.perf_counter()
+        tempos = {}
+        embedding = self.gerar_embedding(frame, tempos, caixa)
+        inicio_busca = time.perf_counter()
+        if not self.galeria.possui_cpf(cpf) and imagens_cadastradas:
+            self.garantir_embeddings(cpf, imagens_cadastradas)
+        distancia = self.galeria.verificar(embedding, cpf, self.metrica)
+        tempos["busca"] = (time.perf_counter() - inicio_busca) * 1000
+        tempos["total"] = (time.perf_counter() - inicio) * 1000
+        return self._avaliar(cpf, distancia, tempos)
+
+    def cpfs_sem_embeddings(self, cpfs):
+        """
+        CPFs da lista que ainda não têm embeddings na galeria (usuários que
+        só têm JPGs), menos os que já falharam antes. É uma diferença de
+        conjuntos, sem varrer a matriz.
+        """
+        return set(cpfs) - self.galeria.cpfs_cadastrados() - self._cpfs_sem_embeddings
+
+    def garantir_embeddings(self, cpf, imagens_cadastradas):
+        """
+        Gera os embeddings de um usuário que só tem imagens JPG e grava no
+        armazém/galeria, para que as próximas buscas não precisem do modelo.
+        Retorna True se o usuário ficou com embeddings.
+        """
+        if self.galeria.possui_cpf(cpf):
+            return True
+        if cpf in self._cpfs_sem_embeddings:
+            return False
+        embeddings = []
+        for imagem_path in imagens_cadastradas:
+            imagem = cv2.imread(imagem_path) if os.path.exists(imagem_path) else None
+            if imagem is None:
+                continue
+            try:
+                # Os JPGs já são o recorte 224x224 do cadastro: sem nova detecção,
+                # e um JPG já visto sai do cache de embeddings
+                embeddings.append(gerar_embeddings_lote([imagem])[0])
+            except Exception as e:
+                print(f"Erro ao gerar embedding de {imagem_path}: {e}")
+        if not embeddings:
+            self._cpfs_sem_embeddings.add(cpf)
+            return False
+        gravar_embeddings(cpf, embeddings)
+        return True
+
+
+_motor = None
+_lock_motor = threading.Lock()
+
+
+def usando_servidor():
+    """True se o reconhecimento é feito pelo servidor (RF_SERVIDOR)."""
+    return bool(URL_SERVIDOR)
+
+
+def obter_motor():
+    """
+    Retorna o motor de reconhecimento do processo: o local ou, com
+    RF_SERVIDOR definido, o cliente do servidor de reconhecimento.
+    """
+    global _motor
+    with _lock_motor:
+        if _motor is None:
+            if usando_servidor():
+                from cliente_reconhecimento import ClienteReconhecimento
+                _motor = ClienteReconhecimento(URL_SERVIDOR)
+            else:
+                _motor = MotorReconhecimento()
+        return _motor
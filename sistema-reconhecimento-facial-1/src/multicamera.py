@@ -0,0 +1,379 @@
+"""
+Reconhecimento em várias câmeras ao mesmo tempo (ex.: quatro entradas
+ligadas a um único computador), sem interface Tk.
+
+Cada fonte (webcam, arquivo de vídeo, pasta de imagens ou sintética) tem a própria thread de
+captura e o próprio laço de detecção/rastreamento/qualidade. Os pedidos de
+reconhecimento de todas as fontes vão para um único trabalhador de
+inferência, dono do modelo, que monta lotes pegando um pedido de cada fonte
+por vez (rodízio). Assim, uma entrada movimentada não atrasa as outras, e cada
+lote é um único forward do ArcFace.
+
+Uso (a partir da raiz do projeto):
+    python src/multicamera.py 0 1 2 3
+    python src/multicamera.py videos/entrada1.mp4 videos/entrada2.mp4 --repetir --mostrar
+"""
+import os
+import sys
+import time
+import argparse
+import datetime
+import threading
+from collections import deque
+from dataclasses import dataclass
+
+os.environ.setdefault('TF_CPP_MIN_LOG_LEVEL', '3')  # Suprime avisos e infos do TensorFlow
+
+import cv2
+import numpy as np
+from utils.captura import CapturaCamera
+from utils.detector import DetectorRostos
+from utils.rastreador import RastreadorRosto
+from utils.qualidade import AvaliadorQualidade, JanelaMelhorFrame
+from utils.metricas import obter_metricas, iniciar_exportacao
+from utils.database import get_user_by_cpf, create_login_table
+from utils.auditoria import obter_registrador
+from utils.modelo import iniciar_aquecimento
+from motor_reconhecimento import obter_motor, usando_servidor
+
+
+@dataclass
+class PedidoReconhecimento:
+    """Um frame aprovado de uma trilha, aguardando o trabalhador de inferência."""
+    fonte: int
+    trilha: object
+    frame: np.ndarray
+    caixa: tuple     # (x, y, w, h) do rosto no frame, do rastreador: o trabalhador não detecta de novo
+    instante: float  # time.perf_counter() do envio
+
+
+# ---------- Trabalhador de inferência compartilhado ----------
+
+class TrabalhadorInferencia:
+    """
+    Única thread que chama o modelo. Cada fonte tem uma fila curta (os pedidos
+    mais antigos são descartados quando ela enche, porque um frame mais novo
+    da mesma pessoa vale mais). Os lotes são montados em rodízio, um pedido
+    por fonte de cada vez, começando pela fonte seguinte à do último lote.
+    """
+
+    def __init__(self, motor, n_fontes, lote_maximo=8, fila_por_fonte=2):
+        self.motor = motor
+        self.lote_maximo = lote_maximo
+        self._filas = [deque(maxlen=fila_por_fonte) for _ in range(n_fontes)]
+        self._condicao = threading.Condition()
+        self._vez = 0
+        self._parar = False
+        self._thread = None
+        self._metricas = obter_metricas()
+        self.descartados = [0] * n_fontes
+        self.atendidos = [0] * n_fontes
+        self.lotes = 0
+        self.pedidos = 0
+        self.ms_lotes = 0.0
+        self.erros = 0
+
+    def iniciar(self):
+        self._thread = threading.Thread(target=self._executar, name="inferencia-compartilhada", daemon=True)
+        self._thread.start()
+
+    def parar(self):
+        with self._condicao:
+            self._parar = True
+            self._condicao.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=5.0)
+
+    def enviar(self, pedido, ao_concluir):
+        """Enfileira o pedido; `ao_concluir(pedido, resultado_ou_None)` roda na thread do trabalhador."""
+        with self._condicao:
+            fila = self._filas[pedido.fonte]
+            if len(fila) == fila.maxlen:
+                antigo, callback = fila[0]
+                self.descartados[pedido.fonte] += 1
+                callback(antigo, None)  # libera a trilha do pedido descartado
+            fila.append((pedido, ao_concluir))
+            self._condicao.notify()
+
+    def profundidade(self, fonte):
+        return len(self._filas[fonte])
+
+    def _proximo_lote(self):
+        """Rodízio entre as fontes com pedidos (chamar com a condição)."""
+        lote = []
+        n = len(self._filas)
+        while len(lote) < self.lote_maximo and any(self._filas):
+            for passo in range(n):
+                fonte = (self._vez + passo) % n
+                if self._filas[fonte] and len(lote) < self.lote_maximo:
+                    lote.append(self._filas[fonte].popleft())
+                    ultima = fonte
+            self._vez = (ultima + 1) % n
+        return lote
+
+    def _executar(self):
+        # Pedidos chegam enquanto o modelo aquece; o primeiro lote espera por ele
+        while not self.motor.pronto() and not self._parar:
+            time.sleep(0.1)
+        while True:
+            with self._condicao:
+                while not self._parar and not any(self._filas):
+                    self._condicao.wait()
+                if self._parar:
+                    return
+                lote = self._proximo_lote()
+            inicio = time.perf_counter()
+            try:
+                resultados = self.motor.reconhecer_lote([pedido.frame for pedido, _ in lote],
+                                                        caixas=[pedido.caixa for pedido, _ in lote])
+            except Exception as e:
+                print("Erro no reconhecimento em lote:", e)
+                self.erros += 1
+                resultados = [None] * len(lote)
+            milissegundos = (time.perf_counter() - inicio) * 1000
+            self.lotes += 1
+            self.pedidos += len(lote)
+            self.ms_lotes += milissegundos
+            self._metricas.registrar("multicamera.lote", milissegundos)
+            for (pedido, ao_concluir), resultado in zip(lote, resultados):
+                self.atendidos[pedido.fonte] += 1
+                self._metricas.registrar("multicamera.espera_fila", (inicio - pedido.instante) * 1000)
+                try:
+                    ao_concluir(pedido, resultado)
+                except Exception as e:
+                    print("Erro ao tratar o resultado do reconhecimento:", e)
+
+    def estatisticas(self):
+        return {
+            "lotes": self.lotes,
+            "pedidos": self.pedidos,
+            "media_lote": self.pedidos / self.lotes if self.lotes else 0.0,
+            "ms_por_lote": self.ms_lotes / self.lotes if self.lotes else 0.0,
+            "erros": self.erros,
+        }
+
+
+# ---------- Laço de uma fonte ----------
+
+class LacoFonte:
+    """
+    Detecção, rastreamento e filtro de qualidade de uma fonte. Uma trilha não
+    reconhecida envia o melhor frame recente depois de `tempo_espera`
+    segundos, com no máximo um pedido pendente por vez e nova tentativa a
+    cada `intervalo_nova_tentativa` segundos.
+    """
+
+    def __init__(self, indice, fonte, trabalhador, ao_reconhecer, repetir=False,
+                 tempo_espera=1.0, intervalo_nova_tentativa=3.0, largura=None, altura=None):
+        self.indice = indice
+        self.trabalhador = trabalhador
+        self.ao_reconhecer = ao_reconhecer
+        self.tempo_espera = tempo_espera
+        self.intervalo_nova_tentativa = intervalo_nova_tentativa
+        self.captura = CapturaCamera(fonte, largura=largura, altura=altura, repetir=repetir)
+        # Detector próprio: o detectMultiScale de uma fonte não espera o lock de outra
+        self.rastreador = RastreadorRosto(detector=DetectorRostos(), intervalo_deteccao=10)
+        self.avaliador = AvaliadorQualidade()
+        self.melhor_frame = JanelaMelhorFrame(validade_s=1.5)
+        self._avisadas = set()  # trilhas cujo reconhecimento já foi anunciado
+        self._parar = threading.Event()
+        self._thread = None
+        self._instantes = deque(maxlen=30)
+        self._metricas = obter_metricas()
+        self.ultimo = (None, None)  # (frame, trilha) mais recente, para exibição
+        self.processados = 0
+        self.enviados = 0
+        self.reconhecidos = 0
+
+    @property
+    def nome(self):
+        return self.captura.origem.nome
+
+    def iniciar(self):
+        if not self.captura.iniciar():
+            print(f"Não foi possível abrir a fonte {self.nome}.")
+            return False
+        self._thread = threading.Thread(target=self._executar, name=f"fonte-{self.indice}", daemon=True)
+        self._thread.start()
+        return True
+
+    def parar(self):
+        self._parar.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+        self.captura.parar()
+
+    def _executar(self):
+        ultima_sequencia = -1
+        while not self._parar.is_set():
+            frame, _, sequencia = self.captura.ultimo_frame()
+            if frame is None or sequencia == ultima_sequencia:
+                if not self.captura.ativa:
+                    break
+                self._parar.wait(0.005)
+                continue
+            ultima_sequencia = sequencia
+            with self._metricas.span(f"fonte{self.indice}.processamento"):
+                self._processar(frame)
+            self.processados += 1
+            self._instantes.append(time.perf_counter())
+
+    def _processar(self, frame):
+        trilha = self.rastreador.atualizar(frame)
+        self.ultimo = (frame, trilha)
+        if trilha is None:
+            return
+        avaliacao = self.avaliador.avaliar(frame, trilha.caixa)
+        self.melhor_frame.oferecer(frame, trilha.caixa, avaliacao)
+        if trilha.identificada or time.time() - trilha.inicio < self.tempo_espera:
+            return
+        # Uma identificação por trilha de cada vez, concluída em _concluir
+        if not trilha.reservar_identificacao(self.intervalo_nova_tentativa):
+            return
+        candidato = self.melhor_frame.retirar()
+        if candidato is None:
+            trilha.concluir_identificacao(None)
+            return
+        self.enviados += 1
+        frame, caixa, _ = candidato
+        pedido = PedidoReconhecimento(self.indice, trilha, frame, tuple(int(v) for v in caixa), time.perf_counter())
+        self.trabalhador.enviar(pedido, self._concluir)
+
+    def _concluir(self, pedido, resultado):
+        """Chamado pelo trabalhador de inferência (ou no descarte, com resultado None)."""
+        trilha = pedido.trilha
+        trilha.concluir_identificacao(resultado)
+        if resultado is not None and resultado.reconhecido and trilha.id not in self._avisadas:
+            self._avisadas.add(trilha.id)
+            self.reconhecidos += 1
+            self.ao_reconhecer(self, resultado)
+
+    def estatisticas(self):
+        instantes = list(self._instantes)
+        fps = 0.0
+        if len(instantes) >= 2 and instantes[-1] > instantes[0]:
+            fps = (len(instantes) - 1) / (instantes[-1] - instantes[0])
+        captura = self.captura.estatisticas()
+        return {
+            "fonte": self.nome,
+            "fps_captura": captura["fps"],
+            "fps_processamento": fps,
+            "processados": self.processados,
+            "enviados": self.enviados,
+            "na_fila": self.trabalhador.profundidade(self.indice),
+            "descartados_fila": self.trabalhador.descartados[self.indice],
+            "atendidos": self.trabalhador.atendidos[self.indice],
+            "reconhecidos": self.reconhecidos,
+            "voltas_video": captura["voltas"],
+        }
+
+
+# ---------- Modo com várias câmeras ----------
+
+def anunciar_login(laco, resultado):
+    """Padrão para `ao_reconhecer`: imprime o login e o envia para a auditoria."""
+    nome = resultado.nome
+    if nome is None:
+        usuario = get_user_by_cpf(resultado.cpf)
+        nome = usuario[1] if usuario else "Usuário"
+
+    momento = datetime.datetime.now()
+    print(f"LOGIN [{laco.nome}]: {nome} | CPF: {resultado.cpf} | "
+          f"{momento.strftime('%d/%m/%Y %H:%M:%S')} | Acurácia: {resultado.acuracia}%")
+    obter_registrador().registrar(resultado.cpf, nome, resultado.acuracia, momento)
+
+
+class ModoMulticamera:
+    """Liga N fontes a um único motor de reconhecimento."""
+
+    def __init__(self, fontes, motor=None, ao_reconhecer=anunciar_login, repetir=False,
+                 lote_maximo=8, tempo_espera=1.0, largura=None, altura=None):
+        self.motor = motor or obter_motor()
+        self.trabalhador = TrabalhadorInferencia(self.motor, len(fontes), lote_maximo=lote_maximo)
+        self.lacos = [LacoFonte(i, fonte, self.trabalhador, ao_reconhecer, repetir=repetir,
+                                tempo_espera=tempo_espera, largura=largura, altura=altura)
+                      for i, fonte in enumerate(fontes)]
+
+    def iniciar(self):
+        self.trabalhador.iniciar()
+        abertas = [laco.iniciar() for laco in self.lacos]
+        return any(abertas)
+
+    def parar(self):
+        for laco in self.lacos:
+            laco.parar()
+        self.trabalhador.parar()
+
+    def estatisticas(self):
+        return {"fontes": [laco.estatisticas() for laco in self.lacos],
+                "inferencia": self.trabalhador.estatisticas()}
+
+    def mosaico(self, lado=320):
+        """Últimos frames de todas as fontes lado a lado, com a caixa de cada trilha."""
+        quadros = []
+        for laco in self.lacos:
+            frame, trilha = laco.ultimo
+            if frame is None:
+                quadros.append(np.zeros((lado * 3 // 4, lado, 3), dtype=np.uint8))
+                continue
+            escala = lado / frame.shape[1]
+            quadro = cv2.resize(frame, (lado, int(frame.shape[0] * escala)))
+            if trilha is not None:
+                x, y, w, h = (int(v * escala) for v in trilha.caixa)
+                cor = (0, 255, 0) if trilha.identificada else (0, 0, 255)
+                cv2.rectangle(quadro, (x, y), (x + w, y + h), cor, 2)
+            cv2.putText(quadro, laco.nome, (4, 14), cv2.FONT_HERSHEY_PLAIN, 1.0, (255, 255, 0), 1, cv2.LINE_AA)
+            quadros.append(quadro)
+        altura = max(q.shape[0] for q in quadros)
+        return np.hstack([cv2.copyMakeBorder(q, 0, altura - q.shape[0], 0, 0, cv2.BORDER_CONSTANT) for q in quadros])
+
+
+def _imprimir_estatisticas(estatisticas):
+    for fonte in estatisticas["fontes"]:
+        print(f"  [{fonte['fonte']}] captura {fonte['fps_captura']:.1f} fps, processamento "
+              f"{fonte['fps_processamento']:.1f} fps, fila {fonte['na_fila']}, enviados {fonte['enviados']}, "
+              f"descartados {fonte['descartados_fila']}, reconhecidos {fonte['reconhecidos']}")
+    inferencia = estatisticas["inferencia"]
+    print(f"  [inferência] {inferencia['lotes']} lotes, {inferencia['media_lote']:.1f} frames/lote, "
+          f"{inferencia['ms_por_lote']:.0f} ms/lote")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reconhecimento facial em várias câmeras com um único modelo.")
+    parser.add_argument("fontes", nargs="+", help="Índices de webcam (0, 1...), vídeos, pastas de imagens ou \"sintetico\"")
+    parser.add_argument("--repetir", action="store_true", help="Volta os vídeos ao início quando acabam")
+    parser.add_argument("--lote-maximo", type=int, default=8, help="Frames por forward do ArcFace")
+    parser.add_argument("--espera", type=float, default=1.0, help="Segundos com o rosto na tela antes de reconhecer")
+    parser.add_argument("--intervalo-estatisticas", type=float, default=5.0)
+    parser.add_argument("--mostrar", action="store_true", help="Mostra um mosaico das fontes (precisa de GUI no OpenCV)")
+    args = parser.parse_args()
+
+    create_login_table()
+    iniciar_exportacao()
+    if not usando_servidor():
+        threading.Thread(target=lambda: obter_motor().galeria, daemon=True).start()
+        iniciar_aquecimento()
+    modo = ModoMulticamera(args.fontes, repetir=args.repetir, lote_maximo=args.lote_maximo, tempo_espera=args.espera)
+    if not modo.iniciar():
+        sys.exit("Nenhuma fonte pôde ser aberta.")
+    print(f"{len(args.fontes)} fontes em execução. Ctrl+C para encerrar.")
+    try:
+        ultimo_relatorio = time.perf_counter()
+        while any(laco.captura.ativa for laco in modo.lacos):
+            if args.mostrar:
+                cv2.imshow("Multicâmera", modo.mosaico())
+                if cv2.waitKey(30) & 0xFF == ord("q"):
+                    break
+            else:
+                time.sleep(0.2)
+            if time.perf_counter() - ultimo_relatorio >= args.intervalo_estatisticas:
+                ultimo_relatorio = time.perf_counter()
+                _imprimir_estatisticas(modo.estatisticas())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        modo.parar()
+        if args.mostrar:
+            cv2.destroyAllWindows()
+        _imprimir_estatisticas(modo.estatisticas())
+        obter_registrador().encerrar()
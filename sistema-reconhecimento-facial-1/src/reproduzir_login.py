@@ -0,0 +1,217 @@
+"""
+Login facial sem interface contra uma gravação (vídeo, pasta de imagens ou
+frames sintéticos), para medir o pipeline sem webcam.
+
+Cada frame passa pelo mesmo caminho da janela de login: rastreador, filtro
+de qualidade e janela do melhor frame. Uma trilha é sondada a cada
+`--intervalo` s depois de `--espera` s na tela, com nova inferência no máximo
+a cada 3 s, como em main.py.
+
+  - Com ritmo (padrão), a gravação é lida no FPS dela por uma CapturaCamera,
+    como uma câmera: frames são descartados enquanto o pipeline está ocupado
+    e o tempo até identificar é o de relógio.
+  - Com --sem-ritmo, todos os frames são processados o mais rápido possível.
+    O FPS relatado é a vazão do pipeline, e o tempo até identificar é medido
+    no tempo do vídeo (frame / FPS da gravação), sem contar a inferência.
+
+Uso (a partir da raiz do projeto):
+    python src/reproduzir_login.py gravacoes/ana.mp4
+    python src/reproduzir_login.py gravacoes/ana.mp4 --sem-ritmo --esperado 12345678900
+    python src/reproduzir_login.py gravacoes/sessao1/ --continuar --json relatorio.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+os.environ.setdefault('TF_CPP_MIN_LOG_LEVEL', '3')  # Suprime avisos e infos do TensorFlow
+
+from utils.fontes import FONTE_PADRAO, criar_fonte
+from utils.captura import CapturaCamera
+from utils.detector import DetectorRostos
+from utils.rastreador import RastreadorRosto
+from utils.qualidade import AvaliadorQualidade, JanelaMelhorFrame
+from utils.metricas import obter_metricas
+from utils.modelo import iniciar_aquecimento
+from motor_reconhecimento import obter_motor, usando_servidor
+
+
+class ReproducaoLogin:
+    """Roda o pipeline do login sobre uma fonte gravada e devolve um relatório."""
+
+    def __init__(self, fonte, motor=None, ritmo=True, tempo_espera=4.0, intervalo_sondagem=1.0,
+                 intervalo_nova_tentativa=3.0, parar_ao_identificar=True, largura=320, altura=240):
+        self.origem = criar_fonte(fonte, largura, altura)
+        self.motor = motor or obter_motor()
+        self.ritmo = ritmo
+        self.tempo_espera = tempo_espera
+        self.intervalo_sondagem = intervalo_sondagem
+        self.intervalo_nova_tentativa = intervalo_nova_tentativa
+        self.parar_ao_identificar = parar_ao_identificar
+        # Objetos próprios (sem os singletons do app) para não misturar contadores
+        self.rastreador = RastreadorRosto(detector=DetectorRostos(), intervalo_deteccao=10)
+        self.avaliador = AvaliadorQualidade()
+        self.melhor_frame = JanelaMelhorFrame(validade_s=1.5)
+        self._metricas = obter_metricas()
+
+    def _frames(self):
+        """(frame, relógio em s) de cada frame a processar, e a captura usada (ou None)."""
+        if not self.ritmo:
+            if not self.origem.abrir():
+                raise OSError(f"Não foi possível abrir a fonte {self.origem.nome}.")
+            try:
+                for indice, frame in enumerate(self.origem):
+                    yield frame, indice / self.origem.fps
+            finally:
+                self.origem.fechar()
+            return
+        captura = self.captura = CapturaCamera(self.origem)
+        if not captura.iniciar():
+            raise OSError(f"Não foi possível abrir a fonte {self.origem.nome}.")
+        inicio = time.perf_counter()
+        ultima_sequencia = -1
+        try:
+            while True:
+                frame, _, sequencia = captura.ultimo_frame()
+                if frame is None or sequencia == ultima_sequencia:
+                    if not captura.ativa:
+                        return
+                    time.sleep(0.002)
+                    continue
+                ultima_sequencia = sequencia
+                yield frame, time.perf_counter() - inicio
+        finally:
+            captura.parar()
+
+    def executar(self):
+        self.captura = None
+        inicio_trilhas = {}      # id da trilha -> relógio em que o rosto apareceu
+        ultima_sondagem = -self.intervalo_sondagem
+        identificacoes = []
+        tempos_inferencia = []
+        evitadas = 0
+        frames = 0
+        ms_frames = 0.0
+        inicio = time.perf_counter()
+
+        for frame, relogio in self._frames():
+            frames += 1
+            inicio_frame = time.perf_counter()
+            with self._metricas.span("login.rastreador"):
+                trilha = self.rastreador.atualizar(frame)
+            if trilha is not None:
+                with self._metricas.span("login.qualidade"):
+                    avaliacao = self.avaliador.avaliar(frame, trilha.caixa)
+                    # Validade da janela no mesmo relógio das sondagens (o do vídeo, sem ritmo)
+                    self.melhor_frame.oferecer(frame, trilha.caixa, avaliacao, relogio)
+            ms_frames += (time.perf_counter() - inicio_frame) * 1000
+            if trilha is None or trilha.identificada:
+                continue
+            inicio_trilha = inicio_trilhas.setdefault(trilha.id, relogio)
+            if relogio - inicio_trilha < self.tempo_espera or relogio - ultima_sondagem < self.intervalo_sondagem:
+                continue
+            ultima_sondagem = relogio
+            # Intervalo entre tentativas no relógio do vídeo
+            if not trilha.reservar_identificacao(self.intervalo_nova_tentativa, relogio):
+                continue
+            candidato = self.melhor_frame.retirar(relogio)
+            if candidato is None:
+                trilha.concluir_identificacao(None)
+                evitadas += 1
+                continue
+            frame_candidato, caixa, _ = candidato
+            inicio_inferencia = time.perf_counter()
+            resultado = None
+            try:
+                # Embeda a caixa aprovada pelo filtro, sem nova detecção
+                resultado = self.motor.identificar(frame_candidato, caixa)
+            finally:
+                trilha.concluir_identificacao(resultado, relogio)
+            milissegundos = (time.perf_counter() - inicio_inferencia) * 1000
+            tempos_inferencia.append(milissegundos)
+            self._metricas.registrar("login.reconhecimento", milissegundos)
+            if resultado.reconhecido:
+                identificacoes.append({
+                    "trilha": trilha.id,
+                    "cpf": resultado.cpf,
+                    "acuracia": resultado.acuracia,
+                    "distancia": resultado.distancia,
+                    "frame": frames,
+                    "segundos_desde_inicio": relogio,
+                    "segundos_ate_identificar": relogio - inicio_trilha,
+                    "tentativas": trilha.tentativas,
+                })
+                if self.parar_ao_identificar:
+                    break
+
+        segundos = time.perf_counter() - inicio
+        captura = self.captura.estatisticas() if self.captura is not None else None
+        return {
+            "fonte": self.origem.nome,
+            "ritmo": self.ritmo,
+            "fps_fonte": self.origem.fps,
+            "frames": frames,
+            "segundos": segundos,
+            "fps": frames / segundos if segundos else 0.0,
+            "ms_por_frame": ms_frames / frames if frames else 0.0,
+            "frames_descartados": captura["descartados"] if captura else 0,
+            "rastreador": self.rastreador.estatisticas(),
+            "inferencias": len(tempos_inferencia),
+            "ms_inferencia_media": sum(tempos_inferencia) / len(tempos_inferencia) if tempos_inferencia else 0.0,
+            "sondagens_evitadas": evitadas,
+            "trilhas": len(inicio_trilhas),
+            "identificacoes": identificacoes,
+            "segundos_ate_identificar": identificacoes[0]["segundos_ate_identificar"] if identificacoes else None,
+        }
+
+
+def imprimir_relatorio(relatorio):
+    modo = "com ritmo" if relatorio["ritmo"] else "sem ritmo"
+    print(f"Fonte: {relatorio['fonte']} ({modo}, {relatorio['fps_fonte']:.1f} fps nominais)")
+    print(f"  {relatorio['frames']} frames em {relatorio['segundos']:.2f} s = {relatorio['fps']:.1f} fps "
+          f"({relatorio['ms_por_frame']:.2f} ms/frame em rastreador + qualidade, "
+          f"{relatorio['frames_descartados']} descartados)")
+    print(f"  {relatorio['trilhas']} trilhas, {relatorio['inferencias']} inferências "
+          f"({relatorio['ms_inferencia_media']:.0f} ms em média), {relatorio['sondagens_evitadas']} sondagens evitadas")
+    if not relatorio["identificacoes"]:
+        print("  Nenhum rosto reconhecido.")
+    for item in relatorio["identificacoes"]:
+        print(f"  Reconhecido CPF {item['cpf']} (acurácia {item['acuracia']}%) no frame {item['frame']}: "
+              f"{item['segundos_ate_identificar']:.2f} s depois de o rosto aparecer, "
+              f"{item['tentativas']} tentativa(s)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Login facial sem interface contra uma gravação.")
+    parser.add_argument("fonte", nargs="?", default=FONTE_PADRAO,
+                        help="Vídeo, pasta de imagens, \"sintetico[:foto]\" ou índice de webcam (padrão: RF_FONTE)")
+    parser.add_argument("--sem-ritmo", action="store_true", help="Processa todos os frames o mais rápido possível")
+    parser.add_argument("--continuar", action="store_true", help="Segue até o fim da gravação (todas as trilhas)")
+    parser.add_argument("--espera", type=float, default=4.0, help="Segundos com o rosto na tela antes da 1ª sondagem")
+    parser.add_argument("--intervalo", type=float, default=1.0, help="Segundos entre sondagens")
+    parser.add_argument("--esperado", help="CPF esperado; termina com código 1 se outro (ou ninguém) for reconhecido")
+    parser.add_argument("--json", help="Grava o relatório neste arquivo")
+    args = parser.parse_args()
+
+    motor = obter_motor()
+    if not usando_servidor():
+        motor.galeria  # carrega a galeria antes de começar a medir
+        iniciar_aquecimento()
+    print("Aguardando o modelo...")
+    while not motor.pronto():
+        time.sleep(0.1)
+
+    reproducao = ReproducaoLogin(args.fonte, motor, ritmo=not args.sem_ritmo, tempo_espera=args.espera,
+                                 intervalo_sondagem=args.intervalo, parar_ao_identificar=not args.continuar)
+    try:
+        relatorio = reproducao.executar()
+    except OSError as e:
+        sys.exit(str(e))
+    imprimir_relatorio(relatorio)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(relatorio, f, indent=2, ensure_ascii=False)
+    if args.esperado:
+        reconhecido = relatorio["identificacoes"][0]["cpf"] if relatorio["identificacoes"] else None
+        sys.exit(0 if reconhecido == args.esperado else 1)
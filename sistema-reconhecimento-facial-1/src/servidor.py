@@ -0,0 +1,429 @@
+"""
+Servidor de reconhecimento: um único processo com o ArcFace carregado atende
+vários quiosques pela rede local (HTTP) ou por um socket Unix.
+
+Rotas (imagens em JPEG):
+  POST /identify        corpo = JPEG do frame           -> resultado 1:N
+  POST /identify/all    corpo = JPEG do frame           -> {rostos: [resultado 1:N com caixa]}
+  POST /verify/<cpf>    corpo = JPEG do frame           -> resultado 1:1
+                        /identify e /verify aceitam ?caixa=x,y,w,h (rosto já
+                        localizado no JPEG, ex.: pelo rastreador): sem nova detecção
+  POST /enroll          corpo = JSON {cpf, nome, data_nascimento,
+                        imagens: [JPEG em base64], recortadas: bool}
+  POST /reenroll/<cpf>  corpo = JSON {imagens: [JPEG em base64], recortadas: bool}
+                        troca as fotos e os embeddings de um usuário cadastrado
+  GET  /users           -> {usuarios: [{id, nome, cpf}]}
+  GET  /users/<cpf>     -> {id, nome, data_nascimento, cpf}
+  PUT  /users/<cpf>     corpo = JSON {nome, data_nascimento} (tela de edição)
+  DELETE /users/<cpf>   exclui do banco, das fotos, do armazém e da galeria
+  GET  /saude           estado do modelo, da fila e dos lotes
+
+Requisições simultâneas de identify/verify são agrupadas em micro-lotes: o
+primeiro pedido espera no máximo `espera_maxima_ms` por companhia e o lote
+inteiro passa por um único forward do ArcFace. Os pedidos de identify/all
+entram na mesma fila (e no mesmo lote, com um forward por frame). Com a fila
+cheia o servidor responde 503 na hora (com Retry-After) em vez de acumular atraso.
+
+Uso (a partir da raiz do projeto):
+    python src/servidor.py --porta 8765
+    python src/servidor.py --unix /tmp/reconhecimento.sock
+E nos quiosques:
+    RF_SERVIDOR=http://127.0.0.1:8765 python src/main.py
+"""
+import os
+import json
+import time
+import base64
+import asyncio
+import argparse
+from dataclasses import asdict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import unquote, urlsplit, parse_qs
+
+import numpy as np
+import cv2
+
+os.environ.setdefault('TF_CPP_MIN_LOG_LEVEL', '3')  # Suprime avisos e infos do TensorFlow
+
+from motor_reconhecimento import MotorReconhecimento  # noqa: E402
+from cadastro import Cadastro, gerar_variacao_unica, substituir_fotos  # noqa: E402
+from utils.database import create_user_table, get_user_by_cpf, get_all_users, update_user, delete_user  # noqa: E402
+from utils.galeria import servico_galeria_carregado  # noqa: E402
+from utils.modelo import iniciar_aquecimento, modelo_pronto, aguardar_modelo, recortar_rosto  # noqa: E402
+from utils.detector import obter_detector  # noqa: E402
+
+TAMANHO_MAXIMO_CORPO = 16 * 1024 * 1024
+MENSAGENS_STATUS = {200: "OK", 201: "Created", 400: "Bad Request", 404: "Not Found", 409: "Conflict",
+                    413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+class FilaCheia(Exception):
+    """A fila de micro-lotes está cheia (o cliente deve tentar de novo)."""
+
+
+class ErroRequisicao(Exception):
+    def __init__(self, status, mensagem):
+        super().__init__(mensagem)
+        self.status = status
+
+
+# ---------- Micro-lotes ----------
+
+class AgrupadorLotes:
+    """
+    Junta pedidos de reconhecimento que chegam juntos em um lote. Todo o
+    trabalho do modelo roda em uma única thread (`executor`), então lotes
+    nunca disputam o TensorFlow entre si; enquanto um lote roda, os pedidos
+    novos se acumulam para o próximo.
+    """
+
+    def __init__(self, motor, executor, lote_maximo=16, espera_maxima_ms=10.0, capacidade=64):
+        self.motor = motor
+        self.executor = executor
+        self.lote_maximo = lote_maximo
+        self.espera_maxima = espera_maxima_ms / 1000.0
+        self.fila = asyncio.Queue(maxsize=capacidade)
+        self.lotes = 0
+        self.pedidos = 0
+        self.rejeitados = 0
+        self.maior_lote = 0
+        self.espera_total = 0.0
+
+    async def reconhecer(self, frame, cpf=None, todos=False, caixa=None):
+        """
+        Enfileira um frame (cpf None = 1:N) e aguarda o resultado do lote.
+        todos=True identifica todos os rostos do frame e devolve uma lista.
+        `caixa` é a do rosto no frame, se já conhecida (sem nova detecção).
+        """
+        futuro = asyncio.get_running_loop().create_future()
+        try:
+            self.fila.put_nowait((frame, cpf, futuro, time.perf_counter(), todos, caixa))
+        except asyncio.QueueFull:
+            self.rejeitados += 1
+            raise FilaCheia()
+        return await futuro
+
+    async def executar(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            lote = [await self.fila.get()]
+            prazo = loop.time() + self.espera_maxima
+            while len(lote) < self.lote_maximo:
+                restante = prazo - loop.time()
+                if restante <= 0:
+                    break
+                try:
+                    lote.append(await asyncio.wait_for(self.fila.get(), restante))
+                except asyncio.TimeoutError:
+                    break
+            inicio = time.perf_counter()
+            self.espera_total += sum(inicio - item[3] for item in lote)
+            try:
+                resultados = await loop.run_in_executor(self.executor, self._processar, lote)
+                for item, resultado in zip(lote, resultados):
+                    if not item[2].done():
+                        item[2].set_result(resultado)
+            except Exception as e:
+                for item in lote:
+                    if not item[2].done():
+                        item[2].set_exception(e)
+            self.lotes += 1
+            self.pedidos += len(lote)
+            self.maior_lote = max(self.maior_lote, len(lote))
+
+    def _processar(self, lote):
+        saida = [None] * len(lote)
+        simples = [i for i, item in enumerate(lote) if not item[4]]
+        if simples:
+            resultados = self.motor.reconhecer_lote([lote[i][0] for i in simples], [lote[i][1] for i in simples],
+                                                    [lote[i][5] for i in simples])
+            for i, resultado in zip(simples, resultados):
+                resultado.tempos["lote"] = len(simples)
+                saida[i] = resultado
+        reconhecidos = [saida[i] for i in simples]
+        for i, item in enumerate(lote):
+            if item[4]:
+                # Todos os rostos de um frame já formam um lote próprio no ArcFace
+                saida[i] = self.motor.identificar_rostos(item[0])
+                reconhecidos += saida[i]
+        for resultado in reconhecidos:
+            if resultado.reconhecido:
+                usuario = get_user_by_cpf(resultado.cpf)
+                resultado.nome = usuario[1] if usuario else None
+        return saida
+
+    def estatisticas(self):
+        return {
+            "fila": self.fila.qsize(),
+            "lotes": self.lotes,
+            "pedidos": self.pedidos,
+            "rejeitados": self.rejeitados,
+            "maior_lote": self.maior_lote,
+            "lote_medio": self.pedidos / self.lotes if self.lotes else 0.0,
+            "espera_media_ms": self.espera_total / self.pedidos * 1000 if self.pedidos else 0.0,
+        }
+
+
+# ---------- Servidor ----------
+
+def _decodificar_jpeg(dados):
+    imagem = cv2.imdecode(np.frombuffer(dados, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if imagem is None:
+        raise ErroRequisicao(400, "Imagem JPEG inválida.")
+    return imagem
+
+
+def _caixa_da_consulta(consulta):
+    """Caixa (x, y, w, h) do parâmetro ?caixa=x,y,w,h, ou None se ausente."""
+    if "caixa" not in consulta:
+        return None
+    try:
+        caixa = tuple(int(v) for v in consulta["caixa"][-1].split(","))
+    except ValueError:
+        caixa = ()
+    if len(caixa) != 4 or caixa[2] <= 0 or caixa[3] <= 0:
+        raise ErroRequisicao(400, "Caixa inválida (use caixa=x,y,w,h).")
+    return caixa
+
+
+def _json_do_corpo(corpo):
+    try:
+        return json.loads(corpo)
+    except ValueError:
+        raise ErroRequisicao(400, "JSON inválido.")
+
+
+def _cpf_da_rota(caminho, prefixo):
+    cpf = unquote(caminho[len(prefixo):])
+    if not cpf:
+        raise ErroRequisicao(400, "CPF não informado.")
+    return cpf
+
+
+def _resultado_json(resultado):
+    dados = asdict(resultado)
+    if dados["distancia"] is not None:
+        dados["distancia"] = float(dados["distancia"])
+    return dados
+
+
+class ServidorReconhecimento:
+    def __init__(self, motor=None, lote_maximo=16, espera_maxima_ms=10.0, capacidade=64):
+        self.motor = motor or MotorReconhecimento()
+        # Uma thread só para o modelo: lotes e cadastros nunca rodam em paralelo no TensorFlow
+        self.executor_modelo = ThreadPoolExecutor(max_workers=1, thread_name_prefix="modelo")
+        self.agrupador = AgrupadorLotes(self.motor, self.executor_modelo, lote_maximo, espera_maxima_ms, capacidade)
+        self.inicio = time.time()
+
+    # ---------- Rotas ----------
+
+    async def _rota(self, metodo, caminho, corpo, consulta=None):
+        consulta = consulta or {}
+        loop = asyncio.get_running_loop()
+        if metodo == "GET" and caminho == "/saude":
+            return 200, {"modelo_pronto": modelo_pronto(), "ativo_ha_s": time.time() - self.inicio,
+                         **self.agrupador.estatisticas()}
+        if metodo == "GET" and caminho == "/users":
+            return await loop.run_in_executor(self.executor_modelo, self._listar_usuarios)
+        if caminho.startswith("/users/") and metodo in ("GET", "PUT", "DELETE"):
+            # Banco e galeria só mudam na thread do modelo, como no cadastro
+            cpf = _cpf_da_rota(caminho, "/users/")
+            if metodo == "GET":
+                return await loop.run_in_executor(self.executor_modelo, self._buscar_usuario, cpf)
+            if metodo == "PUT":
+                pedido = _json_do_corpo(corpo)
+                return await loop.run_in_executor(self.executor_modelo, self._alterar_usuario, cpf, pedido)
+            return await loop.run_in_executor(self.executor_modelo, self._excluir_usuario, cpf)
+        if metodo != "POST":
+            raise ErroRequisicao(404, "Rota não encontrada.")
+        if caminho == "/identify":
+            caixa = _caixa_da_consulta(consulta)
+            frame = await loop.run_in_executor(None, _decodificar_jpeg, corpo)
+            return 200, _resultado_json(await self.agrupador.reconhecer(frame, caixa=caixa))
+        if caminho == "/identify/all":
+            frame = await loop.run_in_executor(None, _decodificar_jpeg, corpo)
+            resultados = await self.agrupador.reconhecer(frame, todos=True)
+            return 200, {"rostos": [_resultado_json(resultado) for resultado in resultados]}
+        if caminho.startswith("/verify/"):
+            cpf = _cpf_da_rota(caminho, "/verify/")
+            caixa = _caixa_da_consulta(consulta)
+            frame = await loop.run_in_executor(None, _decodificar_jpeg, corpo)
+            return 200, _resultado_json(await self.agrupador.reconhecer(frame, cpf, caixa=caixa))
+        if caminho == "/enroll":
+            pedido = _json_do_corpo(corpo)
+            return await loop.run_in_executor(self.executor_modelo, self._cadastrar, pedido)
+        if caminho.startswith("/reenroll/"):
+            cpf = _cpf_da_rota(caminho, "/reenroll/")
+            pedido = _json_do_corpo(corpo)
+            return await loop.run_in_executor(self.executor_modelo, self._substituir_fotos, cpf, pedido)
+        raise ErroRequisicao(404, "Rota não encontrada.")
+
+    def _rostos_do_pedido(self, pedido):
+        """Rostos recortados das imagens do pedido (de /enroll ou /reenroll)."""
+        try:
+            imagens = [_decodificar_jpeg(base64.b64decode(i)) for i in pedido["imagens"]]
+        except (KeyError, TypeError, ValueError):
+            raise ErroRequisicao(400, "Campo obrigatório: imagens.")
+        if not pedido.get("recortadas", True):
+            # Frames inteiros: recorta o rosto e gera as variações como na webcam
+            rostos = []
+            for imagem in imagens:
+                caixa = obter_detector().primeiro_rosto(imagem)
+                if caixa is not None:
+                    rosto = recortar_rosto(imagem, caixa)
+                    rostos += [rosto, gerar_variacao_unica(rosto, len(rostos) // 2)]
+            imagens = rostos
+        if not imagens:
+            raise ErroRequisicao(400, "Nenhum rosto nas imagens enviadas.")
+        return imagens
+
+    def _cadastrar(self, pedido):
+        """Cadastro completo (fotos, banco e embeddings) na thread do modelo."""
+        try:
+            cpf = str(pedido["cpf"])
+            nome = pedido["nome"]
+            data_nascimento = pedido.get("data_nascimento", "")
+        except (KeyError, TypeError):
+            raise ErroRequisicao(400, "Campos obrigatórios: cpf, nome, imagens.")
+        imagens = self._rostos_do_pedido(pedido)
+        cadastro = Cadastro(nome, data_nascimento, cpf, imagens)
+        if not cadastro.validar_cpf():
+            raise ErroRequisicao(400, "CPF inválido.")
+        if get_user_by_cpf(cpf):
+            raise ErroRequisicao(409, "CPF já cadastrado.")
+        cadastro.cadastrar_usuario()
+        return 201, {"cpf": cpf, "imagens": len(imagens)}
+
+    def _substituir_fotos(self, cpf, pedido):
+        """Troca de fotos (arquivos, banco e embeddings) na thread do modelo."""
+        if not isinstance(pedido, dict):
+            raise ErroRequisicao(400, "Campo obrigatório: imagens.")
+        if not get_user_by_cpf(cpf):
+            raise ErroRequisicao(404, "CPF não cadastrado.")
+        imagens = self._rostos_do_pedido(pedido)
+        update_user(cpf, imagem_facial=";".join(substituir_fotos(cpf, imagens)))
+        return 200, {"cpf": cpf, "imagens": len(imagens)}
+
+    def _listar_usuarios(self):
+        return 200, {"usuarios": [{"id": id_, "nome": nome, "cpf": cpf} for id_, nome, cpf in get_all_users()]}
+
+    def _buscar_usuario(self, cpf):
+        usuario = get_user_by_cpf(cpf)
+        if not usuario:
+            raise ErroRequisicao(404, "CPF não cadastrado.")
+        return 200, {"id": usuario[0], "nome": usuario[1], "data_nascimento": usuario[2], "cpf": usuario[3]}
+
+    def _alterar_usuario(self, cpf, pedido):
+        """Nome e data de nascimento (as fotos vão por /reenroll)."""
+        if not isinstance(pedido, dict):
+            raise ErroRequisicao(400, "Campos: nome, data_nascimento.")
+        if not get_user_by_cpf(cpf):
+            raise ErroRequisicao(404, "CPF não cadastrado.")
+        update_user(cpf, nome=pedido.get("nome"), data_nascimento=pedido.get("data_nascimento"))
+        return 200, {"cpf": cpf}
+
+    def _excluir_usuario(self, cpf):
+        """Exclusão completa: banco, fotos, armazém e galeria em memória."""
+        if not get_user_by_cpf(cpf):
+            raise ErroRequisicao(404, "CPF não cadastrado.")
+        delete_user(cpf)  # já tira o CPF do serviço de galeria do processo
+        if self.motor.galeria is not servico_galeria_carregado():
+            self.motor.galeria.remover_usuario(cpf)
+        return 200, {"cpf": cpf}
+
+    # ---------- HTTP/1.1 mínimo (keep-alive, Content-Length) ----------
+
+    async def _atender(self, reader, writer):
+        try:
+            while True:
+                linha = await reader.readline()
+                if not linha:
+                    break
+                try:
+                    metodo, caminho, versao = linha.decode("latin-1").split()
+                except ValueError:
+                    break
+                cabecalhos = {}
+                while True:
+                    linha = await reader.readline()
+                    if linha in (b"\r\n", b"\n", b""):
+                        break
+                    chave, _, valor = linha.decode("latin-1").partition(":")
+                    cabecalhos[chave.strip().lower()] = valor.strip()
+                try:
+                    tamanho = int(cabecalhos.get("content-length", "0") or 0)
+                except ValueError:
+                    tamanho = -1
+                manter = cabecalhos.get("connection", "").lower() != "close" and versao == "HTTP/1.1"
+                extras = {}
+                # Sem ler o corpo, a conexão não pode continuar: responde e fecha
+                if tamanho < 0:
+                    status, resposta, manter = 400, {"erro": "Content-Length inválido."}, False
+                elif tamanho > TAMANHO_MAXIMO_CORPO:
+                    status, resposta, manter = 413, {"erro": "Corpo grande demais."}, False
+                else:
+                    corpo = await reader.readexactly(tamanho) if tamanho else b""
+                    try:
+                        partes = urlsplit(caminho)
+                        status, resposta = await self._rota(metodo, partes.path, corpo, parse_qs(partes.query))
+                    except FilaCheia:
+                        status, resposta = 503, {"erro": "Servidor ocupado, tente novamente."}
+                        extras["Retry-After"] = "1"
+                    except ErroRequisicao as e:
+                        status, resposta = e.status, {"erro": str(e)}
+                    except Exception as e:
+                        print("Erro ao atender requisição:", e)
+                        status, resposta = 500, {"erro": str(e)}
+                dados = json.dumps(resposta, ensure_ascii=False).encode("utf-8")
+                cabecalho = [f"HTTP/1.1 {status} {MENSAGENS_STATUS.get(status, '')}",
+                             "Content-Type: application/json; charset=utf-8",
+                             f"Content-Length: {len(dados)}",
+                             f"Connection: {'keep-alive' if manter else 'close'}"]
+                cabecalho += [f"{chave}: {valor}" for chave, valor in extras.items()]
+                writer.write(("\r\n".join(cabecalho) + "\r\n\r\n").encode("latin-1") + dados)
+                await writer.drain()
+                if not manter:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def servir(self, host="127.0.0.1", porta=8765, unix=None):
+        tarefa_lotes = asyncio.create_task(self.agrupador.executar())
+        if unix:
+            if os.path.exists(unix):
+                os.remove(unix)
+            servidor = await asyncio.start_unix_server(self._atender, path=unix)
+            print(f"Servidor de reconhecimento em unix://{unix}")
+        else:
+            servidor = await asyncio.start_server(self._atender, host, porta)
+            print(f"Servidor de reconhecimento em http://{host}:{porta}")
+        try:
+            async with servidor:
+                await servidor.serve_forever()
+        finally:
+            tarefa_lotes.cancel()
+            self.executor_modelo.shutdown(wait=False)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Servidor de reconhecimento facial com micro-lotes.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--porta", type=int, default=8765)
+    parser.add_argument("--unix", default=None, help="Caminho de um socket Unix (em vez de TCP)")
+    parser.add_argument("--lote-maximo", type=int, default=16, help="Frames por forward do ArcFace")
+    parser.add_argument("--espera-maxima-ms", type=float, default=10.0, help="Quanto um pedido espera por companhia")
+    parser.add_argument("--capacidade", type=int, default=64, help="Pedidos na fila antes de responder 503")
+    args = parser.parse_args()
+
+    create_user_table()
+    iniciar_aquecimento()
+    servidor = ServidorReconhecimento(lote_maximo=args.lote_maximo, espera_maxima_ms=args.espera_maxima_ms,
+                                      capacidade=args.capacidade)
+    servidor.motor.galeria  # carrega a galeria antes do primeiro pedido
+    aguardar_modelo()
+    try:
+        asyncio.run(servidor.servir(args.host, args.porta, args.unix))
+    except KeyboardInterrupt:
+        print("Servidor encerrado.")
@@ -0,0 +1,379 @@
+import os
+import re
+import json
+import argparse
+import threading
+import numpy as np
+from utils.quantizacao import TIPOS, TAMANHO_BLOCO, calcular_escalas, quantizar_linhas
+
+# ---------- Armazém de embeddings em arquivo único ----------
+#
+# Layout em disco (dentro de faces/):
+#   galeria.json  -> metadados (versão, dimensão, tipo da matriz, geração)
+#   galeria.f32   -> matriz float32 (linhas x dim) com embeddings normalizados
+#   galeria.idx   -> registros de 16 bytes: CPF, flag de ativo e norma original
+#   galeria.f16 / galeria.i8 (+ galeria.esc) -> cópias quantizadas opcionais
+#                    da matriz, alinhadas linha a linha (escalas int8 por dimensão)
+#
+# As duas tabelas só crescem no fim (append), então cadastrar um usuário é
+# uma escrita sequencial. A leitura é um único np.memmap de cada arquivo.
+# As cópias quantizadas são derivadas da galeria.f32: criadas na primeira
+# leitura e completadas com as linhas anexadas depois.
+#
+# A compactação não sobrescreve arquivos que a galeria em memória ainda
+# mapeia (no Windows, os.replace/os.remove falham num arquivo mapeado). Ela
+# grava uma nova geração (galeria.<n>.f32, galeria.<n>.idx...), troca só o
+# galeria.json para apontar para ela e apaga as gerações antigas quando
+# possível. O que ainda estiver mapeado é apagado numa compactação seguinte.
+
+VERSAO = 1
+EXTENSOES_QUANTIZADAS = {"float16": ".f16", "int8": ".i8"}
+EXTENSOES = (".f32", ".idx", ".esc") + tuple(EXTENSOES_QUANTIZADAS.values())
+PADRAO_GERACAO = re.compile(r"^galeria(?:\.(\d+))?(\.f32|\.idx|\.esc|\.f16|\.i8)(\.tmp)?$")
+DTYPE_INDICE = np.dtype([("cpf", "S11"), ("ativo", "u1"), ("norma", "<f4")])
+
+# Um único lock por processo: várias instâncias podem apontar para a mesma pasta
+_lock_escrita = threading.Lock()
+
+
+class ArmazemEmbeddings:
+    """Matriz de embeddings empacotada e mapeada em memória, com índice de CPFs."""
+
+    def __init__(self, pasta="faces"):
+        self.pasta = pasta
+        self.caminho_meta = os.path.join(pasta, "galeria.json")
+        self._lock = _lock_escrita
+
+    # ---------- Metadados ----------
+
+    def existe(self):
+        """Retorna True se o armazém já foi criado em disco."""
+        return os.path.exists(self.caminho_meta)
+
+    def _ler_meta(self):
+        with open(self.caminho_meta, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _escrever_meta(self, dim, caminho=None, geracao=0):
+        meta = {"versao": VERSAO, "dim": int(dim), "dtype": "float32", "geracao": int(geracao)}
+        with open(caminho or self.caminho_meta, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+
+    def geracao(self):
+        """Geração atual dos arquivos (0 = nomes originais, sem número)."""
+        return self._ler_meta().get("geracao", 0) if self.existe() else 0
+
+    def _caminho(self, extensao, geracao=None):
+        if geracao is None:
+            geracao = self.geracao()
+        return os.path.join(self.pasta, f"galeria.{geracao}{extensao}" if geracao else "galeria" + extensao)
+
+    @property
+    def caminho_matriz(self):
+        return self._caminho(".f32")
+
+    @property
+    def caminho_indice(self):
+        return self._caminho(".idx")
+
+    @property
+    def caminho_escalas(self):
+        return self._caminho(".esc")
+
+    def dimensao(self):
+        """Dimensão dos embeddings armazenados (None se o armazém não existir)."""
+        return self._ler_meta()["dim"] if self.existe() else None
+
+    def _linhas_validas(self, dim, geracao=None):
+        """
+        Número de linhas completas presentes nos dois arquivos. Se uma escrita
+        foi interrompida, a linha parcial no fim é ignorada.
+        """
+        caminho_matriz, caminho_indice = self._caminho(".f32", geracao), self._caminho(".idx", geracao)
+        tam_matriz = os.path.getsize(caminho_matriz) if os.path.exists(caminho_matriz) else 0
+        tam_indice = os.path.getsize(caminho_indice) if os.path.exists(caminho_indice) else 0
+        return min(tam_matriz // (dim * 4), tam_indice // DTYPE_INDICE.itemsize)
+
+    # ---------- Escrita ----------
+
+    @staticmethod
+    def _preparar(cpf, embeddings):
+        """Normaliza os embeddings e monta os registros de índice correspondentes."""
+        cpf_bytes = str(cpf).encode("ascii")
+        if len(cpf_bytes) > DTYPE_INDICE["cpf"].itemsize:
+            raise ValueError(f"CPF inválido para o armazém: {cpf}")
+        matriz = np.asarray(embeddings, dtype=np.float32)
+        if matriz.ndim == 1:
+            matriz = matriz[None, :]
+        normas = np.linalg.norm(matriz, axis=1).astype(np.float32)
+        normas[normas == 0] = 1.0
+        registros = np.zeros(len(matriz), dtype=DTYPE_INDICE)
+        registros["cpf"] = cpf_bytes
+        registros["ativo"] = 1
+        registros["norma"] = normas
+        return np.ascontiguousarray(matriz / normas[:, None], dtype=np.float32), registros
+
+    def _anexar(self, linhas, registros):
+        """Acrescenta linhas no fim dos dois arquivos (chamar com o lock)."""
+        os.makedirs(self.pasta, exist_ok=True)
+        dim = linhas.shape[1]
+        if not self.existe():
+            self._escrever_meta(dim)
+        elif self._ler_meta()["dim"] != dim:
+            raise ValueError("Dimensão do embedding diferente da usada no armazém.")
+        geracao = self.geracao()
+        caminho_matriz, caminho_indice = self._caminho(".f32", geracao), self._caminho(".idx", geracao)
+
+        # Descarta qualquer sobra de uma escrita interrompida antes de anexar
+        n = self._linhas_validas(dim, geracao)
+        for caminho, tamanho in ((caminho_matriz, n * dim * 4), (caminho_indice, n * DTYPE_INDICE.itemsize)):
+            if os.path.exists(caminho) and os.path.getsize(caminho) != tamanho:
+                os.truncate(caminho, tamanho)
+
+        with open(caminho_matriz, "ab") as f:
+            f.write(linhas.tobytes())
+        with open(caminho_indice, "ab") as f:
+            f.write(registros.tobytes())
+
+    def _marcar_removido(self, cpf):
+        """Marca como inativas (tombstone) as linhas de um CPF (chamar com o lock)."""
+        if not self.existe():
+            return 0
+        n = self._linhas_validas(self._ler_meta()["dim"])
+        if n == 0:
+            return 0
+        indice = np.memmap(self.caminho_indice, dtype=DTYPE_INDICE, mode="r+", shape=(n,))
+        alvo = (indice["cpf"] == str(cpf).encode("ascii")) & (indice["ativo"] == 1)
+        removidas = int(np.count_nonzero(alvo))
+        if removidas:
+            indice["ativo"][alvo] = 0
+            indice.flush()
+        del indice
+        return removidas
+
+    def adicionar(self, cpf, embeddings):
+        """Acrescenta os embeddings de um CPF ao armazém."""
+        linhas, registros = self._preparar(cpf, embeddings)
+        with self._lock:
+            self._anexar(linhas, registros)
+        return len(linhas)
+
+    def substituir(self, cpf, embeddings):
+        """Troca todos os embeddings de um CPF pelos novos."""
+        linhas, registros = self._preparar(cpf, embeddings)
+        with self._lock:
+            self._marcar_removido(cpf)
+            self._anexar(linhas, registros)
+        return len(linhas)
+
+    def substituir_varios(self, itens):
+        """
+        Versão em lote de substituir(): itens é uma lista de (cpf, embeddings).
+        Um único tombstone vetorizado e um único append para todos os CPFs.
+        """
+        if not itens:
+            return 0
+        preparados = [self._preparar(cpf, embeddings) for cpf, embeddings in itens]
+        linhas = np.concatenate([p[0] for p in preparados])
+        registros = np.concatenate([p[1] for p in preparados])
+        with self._lock:
+            if self.existe():
+                n = self._linhas_validas(self._ler_meta()["dim"])
+                if n:
+                    indice = np.memmap(self.caminho_indice, dtype=DTYPE_INDICE, mode="r+", shape=(n,))
+                    alvo = np.isin(indice["cpf"], np.unique(registros["cpf"])) & (indice["ativo"] == 1)
+                    if alvo.any():
+                        indice["ativo"][alvo] = 0
+                        indice.flush()
+                    del indice
+            self._anexar(linhas, registros)
+        return len(linhas)
+
+    def remover(self, cpf):
+        """Remove logicamente os embeddings de um CPF. Retorna quantas linhas saíram."""
+        with self._lock:
+            return self._marcar_removido(cpf)
+
+    # ---------- Leitura ----------
+
+    def carregar(self):
+        """
+        Mapeia a matriz e o índice em memória (somente leitura).
+        Retorna (matriz, indice); ambos vazios se o armazém não existir.
+        """
+        if not self.existe():
+            return np.zeros((0, 0), dtype=np.float32), np.zeros(0, dtype=DTYPE_INDICE)
+        meta = self._ler_meta()  # uma leitura só: a compactação pode trocar a geração no meio
+        dim, geracao = meta["dim"], meta.get("geracao", 0)
+        n = self._linhas_validas(dim, geracao)
+        if n == 0:
+            return np.zeros((0, dim), dtype=np.float32), np.zeros(0, dtype=DTYPE_INDICE)
+        matriz = np.memmap(self._caminho(".f32", geracao), dtype=np.float32, mode="r", shape=(n, dim))
+        indice = np.memmap(self._caminho(".idx", geracao), dtype=DTYPE_INDICE, mode="r", shape=(n,))
+        return matriz, indice
+
+    def caminho_quantizado(self, tipo, geracao=None):
+        if tipo not in TIPOS:
+            raise ValueError(f"Tipo de quantização desconhecido: {tipo}")
+        return self._caminho(EXTENSOES_QUANTIZADAS[tipo], geracao)
+
+    def carregar_quantizada(self, tipo):
+        """
+        Mapeia a cópia quantizada ("float16" ou "int8") da matriz, criando-a
+        ou completando-a a partir da galeria.f32 se preciso. Retorna
+        (codigos, escalas); as escalas são None em float16. As linhas anexadas
+        depois da criação usam as escalas já gravadas (valores fora da faixa
+        são saturados) até a próxima compactação recalcular tudo.
+        """
+        dtype = np.dtype(tipo)
+        with self._lock:
+            caminho = self.caminho_quantizado(tipo)
+            caminho_escalas = self.caminho_escalas
+            matriz, _ = self.carregar()
+            n, dim = matriz.shape
+            escalas = None
+            if tipo == "int8":
+                if os.path.exists(caminho_escalas) and os.path.exists(caminho):
+                    escalas = np.fromfile(caminho_escalas, dtype=np.float32)
+                if escalas is None or len(escalas) != dim:
+                    escalas = calcular_escalas(matriz) if n else np.ones(dim, dtype=np.float32) / 127.0
+                    if os.path.exists(caminho):
+                        os.truncate(caminho, 0)  # códigos de outras escalas: refeitos abaixo
+                    escalas.astype(np.float32).tofile(caminho_escalas + ".tmp")
+                    os.replace(caminho_escalas + ".tmp", caminho_escalas)
+            if n == 0:
+                return np.zeros((0, dim), dtype=dtype), escalas
+
+            tamanho_linha = dim * dtype.itemsize
+            prontas = min(n, os.path.getsize(caminho) // tamanho_linha) if os.path.exists(caminho) else 0
+            if os.path.exists(caminho) and os.path.getsize(caminho) != prontas * tamanho_linha:
+                os.truncate(caminho, prontas * tamanho_linha)  # sobra de escrita interrompida
+            if prontas < n:
+                with open(caminho, "ab") as f:
+                    for inicio in range(prontas, n, TAMANHO_BLOCO):
+                        f.write(quantizar_linhas(matriz[inicio:min(n, inicio + TAMANHO_BLOCO)], tipo, escalas).tobytes())
+            return np.memmap(caminho, dtype=dtype, mode="r", shape=(n, dim)), escalas
+
+    def contagem(self):
+        """Retorna (linhas ativas, linhas removidas)."""
+        _, indice = self.carregar()
+        ativas = int(np.count_nonzero(indice["ativo"]))
+        return ativas, len(indice) - ativas
+
+    # ---------- Manutenção ----------
+
+    def compactar(self):
+        """
+        Reescreve o armazém sem as linhas removidas, numa nova geração de
+        arquivos: um leitor nunca vê um arquivo pela metade e os arquivos
+        ainda mapeados pela galeria em memória não são tocados.
+        """
+        with self._lock:
+            matriz, indice = self.carregar()
+            if len(indice) == 0:
+                return 0
+            ativos = indice["ativo"] == 1
+            linhas, registros = np.asarray(matriz[ativos]), np.asarray(indice[ativos])
+            del matriz, indice  # este processo não mantém mapeada a geração que sai
+            self._gravar_completo(linhas, registros, linhas.shape[1])
+            return int(np.count_nonzero(~ativos))
+
+    def _gravar_completo(self, linhas, registros, dim):
+        """
+        Grava um armazém inteiro numa nova geração e troca o galeria.json
+        para ela (chamar com o lock). As cópias quantizadas da geração nova
+        são refeitas na próxima leitura.
+        """
+        os.makedirs(self.pasta, exist_ok=True)
+        geracao = self.geracao() + 1 if self.existe() else 0
+        caminho_matriz, caminho_indice = self._caminho(".f32", geracao), self._caminho(".idx", geracao)
+        with open(caminho_matriz + ".tmp", "wb") as f:
+            f.write(np.ascontiguousarray(linhas, dtype=np.float32).tobytes())
+        with open(caminho_indice + ".tmp", "wb") as f:
+            f.write(np.ascontiguousarray(registros, dtype=DTYPE_INDICE).tobytes())
+        # Arquivos novos: ninguém os mapeia ainda, então os.replace funciona em qualquer sistema
+        os.replace(caminho_matriz + ".tmp", caminho_matriz)
+        os.replace(caminho_indice + ".tmp", caminho_indice)
+        self._escrever_meta(dim, self.caminho_meta + ".tmp", geracao)
+        os.replace(self.caminho_meta + ".tmp", self.caminho_meta)
+        self._remover_geracoes_antigas(geracao)
+
+    def _remover_geracoes_antigas(self, geracao):
+        """
+        Apaga os arquivos de outras gerações. Os que ainda estiverem mapeados
+        (no Windows) ficam para a próxima compactação.
+        """
+        for nome in os.listdir(self.pasta):
+            encontrado = PADRAO_GERACAO.match(nome)
+            if encontrado is None or int(encontrado.group(1) or 0) == geracao:
+                continue
+            try:
+                os.remove(os.path.join(self.pasta, nome))
+            except OSError:
+                pass
+
+
+# ---------- Migração do formato antigo ----------
+
+def possui_npy_legado(pasta="faces"):
+    """Retorna True se existe algum faces/<cpf>/*.npy do formato antigo."""
+    if not os.path.exists(pasta):
+        return False
+    for cpf in os.listdir(pasta):
+        pasta_cpf = os.path.join(pasta, cpf)
+        if os.path.isdir(pasta_cpf) and any(a.endswith(".npy") for a in os.listdir(pasta_cpf)):
+            return True
+    return False
+
+
+def migrar_npy(pasta="faces", remover_npy=False):
+    """
+    Converte o layout antigo (um embedding_<i>.npy por imagem em faces/<cpf>/)
+    para o armazém empacotado. Substitui o conteúdo do armazém, se existir.
+    Retorna (usuários migrados, embeddings migrados).
+    """
+    armazem = ArmazemEmbeddings(pasta)
+    todas_linhas = []
+    todos_registros = []
+    arquivos_migrados = []
+    if os.path.exists(pasta):
+        for cpf in sorted(os.listdir(pasta)):
+            pasta_cpf = os.path.join(pasta, cpf)
+            if not os.path.isdir(pasta_cpf):
+                continue
+            arquivos = sorted(a for a in os.listdir(pasta_cpf) if a.endswith(".npy"))
+            if not arquivos:
+                continue
+            caminhos = [os.path.join(pasta_cpf, a) for a in arquivos]
+            try:
+                linhas, registros = ArmazemEmbeddings._preparar(cpf, [np.load(c).ravel() for c in caminhos])
+            except ValueError as e:
+                print(f"Ignorando {pasta_cpf}: {e}")
+                continue
+            todas_linhas.append(linhas)
+            todos_registros.append(registros)
+            arquivos_migrados.extend(caminhos)
+
+    if not todas_linhas:
+        return 0, 0
+
+    linhas = np.concatenate(todas_linhas)
+    registros = np.concatenate(todos_registros)
+    with armazem._lock:
+        armazem._gravar_completo(linhas, registros, linhas.shape[1])
+
+    if remover_npy:
+        for caminho in arquivos_migrados:
+            os.remove(caminho)
+    return len(todas_linhas), len(linhas)
+
+
+if __name__ == "__main__":
+    # Executar a partir de src/ (o pacote utils precisa estar no caminho):
+    #   python -m utils.armazem_embeddings --pasta ../faces
+    parser = argparse.ArgumentParser(description="Migra faces/*/*.npy para o armazém de embeddings empacotado.")
+    parser.add_argument("--pasta", default="faces", help="Pasta com as subpastas de cada CPF (padrão: faces)")
+    parser.add_argument("--remover-npy", action="store_true", help="Apaga os arquivos .npy depois de migrar")
+    args = parser.parse_args()
+    usuarios, embeddings = migrar_npy(args.pasta, remover_npy=args.remover_npy)
+    print(f"Migração concluída: {usuarios} usuários, {embeddings} embeddings.")
@@ -0,0 +1,139 @@
+import os
+import time
+import queue
+import atexit
+import datetime
+import threading
+from utils.database import insert_logins_bulk, close_connection
+from utils.metricas import obter_metricas
+
+# ---------- Registro assíncrono de logins ----------
+#
+# O desbloqueio só coloca o evento em uma fila (sem tocar no disco). Uma thread
+# escritora esvazia a fila em lotes: um único executemany/commit no SQLite por
+# lote e uma única escrita no arquivo do dia, que fica aberto e troca à meia-noite.
+
+_FIM = object()  # sentinela para encerrar a thread escritora
+
+
+class RegistradorLogins:
+    """Fila limitada de eventos de login drenada por uma thread escritora."""
+
+    def __init__(self, pasta_log="logins", capacidade=10000, lote_maximo=256):
+        self.pasta_log = pasta_log
+        self.lote_maximo = lote_maximo
+        self._fila = queue.Queue(maxsize=capacidade)
+        self._arquivo = None
+        self._data_arquivo = None
+        self.gravados = 0
+        self.descartados = 0
+        self._encerrado = False
+        self._thread = threading.Thread(target=self._executar, name="registrador-logins", daemon=True)
+        self._thread.start()
+
+    def registrar(self, cpf, nome, acuracia, momento=None):
+        """
+        Enfileira um login sem bloquear. Retorna False (e conta como descartado)
+        se a fila estiver cheia ou o registrador já tiver sido encerrado.
+        """
+        if self._encerrado:
+            self.descartados += 1
+            return False
+        try:
+            self._fila.put_nowait((cpf, nome, acuracia, momento or datetime.datetime.now()))
+            return True
+        except queue.Full:
+            self.descartados += 1
+            print("Aviso: fila de auditoria cheia, login não registrado:", cpf)
+            return False
+
+    # ---------- Thread escritora ----------
+
+    def _executar(self):
+        try:
+            while True:
+                evento = self._fila.get()
+                lote = [evento]
+                # Junta tudo o que já está na fila (group commit)
+                while len(lote) < self.lote_maximo:
+                    try:
+                        lote.append(self._fila.get_nowait())
+                    except queue.Empty:
+                        break
+                fim = any(e is _FIM for e in lote)
+                eventos = [e for e in lote if e is not _FIM]
+                if eventos:
+                    try:
+                        with obter_metricas().span("auditoria.gravacao"):
+                            self._gravar(eventos)
+                    except Exception as e:
+                        print("Erro ao gravar auditoria de logins:", e)
+                for _ in lote:
+                    self._fila.task_done()
+                if fim:
+                    break
+        finally:
+            if self._arquivo is not None:
+                self._arquivo.close()
+                self._arquivo = None
+            close_connection()
+
+    def _arquivo_do_dia(self, data):
+        """Retorna o arquivo aberto do dia, trocando de arquivo quando a data muda."""
+        if self._data_arquivo != data:
+            if self._arquivo is not None:
+                self._arquivo.close()
+            os.makedirs(self.pasta_log, exist_ok=True)
+            nome_arquivo = data.strftime("%d-%m-%Y") + ".txt"
+            self._arquivo = open(os.path.join(self.pasta_log, nome_arquivo), "a", encoding="utf-8")
+            self._data_arquivo = data
+        return self._arquivo
+
+    def _gravar(self, eventos):
+        linhas_banco = []
+        for cpf, nome, acuracia, momento in eventos:
+            data_hora = momento.strftime("%d/%m/%Y %H:%M:%S")
+            linhas_banco.append((cpf, nome, acuracia, data_hora))
+            self._arquivo_do_dia(momento.date()).write(
+                f"{data_hora} | CPF: {cpf} | Nome: {nome} | Acurácia: {acuracia}%\n")
+        self._arquivo.flush()
+        insert_logins_bulk(linhas_banco)
+        self.gravados += len(eventos)
+
+    # ---------- Encerramento ----------
+
+    def aguardar(self):
+        """Bloqueia até todos os eventos enfileirados até agora serem gravados."""
+        self._fila.join()
+
+    def encerrar(self, timeout=10.0):
+        """
+        Grava o que estiver na fila e finaliza a thread escritora, esperando
+        no máximo `timeout` segundos no total (mesmo com a escritora travada).
+        """
+        if self._encerrado:
+            return
+        self._encerrado = True
+        prazo = time.monotonic() + timeout
+        try:
+            self._fila.put(_FIM, timeout=timeout)
+        except queue.Full:
+            print(f"Aviso: escritora da auditoria parada com a fila cheia; "
+                  f"{self._fila.qsize()} logins não gravados.")
+            return
+        self._thread.join(max(0.0, prazo - time.monotonic()))
+
+
+_registrador = None
+_lock_registrador = threading.Lock()
+
+
+def obter_registrador():
+    """Retorna o registrador de logins do processo (criado na primeira chamada)."""
+    global _registrador
+    with _lock_registrador:
+        if _registrador is None:
+            _registrador = RegistradorLogins()
+            # Garante a gravação do que estiver na fila quando o programa sair
+            atexit.register(_registrador.encerrar)
+        return _registrador
@@ -0,0 +1,277 @@
+import os
+import time
+import sqlite3
+import hashlib
+import argparse
+import threading
+from collections import OrderedDict
+import numpy as np
+
+# ---------- Cache de embeddings por conteúdo ----------
+#
+# Cadastro, troca de fotos, importação e regeração de embeddings passam muitas
+# vezes pelos mesmos recortes (pixel a pixel). A chave do cache é o SHA-256
+# (truncado em 16 bytes) dos pixels decodificados, com formato e tipo, mais o
+# modelo, a versão do DeepFace e o modo de pré-processamento. O SHA-256 usa as
+# instruções SHA da CPU e sai mais rápido que o BLAKE2b e o MD5 do hashlib:
+# uma imagem repetida custa ~0,1 ms (224x224) em vez de um forward do ArcFace.
+#
+# Duas camadas: um LRU em memória (OrderedDict) na frente de um SQLite em
+# disco, compartilhado entre processos (ex.: os de importar_lote.py). O disco
+# tem um limite de entradas. Quando ele é passado, saem as entradas usadas há
+# mais tempo, até sobrar 90% do limite. A contagem de entradas é mantida em
+# memória (só as chaves novas de cada gravação) e só é refeita com COUNT(*)
+# ao passar do limite, já que outros processos também gravam no arquivo. Os
+# acertos no LRU em memória renovam o ultimo_uso no disco em lotes de
+# LOTE_USOS (ou junto da próxima leitura/gravação), para uma entrada quente
+# não ser despejada do disco.
+#
+# Variáveis de ambiente:
+#   RF_CACHE_EMBEDDINGS=0             desliga o cache
+#   RF_CACHE_EMBEDDINGS_ARQUIVO=...   caminho do SQLite (padrão faces/cache_embeddings.db)
+#   RF_CACHE_EMBEDDINGS_LIMITE=50000  máximo de entradas em disco (~2 KB cada)
+
+ATIVO = os.environ.get("RF_CACHE_EMBEDDINGS", "1") not in ("", "0")
+ARQUIVO = os.environ.get("RF_CACHE_EMBEDDINGS_ARQUIVO", os.path.join("faces", "cache_embeddings.db"))
+LIMITE_ENTRADAS = int(os.environ.get("RF_CACHE_EMBEDDINGS_LIMITE", "50000"))
+LIMITE_MEMORIA = 4096
+FRACAO_APOS_DESPEJO = 0.9
+LOTE_USOS = 256
+
+PRAGMAS = (
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA busy_timeout=5000',
+)
+
+
+def _versao_deepface():
+    """Versão instalada do DeepFace, sem importar o pacote (e o TensorFlow)."""
+    try:
+        from importlib.metadata import version
+        return version("deepface")
+    except Exception:
+        return "desconhecida"
+
+
+class CacheEmbeddings:
+    """Embeddings por hash da imagem, com LRU em memória e SQLite em disco."""
+
+    def __init__(self, arquivo=ARQUIVO, limite=LIMITE_ENTRADAS, limite_memoria=LIMITE_MEMORIA, versao=None):
+        self.arquivo = arquivo
+        self.limite = limite
+        self.limite_memoria = limite_memoria
+        self.versao = versao or _versao_deepface()
+        self._memoria = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        self._entradas_disco = None
+        self._usos_pendentes = {}  # chave -> instante do último acerto ainda não gravado no disco
+        self.consultas = 0
+        self.acertos_memoria = 0
+        self.acertos_disco = 0
+        self.despejos = 0
+        self.erros_disco = 0
+
+    # ---------- Chave ----------
+
+    def chave(self, imagem, modelo, modo):
+        """
+        Hash dos pixels decodificados mais modelo, versão e modo. Duas cópias
+        da mesma imagem (ex.: o mesmo JPG lido duas vezes) dão a mesma chave.
+        """
+        imagem = np.ascontiguousarray(imagem)
+        h = hashlib.sha256(f"{modelo}|{self.versao}|{modo}|{imagem.shape}|{imagem.dtype.str}".encode("utf-8"))
+        h.update(memoryview(imagem).cast("B"))
+        return h.digest()[:16]
+
+    # ---------- Disco ----------
+
+    def _conexao(self):
+        if self._conn is None:
+            pasta = os.path.dirname(self.arquivo)
+            if pasta:
+                os.makedirs(pasta, exist_ok=True)
+            self._conn = sqlite3.connect(self.arquivo, check_same_thread=False)
+            for pragma in PRAGMAS:
+                self._conn.execute(pragma)
+            self._conn.execute('CREATE TABLE IF NOT EXISTS embeddings ('
+                               'chave BLOB PRIMARY KEY, vetor BLOB NOT NULL, ultimo_uso REAL NOT NULL)')
+            self._conn.execute('CREATE INDEX IF NOT EXISTS idx_ultimo_uso ON embeddings (ultimo_uso)')
+            self._conn.commit()
+            self._entradas_disco = self._conn.execute('SELECT COUNT(*) FROM embeddings').fetchone()[0]
+        return self._conn
+
+    def _ler_disco(self, chaves):
+        conn = self._conexao()
+        encontrados = {}
+        for inicio in range(0, len(chaves), 500):  # limite de parâmetros do SQLite
+            parte = chaves[inicio:inicio + 500]
+            marcadores = ",".join("?" * len(parte))
+            for chave, vetor in conn.execute(
+                    f'SELECT chave, vetor FROM embeddings WHERE chave IN ({marcadores})', parte):
+                encontrados[bytes(chave)] = np.frombuffer(vetor, dtype=np.float32)
+        agora = time.time()
+        for chave in encontrados:
+            self._usos_pendentes[chave] = agora
+        return encontrados
+
+    def _aplicar_usos(self, conn):
+        """Renova o ultimo_uso dos acertos pendentes (sem commit: vai junto do chamador)."""
+        if self._usos_pendentes:
+            usos, self._usos_pendentes = self._usos_pendentes, {}
+            conn.executemany('UPDATE embeddings SET ultimo_uso = ? WHERE chave = ?',
+                             [(instante, chave) for chave, instante in usos.items()])
+
+    def _gravar_usos(self):
+        conn = self._conexao()
+        self._aplicar_usos(conn)
+        conn.commit()
+
+    def _gravar_disco(self, itens):
+        conn = self._conexao()
+        agora = time.time()
+        self._aplicar_usos(conn)
+        # A mesma chave tem sempre o mesmo vetor: OR IGNORE, e o rowcount conta só as novas
+        cursor = conn.executemany('INSERT OR IGNORE INTO embeddings (chave, vetor, ultimo_uso) VALUES (?, ?, ?)',
+                                  [(chave, vetor.tobytes(), agora) for chave, vetor in itens])
+        self._entradas_disco += max(0, cursor.rowcount)
+        if self._entradas_disco > self.limite:
+            # Passou do limite pela contagem local: confere a real antes de despejar
+            self._entradas_disco = conn.execute('SELECT COUNT(*) FROM embeddings').fetchone()[0]
+        excesso = self._entradas_disco - self.limite
+        if excesso > 0:
+            # Despeja até 90% do limite, para não despejar a cada gravação
+            n = excesso + int(round(self.limite * (1 - FRACAO_APOS_DESPEJO)))
+            conn.execute('DELETE FROM embeddings WHERE chave IN '
+                         '(SELECT chave FROM embeddings ORDER BY ultimo_uso LIMIT ?)', (n,))
+            self.despejos += n
+            self._entradas_disco -= n
+        conn.commit()
+
+    # ---------- API ----------
+
+    def _lembrar(self, chave, vetor):
+        self._memoria[chave] = vetor
+        self._memoria.move_to_end(chave)
+        while len(self._memoria) > self.limite_memoria:
+            self._memoria.popitem(last=False)
+
+    def obter_muitos(self, chaves):
+        """Lista alinhada com `chaves`: o embedding guardado ou None."""
+        with self._lock:
+            self.consultas += len(chaves)
+            saida = [None] * len(chaves)
+            faltando = []
+            agora = time.time()
+            for i, chave in enumerate(chaves):
+                vetor = self._memoria.get(chave)
+                if vetor is None:
+                    faltando.append(i)
+                else:
+                    self._memoria.move_to_end(chave)
+                    self._usos_pendentes[chave] = agora
+                    self.acertos_memoria += 1
+                    saida[i] = vetor
+            encontrados = {}
+            try:
+                if faltando:
+                    encontrados = self._ler_disco(list({chaves[i] for i in faltando}))
+                if faltando or len(self._usos_pendentes) >= LOTE_USOS:
+                    self._gravar_usos()
+            except sqlite3.Error as e:
+                # O cache é só um atalho: sem disco, o modelo calcula de novo
+                self.erros_disco += 1
+                print("Erro ao ler o cache de embeddings:", e)
+            for i in faltando:
+                vetor = encontrados.get(chaves[i])
+                if vetor is not None:
+                    self.acertos_disco += 1
+                    self._lembrar(chaves[i], vetor)
+                    saida[i] = vetor
+            return saida
+
+    def guardar_muitos(self, chaves, embeddings):
+        """Guarda os embeddings calculados (float32) sob as chaves correspondentes."""
+        if len(chaves) == 0:
+            return
+        itens = {chave: np.asarray(embedding, dtype=np.float32).copy() for chave, embedding in zip(chaves, embeddings)}
+        with self._lock:
+            for chave, vetor in itens.items():
+                self._lembrar(chave, vetor)
+            try:
+                self._gravar_disco(list(itens.items()))
+            except sqlite3.Error as e:
+                self.erros_disco += 1
+                print("Erro ao gravar o cache de embeddings:", e)
+
+    def limpar(self):
+        """Apaga todas as entradas (memória e disco)."""
+        with self._lock:
+            self._memoria.clear()
+            self._usos_pendentes.clear()
+            conn = self._conexao()
+            conn.execute('DELETE FROM embeddings')
+            conn.commit()
+            self._entradas_disco = 0
+
+    def fechar(self):
+        with self._lock:
+            if self._conn is not None:
+                try:
+                    self._gravar_usos()
+                except sqlite3.Error as e:
+                    print("Erro ao gravar o cache de embeddings:", e)
+                self._conn.close()
+                self._conn = None
+
+    def estatisticas(self):
+        """Consultas, acertos (memória/disco), taxa de acerto, entradas e despejos."""
+        with self._lock:
+            acertos = self.acertos_memoria + self.acertos_disco
+            return {
+                "consultas": self.consultas,
+                "acertos": acertos,
+                "acertos_memoria": self.acertos_memoria,
+                "acertos_disco": self.acertos_disco,
+                "taxa_acerto": acertos / self.consultas if self.consultas else 0.0,
+                "entradas_memoria": len(self._memoria),
+                "entradas_disco": self._entradas_disco,
+                "limite": self.limite,
+                "despejos": self.despejos,
+                "erros_disco": self.erros_disco,
+            }
+
+
+_cache = None
+_lock_cache = threading.Lock()
+
+
+def obter_cache_embeddings():
+    """Retorna o cache do processo, ou None se RF_CACHE_EMBEDDINGS=0."""
+    global _cache
+    if not ATIVO:
+        return None
+    if _cache is None:
+        with _lock_cache:
+            if _cache is None:
+                _cache = CacheEmbeddings()
+    return _cache
+
+
+if __name__ == "__main__":
+    # Executar da pasta que contém faces/ (a raiz do projeto):
+    #   python src/utils/cache_embeddings.py [--limpar]
+    parser = argparse.ArgumentParser(description="Cache de embeddings por hash da imagem.")
+    parser.add_argument("--arquivo", default=ARQUIVO)
+    parser.add_argument("--limpar", action="store_true", help="Apaga todas as entradas")
+    args = parser.parse_args()
+
+    cache = CacheEmbeddings(args.arquivo)
+    cache._conexao()  # abre (ou cria) o arquivo para contar as entradas
+    if args.limpar:
+        cache.limpar()
+        print("Cache de embeddings apagado.")
+    estatisticas = cache.estatisticas()
+    tamanho = os.path.getsize(args.arquivo) / 2**20 if os.path.exists(args.arquivo) else 0.0
+    print(f"{args.arquivo}: {estatisticas['entradas_disco']} entradas (limite {estatisticas['limite']}), {tamanho:.1f} MB")
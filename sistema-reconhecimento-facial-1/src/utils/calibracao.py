@@ -0,0 +1,255 @@
+import os
+import json
+import time
+import argparse
+import numpy as np
+
+# ---------- Calibração do limiar de distância ----------
+#
+# Mede, sobre a própria galeria cadastrada, as distribuições de distância
+# genuína (duas linhas do mesmo usuário) e impostora (usuários diferentes).
+# Delas saem as curvas FAR/FRR (verificação 1:1) e FPIR/FNIR (identificação
+# 1:N, a do login) e um limiar recomendado para uma taxa de falso aceite alvo.
+#
+#   - Genuínas: todos os pares de linhas de cada usuário, em lotes de usuários
+#     com o mesmo número de linhas (um einsum por lote).
+#   - Impostoras: `n_consultas` linhas sorteadas contra a galeria inteira, em
+#     blocos de consultas x linhas (um produto de matrizes por bloco). As
+#     distâncias vão direto para um histograma de N_FAIXAS faixas, então a
+#     memória não cresce com a galeria. Para cada consulta também ficam a
+#     menor distância genuína e a menor impostora (sem ela mesma), que dão o
+#     resultado 1:N de "deixar o usuário de fora".
+#
+# O limiar escolhido vai para faces/limiar.json (RF_LIMIAR_ARQUIVO muda o
+# caminho), que o MotorReconhecimento lê ao ser criado.
+
+ARQUIVO_LIMIAR = os.environ.get("RF_LIMIAR_ARQUIVO", os.path.join("faces", "limiar.json"))
+N_FAIXAS = 4000
+BLOCO_CONSULTAS = 512
+BLOCO_GALERIA = 16384
+BLOCO_GENUINAS = 1 << 22  # floats por lote de usuários no einsum (~16 MB)
+
+
+def _distancias(cossenos, normas_a, normas_b, metrica):
+    """Distâncias a partir dos cossenos e das normas originais (mesma fórmula da galeria)."""
+    if metrica == "cosseno":
+        return 1.0 - cossenos
+    quadrado = normas_a * normas_a + normas_b * normas_b - 2.0 * normas_a * normas_b * cossenos
+    return np.sqrt(np.maximum(quadrado, 0.0))
+
+
+def distancias_genuinas(matriz, normas, codigos, metrica="euclidiana"):
+    """Distâncias de todos os pares de linhas de um mesmo usuário (float32). Código < 0 = linha ignorada."""
+    validas = np.flatnonzero(codigos >= 0)
+    ordem = validas[np.argsort(codigos[validas], kind="stable")]
+    _, inicios, contagens = np.unique(codigos[ordem], return_index=True, return_counts=True)
+    dim = matriz.shape[1]
+    partes = []
+    for k in np.unique(contagens):
+        if k < 2:
+            continue
+        linhas = ordem[inicios[contagens == k][:, None] + np.arange(k)]  # (usuários, k)
+        superior = np.triu_indices(k, 1)
+        por_lote = max(1, BLOCO_GENUINAS // (k * dim))
+        for inicio in range(0, len(linhas), por_lote):
+            lote = linhas[inicio:inicio + por_lote]
+            vetores = np.asarray(matriz[lote.ravel()], dtype=np.float32).reshape(len(lote), k, dim)
+            cossenos = np.einsum("uid,ujd->uij", vetores, vetores)
+            normas_lote = normas[lote]
+            dist = _distancias(cossenos, normas_lote[:, :, None], normas_lote[:, None, :], metrica)
+            partes.append(dist[:, superior[0], superior[1]].ravel().astype(np.float32))
+    return np.concatenate(partes) if partes else np.zeros(0, dtype=np.float32)
+
+
+def varrer_impostores(matriz, normas, codigos, ativos, consultas, maximo, metrica="euclidiana"):
+    """
+    Compara as linhas `consultas` com todas as linhas ativas, em blocos.
+    Retorna (histograma impostor, menor distância genuína por consulta,
+    menor distância impostora por consulta).
+    """
+    escala = N_FAIXAS / maximo
+    histograma = np.zeros(N_FAIXAS + 1, dtype=np.int64)  # a última faixa recebe os pares ignorados
+    menor_genuina = np.full(len(consultas), np.inf, dtype=np.float32)
+    menor_impostora = np.full(len(consultas), np.inf, dtype=np.float32)
+    for q in range(0, len(consultas), BLOCO_CONSULTAS):
+        linhas_q = consultas[q:q + BLOCO_CONSULTAS]
+        vetores_q = np.asarray(matriz[linhas_q], dtype=np.float32)
+        normas_q = normas[linhas_q][:, None]
+        codigos_q = codigos[linhas_q][:, None]
+        for g in range(0, len(matriz), BLOCO_GALERIA):
+            fim = min(g + BLOCO_GALERIA, len(matriz))
+            cossenos = vetores_q @ np.asarray(matriz[g:fim], dtype=np.float32).T
+            dist = _distancias(cossenos, normas_q, normas[g:fim][None, :], metrica)
+            mesmo = codigos_q == codigos[None, g:fim]
+            ignorar = mesmo | ~ativos[None, g:fim]
+            impostoras = np.where(ignorar, np.inf, dist)
+            np.minimum(menor_impostora[q:q + len(linhas_q)], impostoras.min(axis=1),
+                       out=menor_impostora[q:q + len(linhas_q)])
+            proprias = linhas_q[:, None] == np.arange(g, fim)[None, :]
+            genuinas = np.where(mesmo & ~proprias, dist, np.inf)
+            np.minimum(menor_genuina[q:q + len(linhas_q)], genuinas.min(axis=1),
+                       out=menor_genuina[q:q + len(linhas_q)])
+            faixas = np.minimum((dist * escala).astype(np.int32), N_FAIXAS - 1)
+            faixas[ignorar] = N_FAIXAS
+            histograma += np.bincount(faixas.ravel(), minlength=N_FAIXAS + 1)
+    return histograma[:N_FAIXAS], menor_genuina, menor_impostora
+
+
+def calcular_curvas(galeria, n_consultas=5000, metrica="euclidiana", semente=0):
+    """
+    Curvas por limiar (bordas das faixas): FAR/FRR (pares 1:1) e FPIR/FNIR
+    (1:N, com o usuário da consulta fora da galeria para o falso aceite).
+    """
+    ativos = np.ones(len(galeria), dtype=bool) if galeria.ativos is None else np.asarray(galeria.ativos)
+    _, codigos = np.unique(galeria.cpfs, return_inverse=True)
+    codigos = codigos.astype(np.int64)
+    codigos[~ativos] = -1  # linhas desativadas não formam pares genuínos
+    normas = np.asarray(galeria.normas, dtype=np.float32)
+    maximo = 2.0 if metrica == "cosseno" else 2.0 * float(normas[ativos].max())
+    limiares = (np.arange(N_FAIXAS) + 1) * (maximo / N_FAIXAS)
+
+    inicio = time.perf_counter()
+    genuinas = distancias_genuinas(galeria.matriz, normas, codigos, metrica)
+    segundos_genuinas = time.perf_counter() - inicio
+
+    rng = np.random.default_rng(semente)
+    candidatas = np.flatnonzero(ativos)
+    consultas = np.sort(rng.choice(candidatas, size=min(n_consultas, len(candidatas)), replace=False))
+    inicio = time.perf_counter()
+    histograma, menor_genuina, menor_impostora = varrer_impostores(
+        galeria.matriz, normas, codigos, ativos, consultas, maximo, metrica)
+    segundos_impostoras = time.perf_counter() - inicio
+
+    # 1:1 — aceita se dist < limiar
+    far = np.cumsum(histograma) / max(1, histograma.sum())
+    frr = 1.0 - np.searchsorted(np.sort(genuinas), limiares, side="left") / max(1, len(genuinas))
+    # 1:N — falso aceite: o vizinho mais próximo de outro usuário passa no limiar;
+    # acerto: o mais próximo é do próprio usuário e passa no limiar
+    fpir = np.searchsorted(np.sort(menor_impostora), limiares, side="left") / max(1, len(consultas))
+    com_genuina = np.isfinite(menor_genuina)
+    acertos = np.where(menor_genuina < menor_impostora, menor_genuina, np.inf)[com_genuina]
+    fnir = 1.0 - np.searchsorted(np.sort(acertos), limiares, side="left") / max(1, com_genuina.sum())
+    return {
+        "metrica": metrica,
+        "limiares": limiares,
+        "far": far, "frr": frr, "fpir": fpir, "fnir": fnir,
+        "pares_genuinos": len(genuinas),
+        "pares_impostores": int(histograma.sum()),
+        "consultas": len(consultas),
+        "segundos_genuinas": segundos_genuinas,
+        "segundos_impostoras": segundos_impostoras,
+    }
+
+
+def ponto_de_operacao(curvas, far_alvo=0.001):
+    """
+    Maior limiar com FPIR (falso aceite do login 1:N) <= `far_alvo`, e os
+    índices do EER (FAR = FRR) para referência.
+    """
+    permitidos = np.flatnonzero(curvas["fpir"] <= far_alvo)
+    i = int(permitidos[-1]) if len(permitidos) else 0
+    diferenca = np.abs(curvas["far"] - curvas["frr"])
+    empates = np.flatnonzero(diferenca == diferenca.min())
+    eer = int(empates[len(empates) // 2])  # meio da faixa, se as distribuições não se cruzam
+    return i, eer
+
+
+def indice_do_limiar(curvas, limiar):
+    return int(np.clip(np.searchsorted(curvas["limiares"], limiar, side="left"), 0, len(curvas["limiares"]) - 1))
+
+
+def gravar_limiar(curvas, indice, far_alvo, caminho=ARQUIVO_LIMIAR):
+    """Grava o limiar escolhido para o MotorReconhecimento (troca atômica do arquivo)."""
+    documento = {
+        "metrica": curvas["metrica"],
+        "limiar": float(curvas["limiares"][indice]),
+        # O limiar calibrado decide sozinho; a acurácia fica só para exibição
+        "acuracia_minima": 0,
+        "far_alvo": far_alvo,
+        "fpir": float(curvas["fpir"][indice]),
+        "fnir": float(curvas["fnir"][indice]),
+        "far": float(curvas["far"][indice]),
+        "frr": float(curvas["frr"][indice]),
+        "consultas": curvas["consultas"],
+        "pares_genuinos": curvas["pares_genuinos"],
+        "gerado_em": time.strftime("%Y-%m-%d %H:%M:%S"),
+    }
+    pasta = os.path.dirname(caminho)
+    if pasta:
+        os.makedirs(pasta, exist_ok=True)
+    temporario = caminho + ".tmp"
+    with open(temporario, "w", encoding="utf-8") as f:
+        json.dump(documento, f, indent=2, ensure_ascii=False)
+    os.replace(temporario, caminho)
+    return documento
+
+
+def carregar_limiar(caminho=ARQUIVO_LIMIAR, metrica=None):
+    """Limiar gravado pela calibração, ou None se não houver arquivo (ou se for de outra métrica)."""
+    if not os.path.exists(caminho):
+        return None
+    try:
+        with open(caminho, "r", encoding="utf-8") as f:
+            documento = json.load(f)
+        float(documento["limiar"])
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        print(f"Ignorando {caminho}: {e}")
+        return None
+    if metrica is not None and documento.get("metrica") != metrica:
+        return None
+    return documento
+
+
+def gravar_curvas_csv(curvas, caminho, passo=1):
+    with open(caminho, "w", encoding="utf-8") as f:
+        f.write("limiar,far,frr,fpir,fnir\n")
+        for i in range(0, len(curvas["limiares"]), passo):
+            f.write(f"{curvas['limiares'][i]:.4f},{curvas['far'][i]:.6g},{curvas['frr'][i]:.6g},"
+                    f"{curvas['fpir'][i]:.6g},{curvas['fnir'][i]:.6g}\n")
+
+
+if __name__ == "__main__":
+    # Executar a partir de src/:  python -m utils.calibracao --pasta ../faces --gravar ../faces/limiar.json
+    from utils.galeria import GaleriaFacial
+    from utils.indice_ivf import gerar_embeddings_sinteticos
+    from motor_reconhecimento import METRICA, LIMIAR_DISTANCIA, ACURACIA_MINIMA
+
+    parser = argparse.ArgumentParser(description="Curvas FAR/FRR da galeria e limiar recomendado para o login.")
+    parser.add_argument("--pasta", default="faces", help="Pasta do armazém de embeddings")
+    parser.add_argument("--sintetico", type=int, default=0, help="Usa N usuários sintéticos em vez de faces/")
+    parser.add_argument("--consultas", type=int, default=5000, help="Linhas comparadas com a galeria inteira")
+    parser.add_argument("--far-alvo", type=float, default=0.001, help="Falso aceite 1:N máximo (FPIR)")
+    parser.add_argument("--curvas", help="Grava as curvas em CSV")
+    parser.add_argument("--gravar", nargs="?", const=ARQUIVO_LIMIAR, help="Grava o limiar recomendado (padrão: %(const)s)")
+    args = parser.parse_args()
+
+    if args.sintetico:
+        embeddings, cpfs, _ = gerar_embeddings_sinteticos(args.sintetico)
+        galeria = GaleriaFacial(embeddings, cpfs)
+    else:
+        galeria = GaleriaFacial.carregar_de_pasta(args.pasta)
+    if len(galeria) == 0:
+        raise SystemExit("Galeria vazia.")
+
+    curvas = calcular_curvas(galeria, args.consultas, METRICA)
+    print(f"{galeria.quantidade_ativa()} linhas: {curvas['pares_genuinos']} pares genuínos em "
+          f"{curvas['segundos_genuinas']:.1f}s, {curvas['pares_impostores']} impostores "
+          f"({curvas['consultas']} consultas) em {curvas['segundos_impostoras']:.1f}s")
+
+    # Regra fixa atual: dist < 7 e acurácia >= 70% (acurácia = 1 - dist/10), ou seja, dist <= 3
+    atual = min(LIMIAR_DISTANCIA, 10 * (1 - ACURACIA_MINIMA / 100)) if METRICA == "euclidiana" else LIMIAR_DISTANCIA
+    recomendado, eer = ponto_de_operacao(curvas, args.far_alvo)
+    if curvas["consultas"] * args.far_alvo < 10:
+        print(f"Aviso: com {curvas['consultas']} consultas o FPIR de {args.far_alvo:g} se apoia em menos de "
+              f"10 falsos aceites; use --consultas {int(np.ceil(10 / args.far_alvo))} ou mais.")
+    print(f"{'ponto':>22} {'limiar':>7} {'FAR 1:1':>9} {'FRR 1:1':>9} {'FPIR 1:N':>9} {'FNIR 1:N':>9}")
+    for nome, i in ((f"regra atual (<= {atual:g})", indice_do_limiar(curvas, atual)), ("EER 1:1", eer),
+                    (f"recomendado ({args.far_alvo:g})", recomendado)):
+        print(f"{nome:>22} {curvas['limiares'][i]:>7.3f} {curvas['far'][i]:>9.2e} {curvas['frr'][i]:>9.2e} "
+              f"{curvas['fpir'][i]:>9.2e} {curvas['fnir'][i]:>9.2e}")
+    if args.curvas:
+        gravar_curvas_csv(curvas, args.curvas)
+        print(f"Curvas gravadas em {args.curvas}")
+    if args.gravar:
+        documento = gravar_limiar(curvas, recomendado, args.far_alvo, args.gravar)
+        print(f"Limiar {documento['limiar']:.3f} gravado em {args.gravar}")
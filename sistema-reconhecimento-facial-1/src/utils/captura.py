@@ -0,0 +1,167 @@
+import time
+import threading
+from collections import deque
+import numpy as np
+from utils.metricas import obter_metricas
+from utils.fontes import FONTE_PADRAO, criar_fonte
+
+# ---------- Captura de câmera em thread própria ----------
+#
+# Uma thread lê a câmera continuamente para um buffer circular pré-alocado
+# (cap.read grava direto no slot, sem alocar). A interface e o reconhecimento
+# pegam o frame mais recente quando quiserem, cada um no seu ritmo.
+
+
+class CapturaCamera:
+    """
+    Lê uma fonte de frames (webcam, vídeo, pasta de imagens ou sintética;
+    ver utils/fontes.py) em uma thread, mantendo os últimos `tamanho_buffer`
+    frames em um buffer circular.
+
+    `ultimo_frame()` devolve uma visão (sem cópia) do slot mais recente; ela
+    continua válida enquanto a thread não der a volta no buffer, o que basta
+    para exibir ou detectar. Quem for segurar o frame por mais tempo (ex.:
+    durante uma inferência) deve pedir `copiar=True`.
+
+    Fontes gravadas são lidas no FPS nominal delas (como uma câmera) ou, com
+    `ritmo=False`, o mais rápido possível. Com `repetir=True` elas voltam ao
+    início quando acabam, o que permite testar sem webcam.
+    """
+
+    def __init__(self, fonte=FONTE_PADRAO, largura=None, altura=None, tamanho_buffer=4, repetir=False, ritmo=True):
+        self.fonte = fonte
+        self.origem = criar_fonte(fonte, largura, altura)
+        self.largura = largura
+        self.altura = altura
+        self.tamanho_buffer = max(2, tamanho_buffer)
+        self.repetir = repetir
+        self.ritmo = ritmo
+        self.voltas = 0               # quantas vezes uma fonte gravada voltou ao início
+        self._intervalo = 0.0         # pausa entre frames gravados (0 = ritmo da câmera ou sem ritmo)
+        self._buffer = None
+        self._tempos = np.zeros(self.tamanho_buffer, dtype=np.float64)
+        self._sequencia = -1          # número do último frame publicado
+        self._ultimo_lido = -1        # último frame entregue a algum consumidor
+        self._lock = threading.Lock()
+        self._parar = threading.Event()
+        self._thread = None
+        self._instantes = deque(maxlen=30)
+        self._metricas = obter_metricas()
+        self.capturados = 0
+        self.descartados = 0          # frames sobrescritos sem nunca serem lidos
+        self.falhas = 0
+
+    # ---------- Ciclo de vida ----------
+
+    def iniciar(self):
+        """Abre a fonte e inicia a thread de leitura. Retorna False se não abrir."""
+        if not self.origem.abrir():
+            return False
+        self._intervalo = 1.0 / self.origem.fps if self.ritmo and not self.origem.ao_vivo else 0.0
+        self._parar.clear()
+        self._thread = threading.Thread(target=self._ler, name="captura-camera", daemon=True)
+        self._thread.start()
+        return True
+
+    def parar(self):
+        """Interrompe a leitura e libera a câmera."""
+        self._parar.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=1.0)
+        self._thread = None
+
+    @property
+    def ativa(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def encerrada(self):
+        """True depois de parar() (mesmo se a fonte nunca chegou a abrir)."""
+        return self._parar.is_set()
+
+    # ---------- Thread de leitura ----------
+
+    def _ler(self):
+        falhas_seguidas = 0
+        proximo_instante = time.perf_counter()
+        try:
+            while not self._parar.is_set():
+                proximo = (self._sequencia + 1) % self.tamanho_buffer
+                destino = None if self._buffer is None else self._buffer[proximo]
+                with self._metricas.span("captura.leitura"):
+                    ret, frame = self.origem.ler(destino)
+                if not ret and self.repetir and self.capturados > 0 and self.origem.reiniciar():
+                    # Fim da gravação: volta ao primeiro frame
+                    self.voltas += 1
+                    falhas_seguidas += 1
+                    if falhas_seguidas > 100:
+                        break
+                    continue
+                if not ret and not self.origem.ao_vivo and not self.repetir and self.capturados > 0:
+                    break  # fim da gravação
+                if not ret:
+                    self.falhas += 1
+                    falhas_seguidas += 1
+                    if falhas_seguidas > 100:
+                        break
+                    time.sleep(0.01)
+                    continue
+                falhas_seguidas = 0
+                agora = time.perf_counter()
+                if self._buffer is None or frame.shape != self._buffer.shape[1:]:
+                    # Primeiro frame (ou mudança de resolução): aloca o buffer uma vez
+                    self._buffer = np.empty((self.tamanho_buffer,) + frame.shape, dtype=frame.dtype)
+                    self._buffer[proximo] = frame
+                elif frame is not destino and not np.shares_memory(frame, destino):
+                    self._buffer[proximo] = frame
+                with self._lock:
+                    self._tempos[proximo] = agora
+                    self._sequencia += 1
+                    self.capturados += 1
+                    self._instantes.append(agora)
+                if self._intervalo:
+                    # Fonte gravada: segura a leitura no FPS nominal dela
+                    proximo_instante = max(proximo_instante + self._intervalo, agora - self._intervalo)
+                    self._parar.wait(max(0.0, proximo_instante - time.perf_counter()))
+        finally:
+            self.origem.fechar()
+
+    # ---------- Consumo ----------
+
+    def ultimo_frame(self, copiar=False):
+        """
+        Retorna (frame, instante, sequencia) do frame mais recente, ou
+        (None, None, -1) se nada foi capturado ainda. `instante` vem de
+        time.perf_counter() no momento da leitura.
+        """
+        with self._lock:
+            sequencia = self._sequencia
+            if sequencia < 0:
+                return None, None, -1
+            slot = sequencia % self.tamanho_buffer
+            if sequencia > self._ultimo_lido:
+                self.descartados += max(0, sequencia - self._ultimo_lido - 1)
+                self._ultimo_lido = sequencia
+            instante = self._tempos[slot]
+            frame = self._buffer[slot]
+            if copiar:
+                frame = frame.copy()
+        if not copiar:
+            frame = frame.view()
+            frame.flags.writeable = False  # protege o buffer compartilhado
+        return frame, instante, sequencia
+
+    def estatisticas(self):
+        """FPS alcançado (últimos frames), frames capturados, descartados e falhas."""
+        with self._lock:
+            instantes = list(self._instantes)
+        fps = 0.0
+        if len(instantes) >= 2 and instantes[-1] > instantes[0]:
+            fps = (len(instantes) - 1) / (instantes[-1] - instantes[0])
+        return {
+            "fps": fps,
+            "capturados": self.capturados,
+            "descartados": self.descartados,
+            "falhas": self.falhas,
+            "voltas": self.voltas,
+        }
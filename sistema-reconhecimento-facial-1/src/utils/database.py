@@ -1,99 +1,173 @@
 import sqlite3
 import shutil
 import os
+import threading
+from utils.armazem_embeddings import ArmazemEmbeddings
+from utils.galeria import servico_galeria_carregado
+
+DATABASE_PATH = 'cadastro.db'
+
+# Pragmas aplicados em toda conexão:
+# - WAL: leitores não bloqueiam o escritor e cada commit é um append no -wal
+# - synchronous=NORMAL: com WAL continua seguro contra corrupção, sem fsync por commit
+# - cache de 8 MB em memória, tabelas temporárias em RAM e espera de até 5 s por locks
+PRAGMAS = (
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA cache_size=-8000',
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA busy_timeout=5000',
+)
+
+_local = threading.local()
+
+def _configurar(conn):
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
 
 def connect_to_database():
-    """Conecta ao banco de dados SQLite."""
-    return sqlite3.connect('cadastro.db')
+    """
+    Abre uma conexão nova (já configurada) com o banco SQLite.
+    Quem chama é responsável por fechá-la; as funções deste módulo usam
+    get_connection(), que reaproveita uma conexão por thread.
+    """
+    return _configurar(sqlite3.connect(DATABASE_PATH, cached_statements=256))
+
+def get_connection():
+    """
+    Retorna a conexão persistente da thread atual, criando na primeira chamada.
+    Como a conexão não é reaberta, o cache de comandos preparados do sqlite3
+    é reaproveitado entre chamadas.
+    """
+    conn = getattr(_local, 'conn', None)
+    if conn is None or getattr(_local, 'path', None) != DATABASE_PATH:
+        if conn is not None:
+            conn.close()
+        conn = connect_to_database()
+        _local.conn = conn
+        _local.path = DATABASE_PATH
+    return conn
+
+def close_connection():
+    """Fecha a conexão persistente da thread atual (se existir)."""
+    conn = getattr(_local, 'conn', None)
+    if conn is not None:
+        conn.close()
+        _local.conn = None
 
 # ---------- Usuários ----------
 
 def create_user_table():
     """Cria a tabela de usuários se não existir."""
-    conn = connect_to_database()
-    cursor = conn.cursor()
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS usuarios (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            nome TEXT NOT NULL,
-            data_nascimento TEXT NOT NULL,
-            cpf TEXT NOT NULL UNIQUE,
-            imagem_facial TEXT NOT NULL
-        )
-    ''')
-    conn.commit()
-    conn.close()
+    conn = get_connection()
+    with conn:
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS usuarios (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                nome TEXT NOT NULL,
+                data_nascimento TEXT NOT NULL,
+                cpf TEXT NOT NULL UNIQUE,
+                imagem_facial TEXT NOT NULL
+            )
+        ''')
 
 def insert_user(nome, data_nascimento, cpf, imagem_facial):
     """Insere um novo usuário no banco."""
-    conn = connect_to_database()
-    cursor = conn.cursor()
-    cursor.execute('''
-        INSERT INTO usuarios (nome, data_nascimento, cpf, imagem_facial)
-        VALUES (?, ?, ?, ?)
-    ''', (nome, data_nascimento, cpf, imagem_facial))
-    conn.commit()
-    conn.close()
+    conn = get_connection()
+    with conn:
+        conn.execute('''
+            INSERT INTO usuarios (nome, data_nascimento, cpf, imagem_facial)
+            VALUES (?, ?, ?, ?)
+        ''', (nome, data_nascimento, cpf, imagem_facial))
+
+def insert_users_bulk(usuarios):
+    """
+    Insere vários usuários em uma única transação.
+    usuarios: iterável de tuplas (nome, data_nascimento, cpf, imagem_facial).
+    CPFs já cadastrados são ignorados. Retorna quantas linhas foram inseridas.
+    """
+    conn = get_connection()
+    with conn:
+        cursor = conn.executemany('''
+            INSERT OR IGNORE INTO usuarios (nome, data_nascimento, cpf, imagem_facial)
+            VALUES (?, ?, ?, ?)
+        ''', usuarios)
+    return cursor.rowcount
 
 def get_user_by_cpf(cpf):
     """Busca usuário pelo CPF."""
-    conn = connect_to_database()
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM usuarios WHERE cpf = ?', (cpf,))
-    user = cursor.fetchone()
-    conn.close()
-    return user
+    return get_connection().execute('SELECT * FROM usuarios WHERE cpf = ?', (cpf,)).fetchone()
+
+def get_all_users():
+    """Lista (id, nome, cpf) de todos os usuários."""
+    return get_connection().execute('SELECT id, nome, cpf FROM usuarios').fetchall()
+
+def get_all_user_images():
+    """Lista (cpf, imagem_facial) de todos os usuários."""
+    return get_connection().execute('SELECT cpf, imagem_facial FROM usuarios').fetchall()
 
 def update_user(cpf, nome=None, data_nascimento=None, imagem_facial=None):
-    """Atualiza dados do usuário pelo CPF."""
-    conn = connect_to_database()
-    cursor = conn.cursor()
-    if nome:
-        cursor.execute('UPDATE usuarios SET nome = ? WHERE cpf = ?', (nome, cpf))
-    if data_nascimento:
-        cursor.execute('UPDATE usuarios SET data_nascimento = ? WHERE cpf = ?', (data_nascimento, cpf))
-    if imagem_facial:
-        cursor.execute('UPDATE usuarios SET imagem_facial = ? WHERE cpf = ?', (imagem_facial, cpf))
-    conn.commit()
-    conn.close()
+    """Atualiza dados do usuário pelo CPF (um único UPDATE com os campos informados)."""
+    campos = [(coluna, valor) for coluna, valor in
+              (('nome', nome), ('data_nascimento', data_nascimento), ('imagem_facial', imagem_facial))
+              if valor]
+    if not campos:
+        return
+    atribuicoes = ', '.join(f'{coluna} = ?' for coluna, _ in campos)
+    conn = get_connection()
+    with conn:
+        conn.execute(f'UPDATE usuarios SET {atribuicoes} WHERE cpf = ?',
+                     [valor for _, valor in campos] + [cpf])
 
 def delete_user(cpf):
     """Exclui usuário pelo CPF e remove a pasta de imagens faciais."""
-    conn = connect_to_database()
-    cursor = conn.cursor()
-    cursor.execute('DELETE FROM usuarios WHERE cpf = ?', (cpf,))
-    conn.commit()
-    conn.close()
+    conn = get_connection()
+    with conn:
+        conn.execute('DELETE FROM usuarios WHERE cpf = ?', (cpf,))
     # Remove a pasta faces/CPF se existir
     pasta_cpf = os.path.join("faces", cpf)
     if os.path.exists(pasta_cpf):
         shutil.rmtree(pasta_cpf)
+    # Remove os embeddings do CPF do armazém e da galeria em memória
+    ArmazemEmbeddings("faces").remover(cpf)
+    servico = servico_galeria_carregado()
+    if servico is not None:
+        servico.remover_usuario(cpf)
 
 # ---------- Logins ----------
 
 def create_login_table():
     """Cria a tabela de logins se não existir."""
-    conn = connect_to_database()
-    cursor = conn.cursor()
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS logins (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            cpf TEXT NOT NULL,
-            nome TEXT,
-            acuracia INTEGER,
-            data_hora TEXT NOT NULL
-        )
-    ''')
-    conn.commit()
-    conn.close()
+    conn = get_connection()
+    with conn:
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS logins (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                cpf TEXT NOT NULL,
+                nome TEXT,
+                acuracia INTEGER,
+                data_hora TEXT NOT NULL
+            )
+        ''')
 
 def insert_login(cpf, nome, acuracia, data_hora):
     """Insere um registro de login no banco."""
-    conn = connect_to_database()
-    cursor = conn.cursor()
-    cursor.execute('''
-        INSERT INTO logins (cpf, nome, acuracia, data_hora)
-        VALUES (?, ?, ?, ?)
-    ''', (cpf, nome, acuracia, data_hora))
-    conn.commit()
-    conn.close()
\ No newline at end of file
+    conn = get_connection()
+    with conn:
+        conn.execute('''
+            INSERT INTO logins (cpf, nome, acuracia, data_hora)
+            VALUES (?, ?, ?, ?)
+        ''', (cpf, nome, acuracia, data_hora))
+
+def insert_logins_bulk(logins):
+    """
+    Insere vários registros de login em uma única transação.
+    logins: iterável de tuplas (cpf, nome, acuracia, data_hora).
+    """
+    conn = get_connection()
+    with conn:
+        conn.executemany('''
+            INSERT INTO logins (cpf, nome, acuracia, data_hora)
+            VALUES (?, ?, ?, ?)
+        ''', logins)
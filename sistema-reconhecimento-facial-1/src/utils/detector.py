@@ -0,0 +1,151 @@
+import time
+import threading
+from collections import deque
+import numpy as np
+import cv2
+from utils.metricas import obter_metricas
+
+# ---------- Detector de rostos compartilhado ----------
+#
+# O Haar Cascade é carregado uma única vez por processo. A detecção roda numa
+# cópia reduzida do frame (o custo do detectMultiScale cresce com o número de
+# pixels) e as caixas são convertidas de volta para a resolução original.
+# Com a posição do rosto anterior, a busca fica restrita a uma região em volta
+# dele, com volta ao frame inteiro se o rosto não for encontrado ali.
+
+ARQUIVO_CASCADE = cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
+
+
+class DetectorRostos:
+    """
+    Detecção de rostos com Haar Cascade. `detectar` devolve um array (n, 4)
+    de caixas (x, y, w, h) na resolução do frame recebido, do maior rosto
+    para o menor, como o detectMultiScale original (len(), faces[0], for).
+    """
+
+    def __init__(self, arquivo_cascade=ARQUIVO_CASCADE, lado_deteccao=320, fator_escala=1.1,
+                 vizinhos=4, tamanho_minimo=48, margem_roi=0.5, janela_estatisticas=200):
+        self.cascade = cv2.CascadeClassifier(arquivo_cascade)
+        if self.cascade.empty():
+            raise RuntimeError(f"Não foi possível carregar o classificador: {arquivo_cascade}")
+        self.lado_deteccao = lado_deteccao
+        self.fator_escala = fator_escala
+        self.vizinhos = vizinhos
+        self.tamanho_minimo = tamanho_minimo
+        self.margem_roi = margem_roi
+        # detectMultiScale não é seguro para chamadas simultâneas no mesmo objeto
+        self._lock = threading.Lock()
+        self._latencias = deque(maxlen=janela_estatisticas)
+        self._metricas = obter_metricas()
+        self.chamadas = 0
+        self.chamadas_roi = 0
+        self.acertos_roi = 0
+
+    # ---------- Detecção ----------
+
+    def _detectar_em(self, imagem, tamanho_minimo, lado_deteccao):
+        """Detecta em `imagem` (BGR ou cinza) reduzida para `lado_deteccao`."""
+        h, w = imagem.shape[:2]
+        escala = 1.0
+        if lado_deteccao and max(h, w) > lado_deteccao:
+            escala = lado_deteccao / max(h, w)
+            imagem = cv2.resize(imagem, (max(1, int(w * escala)), max(1, int(h * escala))),
+                                interpolation=cv2.INTER_AREA)
+        gray = imagem if imagem.ndim == 2 else cv2.cvtColor(imagem, cv2.COLOR_BGR2GRAY)
+        minimo = int(tamanho_minimo * escala) if tamanho_minimo else 0
+        with self._lock:
+            caixas = self.cascade.detectMultiScale(gray, self.fator_escala, self.vizinhos,
+                                                   minSize=(minimo, minimo))
+        if len(caixas) == 0:
+            return np.empty((0, 4), dtype=np.int32)
+        caixas = np.asarray(caixas, dtype=np.float64)
+        if escala != 1.0:
+            caixas = caixas / escala
+        caixas = np.rint(caixas).astype(np.int32)
+        # Maior rosto primeiro: é o que os chamadores usam em faces[0]
+        ordem = np.argsort(-(caixas[:, 2] * caixas[:, 3]), kind="stable")
+        return caixas[ordem]
+
+    def _regiao_em_volta(self, caixa, largura, altura):
+        x, y, w, h = (int(v) for v in caixa)
+        mx, my = int(w * self.margem_roi), int(h * self.margem_roi)
+        x0, y0 = max(0, x - mx), max(0, y - my)
+        x1, y1 = min(largura, x + w + mx), min(altura, y + h + my)
+        return x0, y0, x1, y1
+
+    def detectar(self, frame, anterior=None, tamanho_minimo=None, lado_deteccao=None):
+        """
+        Detecta rostos no frame (BGR ou cinza).
+        anterior: caixa (x, y, w, h) do rosto no frame anterior; se informada,
+                  procura primeiro só em volta dela.
+        tamanho_minimo: lado mínimo do rosto em pixels do frame original.
+        lado_deteccao: maior lado da cópia usada na detecção (None = padrão,
+                       0 = resolução original).
+        """
+        inicio = time.perf_counter()
+        if tamanho_minimo is None:
+            tamanho_minimo = self.tamanho_minimo
+        if lado_deteccao is None:
+            lado_deteccao = self.lado_deteccao
+        caixas = None
+        usou_roi = anterior is not None
+        if usou_roi:
+            altura, largura = frame.shape[:2]
+            x0, y0, x1, y1 = self._regiao_em_volta(anterior, largura, altura)
+            if x1 > x0 and y1 > y0:
+                # O rosto não muda muito de tamanho entre frames seguidos
+                minimo_roi = max(tamanho_minimo or 0, int(min(anterior[2], anterior[3]) * 0.6))
+                caixas = self._detectar_em(frame[y0:y1, x0:x1], minimo_roi, lado_deteccao)
+                if len(caixas) > 0:
+                    caixas[:, 0] += x0
+                    caixas[:, 1] += y0
+                else:
+                    caixas = None
+        if caixas is None:
+            caixas = self._detectar_em(frame, tamanho_minimo, lado_deteccao)
+        self._registrar((time.perf_counter() - inicio) * 1000, usou_roi, usou_roi and caixas is not None and len(caixas) > 0)
+        return caixas
+
+    def primeiro_rosto(self, frame, anterior=None, tamanho_minimo=None, lado_deteccao=None):
+        """Caixa (x, y, w, h) do maior rosto do frame, ou None."""
+        caixas = self.detectar(frame, anterior, tamanho_minimo, lado_deteccao)
+        return tuple(int(v) for v in caixas[0]) if len(caixas) > 0 else None
+
+    # ---------- Estatísticas ----------
+
+    def _registrar(self, milissegundos, usou_roi, acertou_roi):
+        self._latencias.append(milissegundos)
+        self._metricas.registrar("deteccao.haar", milissegundos)
+        self.chamadas += 1
+        if usou_roi:
+            self.chamadas_roi += 1
+            if acertou_roi:
+                self.acertos_roi += 1
+
+    def estatisticas(self):
+        """Latência por chamada (ms) nas últimas detecções e uso da região restrita."""
+        latencias = np.array(self._latencias, dtype=np.float64)
+        if latencias.size == 0:
+            return {"chamadas": self.chamadas}
+        return {
+            "chamadas": self.chamadas,
+            "ultima_ms": float(latencias[-1]),
+            "media_ms": float(latencias.mean()),
+            "p95_ms": float(np.percentile(latencias, 95)),
+            "max_ms": float(latencias.max()),
+            "chamadas_roi": self.chamadas_roi,
+            "acertos_roi": self.acertos_roi,
+        }
+
+
+_detector = None
+_lock_detector = threading.Lock()
+
+
+def obter_detector():
+    """Retorna o detector de rostos do processo (o cascade é lido uma vez só)."""
+    global _detector
+    with _lock_detector:
+        if _detector is None:
+            _detector = DetectorRostos()
+        return _detector
@@ -0,0 +1,280 @@
+import os
+import numpy as np
+import cv2
+
+# ---------- Fontes de frames ----------
+#
+# Toda captura do sistema passa por uma FonteFrames: webcam, arquivo de
+# vídeo, pasta de imagens ou gerador sintético. As três últimas deixam medir
+# e testar o login sem câmera, no ritmo da gravação (como uma câmera) ou o
+# mais rápido possível.
+#
+# A fonte usada pelo aplicativo vem de RF_FONTE (padrão "0", a webcam):
+#   RF_FONTE=1                         outra webcam
+#   RF_FONTE=videos/entrada.mp4        arquivo de vídeo
+#   RF_FONTE=gravacoes/sessao1/        pasta de imagens (ordem alfabética)
+#   RF_FONTE=sintetico                 frames gerados com um rosto desenhado
+#   RF_FONTE=sintetico:fotos/ana.jpg   frames gerados com uma foto em movimento
+
+FONTE_PADRAO = os.environ.get("RF_FONTE", "0")
+FPS_PADRAO = 30.0
+EXTENSOES_IMAGEM = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+class FonteFrames:
+    """
+    Interface comum das fontes: `abrir()`, `ler(destino=None)` no mesmo
+    formato de `cv2.VideoCapture.read` (ok, frame), `reiniciar()` e
+    `fechar()`. Fontes gravadas têm `fps` nominal; câmeras têm `ao_vivo`.
+    """
+    ao_vivo = False
+    fps = FPS_PADRAO
+
+    def __init__(self, largura=None, altura=None):
+        self.largura = largura
+        self.altura = altura
+
+    @property
+    def nome(self):
+        return type(self).__name__
+
+    def abrir(self):
+        """Prepara a leitura. Retorna False se a fonte não puder ser aberta."""
+        return True
+
+    def ler(self, destino=None):
+        """Próximo frame BGR; `destino` é reaproveitado quando tem o formato certo."""
+        raise NotImplementedError
+
+    def reiniciar(self):
+        """Volta ao primeiro frame. Retorna False se a fonte não permite."""
+        return False
+
+    def fechar(self):
+        pass
+
+    def _ajustar(self, frame):
+        # Gravações no tamanho pedido (a webcam ajusta pelo próprio driver)
+        if self.largura and self.altura and frame.shape[:2] != (self.altura, self.largura):
+            frame = cv2.resize(frame, (self.largura, self.altura))
+        return frame
+
+    def __iter__(self):
+        while True:
+            ok, frame = self.ler()
+            if not ok:
+                return
+            yield frame
+
+    def __enter__(self):
+        if not self.abrir():
+            raise OSError(f"Não foi possível abrir a fonte {self.nome}.")
+        return self
+
+    def __exit__(self, *excecao):
+        self.fechar()
+        return False
+
+
+class FonteWebcam(FonteFrames):
+    """Câmera do OpenCV pelo índice."""
+    ao_vivo = True
+
+    def __init__(self, indice=0, largura=None, altura=None):
+        super().__init__(largura, altura)
+        self.indice = indice
+        self._cap = None
+
+    @property
+    def nome(self):
+        return f"webcam {self.indice}"
+
+    def abrir(self):
+        self._cap = cv2.VideoCapture(self.indice)
+        if not self._cap.isOpened():
+            self._cap.release()
+            return False
+        if self.largura:
+            self._cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.largura)
+        if self.altura:
+            self._cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.altura)
+        return True
+
+    def ler(self, destino=None):
+        return self._cap.read(destino)
+
+    def fechar(self):
+        if self._cap is not None:
+            self._cap.release()
+
+
+class FonteVideo(FonteFrames):
+    """Arquivo de vídeo (ou qualquer caminho que o cv2.VideoCapture abra)."""
+
+    def __init__(self, caminho, largura=None, altura=None):
+        super().__init__(largura, altura)
+        self.caminho = caminho
+        self._cap = None
+
+    @property
+    def nome(self):
+        return os.path.basename(self.caminho) or self.caminho
+
+    def abrir(self):
+        self._cap = cv2.VideoCapture(self.caminho)
+        if not self._cap.isOpened():
+            self._cap.release()
+            return False
+        fps = self._cap.get(cv2.CAP_PROP_FPS)
+        self.fps = fps if fps and fps > 0 else FPS_PADRAO
+        return True
+
+    def ler(self, destino=None):
+        if self.largura and self.altura:
+            ok, frame = self._cap.read()
+            return ok, (self._ajustar(frame) if ok else None)
+        return self._cap.read(destino)
+
+    def reiniciar(self):
+        return bool(self._cap.set(cv2.CAP_PROP_POS_FRAMES, 0))
+
+    def fechar(self):
+        if self._cap is not None:
+            self._cap.release()
+
+
+class FontePastaImagens(FonteFrames):
+    """Imagens de uma pasta em ordem alfabética, como se fossem frames de vídeo."""
+
+    def __init__(self, pasta, fps=FPS_PADRAO, largura=None, altura=None):
+        super().__init__(largura, altura)
+        self.pasta = pasta
+        self.fps = fps
+        self.arquivos = []
+        self.ilegiveis = 0
+        self._posicao = 0
+
+    @property
+    def nome(self):
+        return os.path.basename(os.path.normpath(self.pasta))
+
+    def abrir(self):
+        if not os.path.isdir(self.pasta):
+            return False
+        self.arquivos = sorted(os.path.join(self.pasta, nome) for nome in os.listdir(self.pasta)
+                               if nome.lower().endswith(EXTENSOES_IMAGEM))
+        self._posicao = 0
+        return len(self.arquivos) > 0
+
+    def ler(self, destino=None):
+        while self._posicao < len(self.arquivos):
+            frame = cv2.imread(self.arquivos[self._posicao])
+            self._posicao += 1
+            if frame is None:
+                self.ilegiveis += 1
+                continue
+            return True, self._ajustar(frame)
+        return False, None
+
+    def reiniciar(self):
+        self._posicao = 0
+        return True
+
+
+class FonteSintetica(FonteFrames):
+    """
+    Frames gerados: fundo fixo com ruído leve e um rosto que vai e volta na
+    horizontal. Com `rosto` (caminho ou imagem), o rosto é essa foto; sem
+    ela, é um rosto esquemático, suficiente para medir captura e exibição
+    (o Haar Cascade nem sempre o detecta).
+    """
+
+    def __init__(self, largura=None, altura=None, fps=FPS_PADRAO, n_frames=300, rosto=None, semente=0):
+        super().__init__(largura or 320, altura or 240)
+        self.fps = fps
+        self.n_frames = n_frames
+        self.semente = semente
+        self._rosto_origem = rosto
+        self._rosto = None
+        self._fundo = None
+        self._ruido = None
+        self._posicao = 0
+
+    @property
+    def nome(self):
+        return "sintetico"
+
+    def abrir(self):
+        rosto = self._rosto_origem
+        if isinstance(rosto, str):
+            rosto = cv2.imread(rosto)
+            if rosto is None:
+                return False
+        lado = int(min(self.largura, self.altura) * 0.55)
+        self._rosto = cv2.resize(rosto, (lado, lado)) if rosto is not None else _rosto_esquematico(lado)
+        gerador = np.random.default_rng(self.semente)
+        gradiente = np.linspace(90, 150, self.largura, dtype=np.float32)
+        self._fundo = np.repeat(np.tile(gradiente, (self.altura, 1))[:, :, None], 3, axis=2).astype(np.uint8)
+        # Alguns quadros de ruído pré-gerados, usados em rodízio (gerar a cada frame custaria mais que a leitura)
+        self._ruido = gerador.integers(0, 6, size=(8, self.altura, self.largura, 3), dtype=np.uint8)
+        self._posicao = 0
+        return True
+
+    def ler(self, destino=None):
+        if self.n_frames and self._posicao >= self.n_frames:
+            return False, None
+        formato = (self.altura, self.largura, 3)
+        frame = destino if destino is not None and destino.shape == formato else np.empty(formato, dtype=np.uint8)
+        np.add(self._fundo, self._ruido[self._posicao % len(self._ruido)], out=frame)
+        lado = self._rosto.shape[0]
+        folga = self.largura - lado
+        fase = (self._posicao % 120) / 120.0  # um vaivém a cada 4 s a 30 fps
+        x = int(folga * (1 - abs(2 * fase - 1)))
+        y = (self.altura - lado) // 2
+        frame[y:y + lado, x:x + lado] = self._rosto
+        self._posicao += 1
+        return True, frame
+
+    def reiniciar(self):
+        self._posicao = 0
+        return True
+
+
+def _rosto_esquematico(lado):
+    rosto = np.full((lado, lado, 3), 120, dtype=np.uint8)
+    centro, raio = lado // 2, lado // 2
+    cv2.ellipse(rosto, (centro, centro), (int(raio * 0.8), raio - 2), 0, 0, 360, (150, 180, 215), -1)
+    for olho in (int(lado * 0.35), int(lado * 0.65)):
+        cv2.ellipse(rosto, (olho, int(lado * 0.4)), (lado // 12, lado // 24), 0, 0, 360, (40, 40, 40), -1)
+    cv2.line(rosto, (centro, int(lado * 0.45)), (centro, int(lado * 0.6)), (110, 130, 170), 2)
+    cv2.ellipse(rosto, (centro, int(lado * 0.72)), (lado // 6, lado // 20), 0, 0, 360, (60, 60, 150), -1)
+    return rosto
+
+
+def criar_fonte(fonte=FONTE_PADRAO, largura=None, altura=None):
+    """
+    FonteFrames a partir de uma especificação: índice de webcam (int ou
+    "0"), "sintetico[:foto]", pasta de imagens ou arquivo de vídeo. Uma
+    FonteFrames já pronta é devolvida como está.
+    """
+    if isinstance(fonte, FonteFrames):
+        return fonte
+    if isinstance(fonte, int) or (isinstance(fonte, str) and fonte.isdigit()):
+        return FonteWebcam(int(fonte), largura, altura)
+    if fonte == "sintetico" or fonte.startswith("sintetico:"):
+        return FonteSintetica(largura, altura, rosto=fonte.partition(":")[2] or None)
+    if os.path.isdir(fonte):
+        return FontePastaImagens(fonte, largura=largura, altura=altura)
+    return FonteVideo(fonte, largura, altura)
+
+
+def capturar_frame(fonte=FONTE_PADRAO):
+    """Abre a fonte, lê um único frame e a fecha. Retorna o frame ou None."""
+    origem = criar_fonte(fonte)
+    if not origem.abrir():
+        return None
+    try:
+        ok, frame = origem.ler()
+    finally:
+        origem.fechar()
+    return frame if ok else None
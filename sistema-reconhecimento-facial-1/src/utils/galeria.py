@@ -0,0 +1,532 @@
+import threading
+import numpy as np
+from utils.armazem_embeddings import ArmazemEmbeddings, migrar_npy, possui_npy_legado
+from utils.indice_ivf import IndiceIVF
+from utils.indice_centroides import IndiceCentroides
+from utils.quantizacao import MatrizQuantizada
+
+# ---------- Galeria de embeddings (busca 1:N) ----------
+
+METRICAS = ("euclidiana", "cosseno")
+
+
+class GaleriaFacial:
+    """
+    Mantém todos os embeddings cadastrados em uma única matriz float32
+    contígua e já normalizada (norma L2 = 1), junto com um vetor linha → CPF.
+
+    Uma consulta é respondida com um único produto matriz-vetor. As normas
+    originais são guardadas à parte, então a distância euclidiana "crua"
+    (a mesma usada no login com o limiar `dist < 7`) pode ser recuperada
+    sem desnormalizar a matriz:
+
+        ||a - b||² = ||a||² + ||b||² - 2·||a||·||b||·cos(a, b)
+
+    Opcionalmente, `construir_indice` ativa um índice IVF aproximado para
+    galerias muito grandes, e `construir_centroides` ativa a busca em cascata
+    (centróide por usuário, depois só as linhas dos mais próximos); sem eles
+    a busca é exata (força bruta). Com `quantizar` (ou `quantizacao` ao
+    carregar do armazém), as linhas são pré-selecionadas por uma cópia
+    float16/int8 da matriz e só as melhores são comparadas em float32.
+    Linhas podem ser desativadas (`ativos`) sem reconstruir a matriz.
+    """
+
+    def __init__(self, embeddings=None, cpfs=None):
+        self.indice = None
+        self.centroides = None
+        self.quantizada = None
+        self.ativos = None  # None = todas as linhas ativas
+        if embeddings is None or len(embeddings) == 0:
+            self.matriz = np.zeros((0, 0), dtype=np.float32)
+            self.normas = np.zeros(0, dtype=np.float32)
+            self.cpfs = np.zeros(0, dtype=str)
+            return
+
+        matriz = np.asarray(embeddings, dtype=np.float32)
+        if matriz.ndim != 2:
+            raise ValueError("Os embeddings devem formar uma matriz (linhas x dimensões).")
+        if cpfs is None or len(cpfs) != len(matriz):
+            raise ValueError("É necessário um CPF para cada linha de embedding.")
+
+        normas = np.linalg.norm(matriz, axis=1).astype(np.float32)
+        normas[normas == 0] = 1.0  # evita divisão por zero em vetores nulos
+        self.matriz = np.ascontiguousarray(matriz / normas[:, None], dtype=np.float32)
+        self.normas = normas
+        self.cpfs = np.asarray(cpfs, dtype=str)
+
+    @classmethod
+    def _de_partes(cls, matriz, normas, cpfs, ativos=None):
+        """Monta a galeria a partir de linhas já normalizadas."""
+        galeria = cls()
+        galeria.matriz = matriz
+        galeria.normas = np.asarray(normas, dtype=np.float32)
+        galeria.cpfs = np.asarray(cpfs, dtype=str)
+        galeria.ativos = None if ativos is None or ativos.all() else ativos
+        return galeria
+
+    @classmethod
+    def de_dicionario(cls, embeddings_por_cpf):
+        """Cria a galeria a partir de um dicionário {cpf: [embedding, ...]}."""
+        embeddings = []
+        cpfs = []
+        for cpf, lista_embs in embeddings_por_cpf.items():
+            for emb in lista_embs:
+                embeddings.append(np.asarray(emb, dtype=np.float32).ravel())
+                cpfs.append(cpf)
+        return cls(embeddings, cpfs)
+
+    @classmethod
+    def de_armazem(cls, armazem, quantizacao=None, n_reordenar=64):
+        """
+        Cria a galeria direto do armazém empacotado. As linhas já estão
+        normalizadas em disco, então a matriz é usada via memmap, sem cópia;
+        linhas removidas e ainda não compactadas ficam só desativadas.
+        Com `quantizacao` ("float16" ou "int8"), a cópia quantizada do
+        armazém também é mapeada e passa a fazer a pré-seleção das buscas.
+        """
+        matriz, indice = armazem.carregar()
+        if len(indice) == 0:
+            return cls()
+        galeria = cls._de_partes(matriz, indice["norma"], np.char.decode(indice["cpf"], "ascii"),
+                                 np.asarray(indice["ativo"] == 1))
+        if quantizacao:
+            codigos, escalas = armazem.carregar_quantizada(quantizacao)
+            # Linhas anexadas entre as duas leituras ficam de fora, como na matriz
+            galeria.quantizada = MatrizQuantizada(codigos[:len(galeria)], escalas, n_reordenar)
+        return galeria
+
+    @classmethod
+    def carregar_de_pasta(cls, pasta="faces", n_sondas=None, n_candidatos=None, quantizacao=None):
+        """
+        Carrega a galeria do armazém em faces/. Se só existir o formato
+        antigo (faces/<cpf>/*.npy), faz a migração uma única vez antes.
+        Se `n_sondas` for informado, já constrói o índice aproximado; se
+        `n_candidatos` for informado, os centróides da busca em cascata; com
+        `quantizacao`, a busca usa a cópia float16/int8 do armazém.
+        """
+        armazem = ArmazemEmbeddings(pasta)
+        if not armazem.existe() and possui_npy_legado(pasta):
+            usuarios, embeddings = migrar_npy(pasta)
+            print(f"Embeddings migrados para o armazém: {usuarios} usuários, {embeddings} embeddings.")
+        galeria = cls.de_armazem(armazem, quantizacao)
+        galeria.construir_auxiliares(n_sondas, n_candidatos)
+        return galeria
+
+    @classmethod
+    def concatenar(cls, galerias):
+        """Junta as linhas ativas de várias galerias em uma nova matriz contígua."""
+        partes = [g for g in galerias if g.quantidade_ativa() > 0]
+        if not partes:
+            return cls()
+        mascaras = [slice(None) if g.ativos is None else g.ativos for g in partes]
+        return cls._de_partes(
+            np.ascontiguousarray(np.concatenate([np.asarray(g.matriz[m]) for g, m in zip(partes, mascaras)])),
+            np.concatenate([g.normas[m] for g, m in zip(partes, mascaras)]),
+            np.concatenate([g.cpfs[m] for g, m in zip(partes, mascaras)]),
+        )
+
+    def construir_indice(self, n_listas=None, n_sondas=8):
+        """
+        Ativa a busca aproximada (IVF). `n_sondas` é o ajuste entre recall e
+        latência: quantas listas são varridas por consulta.
+        """
+        self.indice = IndiceIVF(n_listas=n_listas, n_sondas=n_sondas).construir(self.matriz)
+        return self.indice
+
+    def construir_centroides(self, n_candidatos=32):
+        """
+        Ativa a busca em cascata: primeiro os `n_candidatos` usuários de
+        centróide mais próximo, depois a distância exata só nas linhas deles.
+        """
+        self.centroides = IndiceCentroides(n_candidatos=n_candidatos).construir(self.matriz, self.cpfs, self.ativos)
+        return self.centroides
+
+    def construir_auxiliares(self, n_sondas=None, n_candidatos=None):
+        """Constrói os índices pedidos (IVF e/ou centróides), se houver linhas ativas."""
+        if self.quantidade_ativa() == 0:
+            return
+        if n_sondas:
+            self.construir_indice(n_sondas=n_sondas)
+        if n_candidatos:
+            self.construir_centroides(n_candidatos=n_candidatos)
+
+    def quantizar(self, tipo="int8", n_reordenar=64):
+        """
+        Ativa a pré-seleção por uma cópia em memória da matriz em float16 ou
+        int8; as `n_reordenar` melhores linhas são reordenadas em float32.
+        """
+        self.quantizada = MatrizQuantizada.de_matriz(self.matriz, tipo, n_reordenar)
+        return self.quantizada
+
+    def __len__(self):
+        return len(self.cpfs)
+
+    def quantidade_ativa(self):
+        """Número de linhas que participam das buscas."""
+        return len(self.cpfs) if self.ativos is None else int(np.count_nonzero(self.ativos))
+
+    def _mascara_cpf(self, cpf):
+        mascara = self.cpfs == cpf
+        return mascara if self.ativos is None else mascara & self.ativos
+
+    def possui_cpf(self, cpf):
+        """Retorna True se o CPF tem pelo menos um embedding ativo na galeria."""
+        return bool(np.any(self._mascara_cpf(cpf)))
+
+    def cpfs_cadastrados(self):
+        """Conjunto dos CPFs com pelo menos uma linha ativa."""
+        cpfs = self.cpfs if self.ativos is None else self.cpfs[self.ativos]
+        return frozenset(np.unique(cpfs).tolist())
+
+    def sem_cpf(self, cpf):
+        """
+        Retorna uma cópia rasa da galeria com as linhas do CPF desativadas
+        (a matriz e o índice são compartilhados; só a máscara é nova).
+        """
+        copia = GaleriaFacial._de_partes(self.matriz, self.normas, self.cpfs, self.ativos)
+        copia.indice = self.indice
+        copia.centroides = self.centroides
+        copia.quantizada = self.quantizada
+        if len(self) > 0:
+            ativos = np.ones(len(self), dtype=bool) if self.ativos is None else self.ativos.copy()
+            ativos[self.cpfs == cpf] = False
+            copia.ativos = ativos
+        return copia
+
+    # ---------- Consultas ----------
+
+    def distancias(self, embedding, metrica="euclidiana", linhas=None):
+        """
+        Calcula a distância do embedding consultado para todas as linhas
+        (ou apenas para `linhas`, se informado) com uma única operação matricial.
+        """
+        if metrica not in METRICAS:
+            raise ValueError(f"Métrica desconhecida: {metrica}")
+        consulta = np.asarray(embedding, dtype=np.float32).ravel()
+        norma_consulta = float(np.linalg.norm(consulta)) or 1.0
+        matriz = self.matriz if linhas is None else self.matriz[linhas]
+        normas = self.normas if linhas is None else self.normas[linhas]
+
+        cossenos = matriz @ (consulta / norma_consulta)
+        if metrica == "cosseno":
+            return 1.0 - cossenos
+        quadrado = normas * normas + norma_consulta * norma_consulta - 2.0 * normas * norma_consulta * cossenos
+        return np.sqrt(np.maximum(quadrado, 0.0))
+
+    def distancias_lote(self, embeddings, metrica="euclidiana"):
+        """
+        Distâncias de vários embeddings (consultas x linhas) para todas as
+        linhas com um único produto de matrizes.
+        """
+        if metrica not in METRICAS:
+            raise ValueError(f"Métrica desconhecida: {metrica}")
+        consultas = np.asarray(embeddings, dtype=np.float32).reshape(len(embeddings), -1)
+        normas_consultas = np.linalg.norm(consultas, axis=1)
+        normas_consultas[normas_consultas == 0] = 1.0
+        cossenos = (consultas / normas_consultas[:, None]) @ self.matriz.T
+        if metrica == "cosseno":
+            return 1.0 - cossenos
+        normas = self.normas[None, :]
+        normas_consultas = normas_consultas[:, None]
+        quadrado = normas * normas + normas_consultas * normas_consultas - 2.0 * normas * normas_consultas * cossenos
+        return np.sqrt(np.maximum(quadrado, 0.0))
+
+    def _linhas_busca(self, embedding):
+        """
+        Linhas a comparar: todas (None), as dos usuários pré-selecionados pelos
+        centróides ou as candidatas do índice aproximado.
+        """
+        if self.indice is None and self.centroides is None:
+            return None
+        consulta = np.asarray(embedding, dtype=np.float32).ravel()
+        consulta = consulta / (float(np.linalg.norm(consulta)) or 1.0)
+        if self.centroides is not None:
+            return self.centroides.linhas_candidatas(consulta)
+        return self.indice.linhas_candidatas(consulta)
+
+    def _reordenar_quantizada(self, embedding, metrica, linhas):
+        """
+        Pré-seleciona, pela matriz quantizada, as `n_reordenar` linhas mais
+        próximas entre `linhas` (None = todas). A distância delas é depois
+        recalculada em float32 por `distancias`.
+        """
+        consulta = np.asarray(embedding, dtype=np.float32).ravel()
+        norma_consulta = float(np.linalg.norm(consulta)) or 1.0
+        cossenos = self.quantizada.cossenos(consulta / norma_consulta, linhas)
+        if metrica == "cosseno":
+            ordem = -cossenos
+        else:
+            # ||a - b||² sem o termo ||b||², que é o mesmo para todas as linhas
+            normas = self.normas if linhas is None else self.normas[linhas]
+            ordem = normas * normas - 2.0 * normas * norma_consulta * cossenos
+        if self.ativos is not None:
+            ativos = self.ativos if linhas is None else self.ativos[linhas]
+            ordem = np.where(ativos, ordem, np.inf)
+        n = min(len(ordem), self.quantizada.n_reordenar)
+        if n == 0:
+            return np.zeros(0, dtype=np.int64)
+        escolhidas = np.argpartition(ordem, n - 1)[:n] if n < len(ordem) else np.arange(len(ordem))
+        escolhidas = np.sort(escolhidas)  # leitura em ordem no memmap float32
+        return escolhidas if linhas is None else linhas[escolhidas]
+
+    def _distancias_busca(self, embedding, metrica):
+        """Retorna (distâncias, linhas) com infinito nas linhas desativadas."""
+        linhas = self._linhas_busca(embedding)
+        if self.quantizada is not None:
+            linhas = self._reordenar_quantizada(embedding, metrica, linhas)
+        dist = self.distancias(embedding, metrica, linhas)
+        if self.ativos is not None:
+            ativos = self.ativos if linhas is None else self.ativos[linhas]
+            dist = np.where(ativos, dist, np.inf)
+        return dist, linhas
+
+    def buscar(self, embedding, metrica="euclidiana"):
+        """
+        Retorna (cpf, distância) da linha mais próxima do embedding,
+        ou None se a galeria estiver vazia.
+        """
+        if len(self) == 0:
+            return None
+        dist, linhas = self._distancias_busca(embedding, metrica)
+        if len(dist) == 0:
+            return None
+        i = int(np.argmin(dist))
+        if not np.isfinite(dist[i]):
+            return None
+        linha = i if linhas is None else linhas[i]
+        return str(self.cpfs[linha]), float(dist[i])
+
+    def buscar_lote(self, embeddings, metrica="euclidiana"):
+        """
+        `buscar` para vários embeddings de uma vez (ex.: todos os rostos de
+        um frame). Na busca exata, todas as distâncias saem de um único
+        produto de matrizes; com índice, centróides ou matriz quantizada,
+        cada consulta segue o caminho de `buscar`.
+        """
+        if len(embeddings) == 0:
+            return []
+        if len(self) == 0:
+            return [None] * len(embeddings)
+        if self.indice is not None or self.centroides is not None or self.quantizada is not None:
+            return [self.buscar(embedding, metrica) for embedding in embeddings]
+        dist = self.distancias_lote(embeddings, metrica)
+        if self.ativos is not None:
+            dist = np.where(self.ativos[None, :], dist, np.inf)
+        melhores = np.argmin(dist, axis=1)
+        resultados = []
+        for i, linha in enumerate(melhores):
+            distancia = dist[i, linha]
+            resultados.append((str(self.cpfs[linha]), float(distancia)) if np.isfinite(distancia) else None)
+        return resultados
+
+    def buscar_top_k(self, embedding, k=5, metrica="euclidiana"):
+        """
+        Retorna até `k` candidatos [(cpf, distância), ...] em ordem crescente
+        de distância, com no máximo uma entrada (a melhor) por CPF.
+        """
+        if len(self) == 0 or k <= 0:
+            return []
+        dist, linhas = self._distancias_busca(embedding, metrica)
+        cpfs = self.cpfs if linhas is None else self.cpfs[linhas]
+        n = len(dist)
+        # Busca parcial: pega as `kk` menores distâncias e amplia se os
+        # CPFs se repetirem (cada usuário tem várias linhas na matriz).
+        kk = min(n, k)
+        while True:
+            if kk < n:
+                indices = np.argpartition(dist, kk - 1)[:kk]
+            else:
+                indices = np.arange(n)
+            indices = indices[np.argsort(dist[indices], kind="stable")]
+            candidatos = []
+            vistos = set()
+            for i in indices:
+                if not np.isfinite(dist[i]):
+                    return candidatos
+                cpf = str(cpfs[i])
+                if cpf not in vistos:
+                    vistos.add(cpf)
+                    candidatos.append((cpf, float(dist[i])))
+                    if len(candidatos) == k:
+                        return candidatos
+            if kk >= n:
+                return candidatos
+            kk = min(n, kk * 2)
+
+    def verificar(self, embedding, cpf, metrica="euclidiana"):
+        """
+        Compara o embedding apenas com as linhas de um CPF (verificação 1:1).
+        Retorna a menor distância ou None se o CPF não estiver na galeria.
+        """
+        linhas = np.flatnonzero(self._mascara_cpf(cpf))
+        if len(linhas) == 0:
+            return None
+        return float(np.min(self.distancias(embedding, metrica, linhas)))
+
+
+# ---------- Serviço de galeria do processo ----------
+
+class ServicoGaleria:
+    """
+    Galeria única do processo: carregada do disco uma vez e depois mantida
+    em dia pelos fluxos de cadastro, edição e exclusão.
+
+    O estado é formado por uma galeria base (grande, possivelmente com índice
+    IVF) e uma galeria delta (pequena, busca exata) com as linhas novas.
+    Com `quantizacao`, a base é sempre a do armazém em disco (float32 e
+    cópia quantizada mapeadas), inclusive depois de cada compactação.
+    Substituir ou excluir um usuário só desativa as linhas dele na base.
+    Quando o delta ou as linhas desativadas crescem demais, uma thread em
+    segundo plano compacta tudo em uma nova base e troca de forma atômica.
+    As galerias nunca são alteradas no lugar: cada atualização publica novos
+    objetos, então as buscas não precisam de lock.
+    """
+
+    def __init__(self, pasta="faces", n_sondas=None, limite_delta=2048, fracao_removidas=0.2, n_candidatos=None,
+                 quantizacao=None):
+        self.pasta = pasta
+        self.quantizacao = quantizacao
+        self.n_sondas = n_sondas
+        self.n_candidatos = n_candidatos
+        self.limite_delta = limite_delta
+        self.fracao_removidas = fracao_removidas
+        self._lock = threading.Lock()
+        self._versao = 0
+        self._compactando = False
+        self._estado = (GaleriaFacial.carregar_de_pasta(pasta, n_sondas=n_sondas, n_candidatos=n_candidatos,
+                                                        quantizacao=quantizacao),
+                        GaleriaFacial())
+        # CPFs presentes (base + delta): possui_cpf sem varrer o vetor de CPFs
+        self._cpfs = self._estado[0].cpfs_cadastrados()
+
+    # ---------- Atualizações incrementais ----------
+
+    def _publicar(self, base, delta, cpfs):
+        """Troca o estado atual (chamar com o lock) e agenda compactação se preciso."""
+        self._estado = (base, delta)
+        self._cpfs = cpfs
+        self._versao += 1
+        removidas = len(base) - base.quantidade_ativa()
+        precisa = len(delta) >= self.limite_delta or removidas > self.fracao_removidas * max(1, len(base))
+        if precisa and not self._compactando:
+            self._compactando = True
+            threading.Thread(target=self._compactar_em_background, daemon=True).start()
+
+    @staticmethod
+    def _galeria_do_usuario(cpf, embeddings):
+        matriz = np.asarray(embeddings, dtype=np.float32).reshape(len(embeddings), -1)
+        return GaleriaFacial(matriz, [cpf] * len(matriz))
+
+    def adicionar_usuario(self, cpf, embeddings):
+        """Acrescenta linhas de um CPF (sem mexer nas que ele já tiver)."""
+        novo = self._galeria_do_usuario(cpf, embeddings)
+        with self._lock:
+            base, delta = self._estado
+            self._publicar(base, GaleriaFacial.concatenar([delta, novo]), self._cpfs | {cpf})
+
+    def substituir_usuario(self, cpf, embeddings):
+        """Troca todas as linhas de um CPF pelos novos embeddings."""
+        novo = self._galeria_do_usuario(cpf, embeddings)
+        with self._lock:
+            base, delta = self._estado
+            self._publicar(base.sem_cpf(cpf), GaleriaFacial.concatenar([delta.sem_cpf(cpf), novo]), self._cpfs | {cpf})
+
+    def remover_usuario(self, cpf):
+        """Desativa (tombstone) todas as linhas de um CPF."""
+        with self._lock:
+            base, delta = self._estado
+            self._publicar(base.sem_cpf(cpf), GaleriaFacial.concatenar([delta.sem_cpf(cpf)]), self._cpfs - {cpf})
+
+    # ---------- Compactação ----------
+
+    def _compactar_em_background(self):
+        try:
+            # Compacta também o armazém em disco (antes: a base quantizada é relida dele)
+            armazem = ArmazemEmbeddings(self.pasta)
+            ativas, removidas = armazem.contagem()
+            if removidas > self.fracao_removidas * max(1, ativas + removidas):
+                armazem.compactar()
+            for _ in range(3):
+                with self._lock:
+                    (base, delta), versao = self._estado, self._versao
+                if self.quantizacao:
+                    # O cadastro grava no armazém antes de avisar o serviço: o disco
+                    # já tem o delta, e a matriz float32 continua só mapeada
+                    nova = GaleriaFacial.carregar_de_pasta(self.pasta, quantizacao=self.quantizacao)
+                else:
+                    nova = GaleriaFacial.concatenar([base, delta])
+                nova.construir_auxiliares(self.n_sondas, self.n_candidatos)
+                with self._lock:
+                    # Se houve atualização durante a compactação, tenta de novo
+                    if self._versao == versao:
+                        self._estado = (nova, GaleriaFacial())
+                        self._versao += 1
+                        break
+        except Exception as e:
+            print("Erro ao compactar a galeria:", e)
+        finally:
+            with self._lock:
+                self._compactando = False
+
+    # ---------- Consultas ----------
+
+    def __len__(self):
+        base, delta = self._estado
+        return base.quantidade_ativa() + delta.quantidade_ativa()
+
+    def possui_cpf(self, cpf):
+        return cpf in self._cpfs
+
+    def cpfs_cadastrados(self):
+        """Conjunto (imutável) dos CPFs com embeddings, mantido pelas atualizações."""
+        return self._cpfs
+
+    def buscar(self, embedding, metrica="euclidiana"):
+        """Mesmo contrato de GaleriaFacial.buscar, considerando base e delta."""
+        base, delta = self._estado
+        resultados = [r for r in (base.buscar(embedding, metrica), delta.buscar(embedding, metrica)) if r]
+        return min(resultados, key=lambda r: r[1]) if resultados else None
+
+    def buscar_lote(self, embeddings, metrica="euclidiana"):
+        """Mesmo contrato de GaleriaFacial.buscar_lote, considerando base e delta."""
+        base, delta = self._estado
+        saida = []
+        for da_base, do_delta in zip(base.buscar_lote(embeddings, metrica), delta.buscar_lote(embeddings, metrica)):
+            resultados = [r for r in (da_base, do_delta) if r]
+            saida.append(min(resultados, key=lambda r: r[1]) if resultados else None)
+        return saida
+
+    def buscar_top_k(self, embedding, k=5, metrica="euclidiana"):
+        """Mesmo contrato de GaleriaFacial.buscar_top_k, considerando base e delta."""
+        base, delta = self._estado
+        melhores = {}
+        for cpf, dist in base.buscar_top_k(embedding, k, metrica) + delta.buscar_top_k(embedding, k, metrica):
+            if cpf not in melhores or dist < melhores[cpf]:
+                melhores[cpf] = dist
+        return sorted(melhores.items(), key=lambda item: item[1])[:k]
+
+    def verificar(self, embedding, cpf, metrica="euclidiana"):
+        """Mesmo contrato de GaleriaFacial.verificar, considerando base e delta."""
+        base, delta = self._estado
+        distancias = [d for d in (base.verificar(embedding, cpf, metrica),
+                                  delta.verificar(embedding, cpf, metrica)) if d is not None]
+        return min(distancias) if distancias else None
+
+
+_servico = None
+_lock_servico = threading.Lock()
+
+
+def obter_servico_galeria(pasta="faces", n_sondas=None, n_candidatos=None, quantizacao=None):
+    """Retorna o serviço de galeria do processo, carregando do disco na primeira chamada."""
+    global _servico
+    with _lock_servico:
+        if _servico is None:
+            _servico = ServicoGaleria(pasta, n_sondas=n_sondas, n_candidatos=n_candidatos,
+                                      quantizacao=quantizacao)
+        return _servico
+
+
+def servico_galeria_carregado():
+    """Retorna o serviço se ele já foi carregado, senão None (não força a carga)."""
+    return _servico
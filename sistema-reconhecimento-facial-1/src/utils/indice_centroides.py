@@ -0,0 +1,143 @@
+import time
+import argparse
+import numpy as np
+
+# ---------- Busca em cascata por centróides de usuário ----------
+#
+# Cada usuário tem várias linhas na galeria (4 fotos + 4 variações). A
+# primeira etapa compara a consulta só com o centróide de cada usuário (uma
+# matriz usuários x dim, 8x menor que a galeria) e escolhe os `n_candidatos`
+# mais próximos; a segunda recalcula a distância exata apenas contra todas
+# as linhas desses usuários.
+
+TAMANHO_BLOCO = 65536  # linhas por bloco ao somar os centróides (limita a memória)
+
+
+class IndiceCentroides:
+    """Centróides por CPF sobre a matriz normalizada de uma GaleriaFacial."""
+
+    def __init__(self, n_candidatos=32):
+        self.n_candidatos = n_candidatos
+        self.centroides = None
+        self.ordem = None    # linhas da galeria agrupadas por usuário
+        self.inicios = None  # usuário u ocupa ordem[inicios[u]:inicios[u + 1]]
+
+    def construir(self, matriz, cpfs, ativos=None):
+        """Calcula o centróide (normalizado) das linhas ativas de cada CPF."""
+        linhas = np.arange(len(cpfs)) if ativos is None else np.flatnonzero(ativos)
+        if len(linhas) == 0:
+            raise ValueError("Não é possível construir os centróides com a galeria vazia.")
+        _, usuario = np.unique(np.asarray(cpfs)[linhas], return_inverse=True)
+        ordem_local = np.argsort(usuario, kind="stable")
+        self.ordem = linhas[ordem_local].astype(np.int64)
+        contagens = np.bincount(usuario)
+        self.inicios = np.concatenate([[0], np.cumsum(contagens)]).astype(np.int64)
+
+        # Em blocos de usuários: a matriz pode ser um memmap maior que a RAM
+        somas = np.empty((len(contagens), matriz.shape[1]), dtype=np.float32)
+        passo = max(1, TAMANHO_BLOCO // max(1, int(contagens.max())))
+        for u0 in range(0, len(contagens), passo):
+            u1 = min(len(contagens), u0 + passo)
+            bloco = np.asarray(matriz[self.ordem[self.inicios[u0]:self.inicios[u1]]], dtype=np.float32)
+            somas[u0:u1] = np.add.reduceat(bloco, self.inicios[u0:u1] - self.inicios[u0], axis=0)
+        normas = np.linalg.norm(somas, axis=1, keepdims=True)
+        normas[normas == 0] = 1.0
+        self.centroides = np.ascontiguousarray(somas / normas, dtype=np.float32)
+        return self
+
+    @property
+    def n_usuarios(self):
+        return 0 if self.centroides is None else len(self.centroides)
+
+    def linhas_candidatas(self, consulta_normalizada, n_candidatos=None):
+        """Linhas de todos os usuários cujos centróides estão mais próximos da consulta."""
+        n = min(self.n_usuarios, n_candidatos or self.n_candidatos)
+        cossenos = self.centroides @ consulta_normalizada
+        if n < self.n_usuarios:
+            escolhidos = np.argpartition(-cossenos, n - 1)[:n]
+        else:
+            escolhidos = np.arange(self.n_usuarios)
+        return np.concatenate([self.ordem[self.inicios[u]:self.inicios[u + 1]] for u in escolhidos])
+
+    def memoria_bytes(self):
+        """Memória extra ocupada pelo índice (centróides + mapa de linhas)."""
+        if self.centroides is None:
+            return 0
+        return self.centroides.nbytes + self.ordem.nbytes + self.inicios.nbytes
+
+
+def relatorio_cascata(galeria, consultas, lista_n_candidatos, metrica="euclidiana"):
+    """
+    Compara a busca em cascata com a busca exata (força bruta) para cada
+    valor de `n_candidatos`. Para cada configuração retorna:
+      - paridade_top1: fração das consultas com o mesmo CPF mais próximo;
+      - concordancia: fração em que a decisão do login (dist < 7) é a mesma;
+      - aceites_perdidos: consultas aceitas pela busca exata e rejeitadas/trocadas;
+      - latência média (ms) de cada modo e o ganho (exato / cascata);
+      - memória (MB) da galeria e do índice de centróides.
+    """
+    from utils.indice_ivf import decisao_login
+
+    centroides, indice = galeria.centroides, galeria.indice
+    galeria.centroides, galeria.indice = None, None
+    inicio = time.perf_counter()
+    exatos = [galeria.buscar(q, metrica) for q in consultas]
+    ms_exato = (time.perf_counter() - inicio) * 1000 / max(1, len(consultas))
+    galeria.centroides, galeria.indice = centroides, indice
+    decisoes_exatas = [decisao_login(r) for r in exatos]
+
+    linhas = []
+    for n_candidatos in lista_n_candidatos:
+        galeria.centroides.n_candidatos = n_candidatos
+        inicio = time.perf_counter()
+        cascata = [galeria.buscar(q, metrica) for q in consultas]
+        ms_cascata = (time.perf_counter() - inicio) * 1000 / max(1, len(consultas))
+        decisoes = [decisao_login(r) for r in cascata]
+        iguais = sum(1 for e, c in zip(exatos, cascata) if e is not None and c is not None and e[0] == c[0])
+        concordam = sum(1 for e, c in zip(decisoes_exatas, decisoes) if e == c)
+        perdidos = sum(1 for e, c in zip(decisoes_exatas, decisoes) if e is not None and e != c)
+        linhas.append({
+            "n_candidatos": n_candidatos,
+            "paridade_top1": iguais / max(1, len(consultas)),
+            "concordancia": concordam / max(1, len(consultas)),
+            "aceites_perdidos": perdidos,
+            "ms_exato": ms_exato,
+            "ms_cascata": ms_cascata,
+            "ganho": ms_exato / ms_cascata if ms_cascata > 0 else 0.0,
+            "mb_galeria": (galeria.matriz.nbytes + galeria.normas.nbytes) / 2**20,
+            "mb_centroides": galeria.centroides.memoria_bytes() / 2**20,
+        })
+    return linhas
+
+
+if __name__ == "__main__":
+    # Executar a partir de src/:  python -m utils.indice_centroides --sintetico 20000
+    from utils.galeria import GaleriaFacial
+    from utils.indice_ivf import gerar_embeddings_sinteticos, gerar_consultas
+
+    parser = argparse.ArgumentParser(description="Busca em cascata (centróides) contra a busca exata (dist < 7).")
+    parser.add_argument("--pasta", default="faces", help="Pasta do armazém de embeddings")
+    parser.add_argument("--sintetico", type=int, default=0, help="Usa N usuários sintéticos em vez de faces/")
+    parser.add_argument("--consultas", type=int, default=500)
+    parser.add_argument("--candidatos", default="4,8,16,32,64", help="Valores de n_candidatos separados por vírgula")
+    args = parser.parse_args()
+
+    if args.sintetico:
+        embeddings, cpfs, _ = gerar_embeddings_sinteticos(args.sintetico)
+        galeria = GaleriaFacial(embeddings, cpfs)
+    else:
+        galeria = GaleriaFacial.carregar_de_pasta(args.pasta)
+    if len(galeria) == 0:
+        raise SystemExit("Galeria vazia.")
+    consultas = gerar_consultas(galeria, args.consultas)
+
+    inicio = time.perf_counter()
+    galeria.construir_centroides()
+    print(f"Centróides construídos em {time.perf_counter() - inicio:.2f}s "
+          f"({galeria.centroides.n_usuarios} usuários, {len(galeria)} linhas)")
+    print(f"{'candidatos':>10} {'paridade':>9} {'decisão':>8} {'perdidos':>8} {'ms exato':>9} "
+          f"{'ms cascata':>10} {'ganho':>6} {'MB galeria':>10} {'MB centr.':>9}")
+    for linha in relatorio_cascata(galeria, consultas, [int(c) for c in args.candidatos.split(",")]):
+        print(f"{linha['n_candidatos']:>10} {linha['paridade_top1']:>9.3f} {linha['concordancia']:>8.3f} "
+              f"{linha['aceites_perdidos']:>8} {linha['ms_exato']:>9.3f} {linha['ms_cascata']:>10.3f} "
+              f"{linha['ganho']:>5.1f}x {linha['mb_galeria']:>10.1f} {linha['mb_centroides']:>9.1f}")
@@ -0,0 +1,216 @@
+import time
+import argparse
+import numpy as np
+
+# ---------- Índice aproximado IVF (inverted file) ----------
+#
+# Um quantizador grosso (k-means esférico) divide a galeria em `n_listas`
+# grupos. Cada consulta só compara com as linhas das `n_sondas` listas cujos
+# centróides estão mais próximos: mais sondas = mais recall e mais latência.
+# Tudo em NumPy puro, roda em qualquer Linux só com CPU.
+
+TAMANHO_BLOCO = 65536  # linhas por bloco ao atribuir listas (limita a memória)
+
+
+class IndiceIVF:
+    """Índice de listas invertidas sobre a matriz normalizada de uma GaleriaFacial."""
+
+    def __init__(self, n_listas=None, n_sondas=8, iteracoes=8, semente=0):
+        self.n_listas = n_listas
+        self.n_sondas = n_sondas
+        self.iteracoes = iteracoes
+        self.semente = semente
+        self.centroides = None
+        self.ordem = None    # linhas da galeria agrupadas por lista
+        self.inicios = None  # lista l ocupa ordem[inicios[l]:inicios[l + 1]]
+
+    def _atribuir(self, matriz, centroides):
+        """Retorna o índice do centróide mais próximo (maior cosseno) de cada linha."""
+        rotulos = np.empty(len(matriz), dtype=np.int32)
+        for inicio in range(0, len(matriz), TAMANHO_BLOCO):
+            bloco = np.asarray(matriz[inicio:inicio + TAMANHO_BLOCO], dtype=np.float32)
+            rotulos[inicio:inicio + len(bloco)] = np.argmax(bloco @ centroides.T, axis=1)
+        return rotulos
+
+    def construir(self, matriz):
+        """Treina os centróides e monta as listas invertidas para a matriz dada."""
+        n = len(matriz)
+        if n == 0:
+            raise ValueError("Não é possível construir o índice com a galeria vazia.")
+        n_listas = self.n_listas or max(1, int(4 * np.sqrt(n)))
+        n_listas = min(n_listas, n)
+        rng = np.random.default_rng(self.semente)
+
+        # Treina em uma amostra (no máximo 32 pontos por lista)
+        amostra = np.sort(rng.choice(n, size=min(n, 32 * n_listas), replace=False))
+        treino = np.asarray(matriz[amostra], dtype=np.float32)
+        centroides = treino[rng.choice(len(treino), size=n_listas, replace=False)].copy()
+        for _ in range(self.iteracoes):
+            rotulos = np.argmax(treino @ centroides.T, axis=1)
+            # Soma por lista: ordena por rótulo e reduz cada faixa contígua
+            ordem = np.argsort(rotulos, kind="stable")
+            presentes, inicios = np.unique(rotulos[ordem], return_index=True)
+            somas = np.zeros_like(centroides)
+            somas[presentes] = np.add.reduceat(treino[ordem], inicios, axis=0)
+            normas = np.linalg.norm(somas, axis=1)
+            vazios = normas == 0
+            # Listas vazias ficam com o centróide anterior
+            somas[vazios] = centroides[vazios]
+            normas[vazios] = 1.0
+            centroides = (somas / normas[:, None]).astype(np.float32)
+
+        rotulos = self._atribuir(matriz, centroides)
+        self.centroides = np.ascontiguousarray(centroides)
+        self.ordem = np.argsort(rotulos, kind="stable").astype(np.int64)
+        self.inicios = np.searchsorted(rotulos[self.ordem], np.arange(n_listas + 1)).astype(np.int64)
+        self.n_listas = n_listas
+        return self
+
+    def linhas_candidatas(self, consulta_normalizada, n_sondas=None):
+        """Linhas da galeria nas `n_sondas` listas mais próximas da consulta."""
+        n_sondas = min(n_sondas or self.n_sondas, self.n_listas)
+        pontuacao = self.centroides @ consulta_normalizada
+        if n_sondas < self.n_listas:
+            listas = np.argpartition(-pontuacao, n_sondas - 1)[:n_sondas]
+        else:
+            listas = np.arange(self.n_listas)
+        return np.concatenate([self.ordem[self.inicios[l]:self.inicios[l + 1]] for l in listas])
+
+
+# ---------- Relatório de recall ----------
+
+def decisao_login(resultado, limiar=7.0, acuracia_minima=70):
+    """Mesma regra do login em main.py: dist < 7 e acurácia >= 70%. Retorna o CPF ou None."""
+    if resultado is None:
+        return None
+    cpf, dist = resultado
+    if dist < limiar and max(0, int((1 - dist / 10) * 100)) >= acuracia_minima:
+        return cpf
+    return None
+
+
+def gerar_embeddings_sinteticos(n_usuarios, por_usuario=8, dim=512, escala=4.0, ruido=0.75,
+                                dim_intrinseca=64, ruido_isotropico=0.2, semente=0):
+    """
+    Gera uma galeria sintética parecida com embeddings ArcFace. Os rostos
+    reais ocupam um subespaço de dimensão bem menor que 512 e variam (pose,
+    luz, expressão) dentro dele. Por isso a direção de cada usuário e a
+    variação de cada amostra são sorteadas em `dim_intrinseca` dimensões e
+    depois levadas para `dim` por uma base ortonormal fixa. Com os valores
+    padrão, duas fotos da mesma pessoa têm cosseno ~0,6 e a regra do login
+    aceita ~85% das consultas genuínas: as listas do IVF cortam usuários
+    ao meio, como na galeria real. Retorna (embeddings, cpfs, direcoes).
+    """
+    rng = np.random.default_rng(semente)
+    base = np.linalg.qr(rng.normal(size=(dim, dim_intrinseca)))[0].T.astype(np.float32)
+    direcoes = rng.normal(size=(n_usuarios, dim_intrinseca)).astype(np.float32)
+    direcoes /= np.linalg.norm(direcoes, axis=1, keepdims=True)
+    variacoes = rng.normal(size=(n_usuarios, por_usuario, dim_intrinseca)).astype(np.float32)
+    amostras = (direcoes[:, None, :] + variacoes * (ruido / np.sqrt(dim_intrinseca))) @ base
+    amostras += rng.normal(size=amostras.shape).astype(np.float32) * (ruido_isotropico / np.sqrt(dim))
+    amostras /= np.linalg.norm(amostras, axis=2, keepdims=True)
+    embeddings = (escala * amostras).reshape(-1, dim)
+    cpfs = np.repeat([f"{i:011d}" for i in range(n_usuarios)], por_usuario)
+    return embeddings, cpfs, direcoes @ base
+
+
+def gerar_consultas(galeria, n_consultas, semente=1):
+    """
+    Consultas de teste para uma galeria (sintética ou a de faces/). A
+    variação vem da própria galeria: cada consulta soma a um ponto de
+    partida o resíduo (linha - centróide do usuário) de uma linha sorteada.
+    Metade das consultas parte do centróide de um usuário (uma nova foto
+    dele, genuína). A outra metade parte da média de dois usuários (alguém
+    parecido com cadastrados, impostor).
+    """
+    rng = np.random.default_rng(semente)
+    matriz = np.asarray(galeria.matriz, dtype=np.float32)
+    _, usuario, contagem = np.unique(galeria.cpfs, return_inverse=True, return_counts=True)
+    centroides = np.zeros((len(contagem), matriz.shape[1]), dtype=np.float32)
+    np.add.at(centroides, usuario, matriz)
+    centroides /= contagem[:, None]
+
+    # Resíduos emprestados, corrigidos pelo encolhimento do centróide (n / (n - 1))
+    linhas = rng.integers(0, len(galeria), n_consultas)
+    correcao = np.sqrt(contagem / np.maximum(contagem - 1, 1)).astype(np.float32)[usuario[linhas]]
+    residuos = (matriz[linhas] - centroides[usuario[linhas]]) * correcao[:, None]
+
+    n_gen = n_consultas // 2
+    partida = centroides[rng.integers(0, len(contagem), n_consultas)]
+    partida[n_gen:] += centroides[rng.integers(0, len(contagem), n_consultas - n_gen)]
+    partida /= np.linalg.norm(partida, axis=1, keepdims=True)
+    consultas = partida + residuos
+    consultas /= np.linalg.norm(consultas, axis=1, keepdims=True)
+    return consultas * float(np.median(galeria.normas))
+
+
+def relatorio_recall(galeria, consultas, lista_n_sondas, metrica="euclidiana"):
+    """
+    Compara a busca aproximada com a busca exata (força bruta) para cada valor
+    de `n_sondas`. Para cada configuração retorna:
+      - recall_top1: entre as consultas aceitas pela busca exata, fração em
+        que a busca aproximada encontra o mesmo CPF;
+      - concordancia: fração em que a decisão do login (dist < 7) é a mesma;
+      - aceites_perdidos: consultas aceitas pela busca exata e rejeitadas/trocadas;
+      - latência média (ms) de cada modo.
+    """
+    indice = galeria.indice
+    galeria.indice = None
+    inicio = time.perf_counter()
+    exatos = [galeria.buscar(q, metrica) for q in consultas]
+    ms_exato = (time.perf_counter() - inicio) * 1000 / max(1, len(consultas))
+    galeria.indice = indice
+    decisoes_exatas = [decisao_login(r) for r in exatos]
+
+    linhas = []
+    for n_sondas in lista_n_sondas:
+        galeria.indice.n_sondas = n_sondas
+        inicio = time.perf_counter()
+        aproximados = [galeria.buscar(q, metrica) for q in consultas]
+        ms_aprox = (time.perf_counter() - inicio) * 1000 / max(1, len(consultas))
+        decisoes = [decisao_login(r) for r in aproximados]
+        aceitos = [(e, a) for e, a in zip(exatos, aproximados) if decisao_login(e) is not None]
+        iguais = sum(1 for e, a in aceitos if a is not None and e[0] == a[0])
+        concordam = sum(1 for e, a in zip(decisoes_exatas, decisoes) if e == a)
+        perdidos = sum(1 for e, a in zip(decisoes_exatas, decisoes) if e is not None and e != a)
+        linhas.append({
+            "n_sondas": n_sondas,
+            "recall_top1": iguais / max(1, len(aceitos)),
+            "concordancia": concordam / max(1, len(consultas)),
+            "aceites_perdidos": perdidos,
+            "ms_exato": ms_exato,
+            "ms_aproximado": ms_aprox,
+        })
+    return linhas
+
+
+if __name__ == "__main__":
+    # Executar a partir de src/:  python -m utils.indice_ivf --sintetico 20000
+    from utils.galeria import GaleriaFacial
+
+    parser = argparse.ArgumentParser(description="Recall do índice IVF contra a busca exata (dist < 7).")
+    parser.add_argument("--pasta", default="faces", help="Pasta do armazém de embeddings")
+    parser.add_argument("--sintetico", type=int, default=0, help="Usa N usuários sintéticos em vez de faces/")
+    parser.add_argument("--consultas", type=int, default=500)
+    parser.add_argument("--listas", type=int, default=None, help="Número de listas (padrão: 4·√linhas)")
+    parser.add_argument("--sondas", default="1,2,4,8,16,32", help="Valores de n_sondas separados por vírgula")
+    args = parser.parse_args()
+
+    if args.sintetico:
+        embeddings, cpfs, _ = gerar_embeddings_sinteticos(args.sintetico)
+        galeria = GaleriaFacial(embeddings, cpfs)
+    else:
+        galeria = GaleriaFacial.carregar_de_pasta(args.pasta)
+    if len(galeria) == 0:
+        raise SystemExit("Galeria vazia.")
+
+    consultas = gerar_consultas(galeria, args.consultas)
+
+    inicio = time.perf_counter()
+    galeria.construir_indice(n_listas=args.listas)
+    print(f"Índice construído em {time.perf_counter() - inicio:.2f}s "
+          f"({galeria.indice.n_listas} listas, {len(galeria)} linhas)")
+    print(f"{'sondas':>6} {'recall@1':>9} {'decisão':>8} {'perdidos':>8} {'ms exato':>9} {'ms IVF':>8}")
+    for linha in relatorio_recall(galeria, consultas, [int(s) for s in args.sondas.split(",")]):
+        print(f"{linha['n_sondas']:>6} {linha['recall_top1']:>9.3f} {linha['concordancia']:>8.3f} "
+              f"{linha['aceites_perdidos']:>8} {linha['ms_exato']:>9.3f} {linha['ms_aproximado']:>8.3f}")
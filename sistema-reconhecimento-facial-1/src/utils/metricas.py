@@ -0,0 +1,225 @@
+import os
+import json
+import time
+import atexit
+import threading
+from collections import deque
+import numpy as np
+
+# ---------- Métricas de latência por etapa ----------
+#
+# Cada etapa do login (captura, detecção, espera, embedding, busca, banco...)
+# registra durações em ms medidas com time.perf_counter (relógio monotônico).
+# Cada etapa guarda as últimas `janela` amostras, e os percentis p50/p95/p99
+# são calculados só quando alguém lê (arquivo, endpoint ou overlay).
+#
+# Desligado por padrão. Nesse caso span() devolve sempre o mesmo objeto
+# vazio e registrar() retorna na primeira linha.
+#
+# Variáveis de ambiente:
+#   RF_METRICAS=1                 liga a coleta (e o overlay na tela de login)
+#   RF_METRICAS_ARQUIVO=m.json    grava o resumo a cada 10 s e ao sair
+#   RF_METRICAS_PORTA=9464        GET /metrics (formato Prometheus) e /metricas.json
+
+ATIVO = os.environ.get("RF_METRICAS", "") not in ("", "0")
+ARQUIVO = os.environ.get("RF_METRICAS_ARQUIVO", "")
+PORTA = int(os.environ.get("RF_METRICAS_PORTA", "0"))
+INTERVALO_GRAVACAO_S = 10.0
+PERCENTIS = (50, 95, 99)
+
+
+class _SpanNulo:
+    """Span usado com as métricas desligadas: não mede nada."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excecao):
+        return False
+
+
+_SPAN_NULO = _SpanNulo()
+
+
+class _Span:
+    __slots__ = ("metricas", "etapa", "inicio")
+
+    def __init__(self, metricas, etapa):
+        self.metricas = metricas
+        self.etapa = etapa
+
+    def __enter__(self):
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *excecao):
+        self.metricas.registrar(self.etapa, (time.perf_counter() - self.inicio) * 1000)
+        return False
+
+
+class Metricas:
+    """Amostras recentes de duração (ms) por etapa, com contagem e soma acumuladas."""
+
+    def __init__(self, ativo=False, janela=4096):
+        self.ativo = ativo
+        self.janela = janela
+        self._amostras = {}
+        self._totais = {}  # etapa -> [contagem, soma_ms]
+        self._lock = threading.Lock()
+        self._inicio = time.time()
+
+    def span(self, etapa):
+        """Context manager que mede o bloco: `with metricas.span("deteccao"): ...`"""
+        if not self.ativo:
+            return _SPAN_NULO
+        return _Span(self, etapa)
+
+    def registrar(self, etapa, milissegundos):
+        """Registra uma duração já medida (ex.: entre threads ou vinda de `tempos`)."""
+        if not self.ativo:
+            return
+        with self._lock:
+            amostras = self._amostras.get(etapa)
+            if amostras is None:
+                amostras = self._amostras[etapa] = deque(maxlen=self.janela)
+                self._totais[etapa] = [0, 0.0]
+            amostras.append(milissegundos)
+            totais = self._totais[etapa]
+            totais[0] += 1
+            totais[1] += milissegundos
+
+    def registrar_tempos(self, prefixo, tempos):
+        """Registra um dicionário {etapa: ms}, como ResultadoReconhecimento.tempos."""
+        if not self.ativo:
+            return
+        for etapa, milissegundos in tempos.items():
+            self.registrar(f"{prefixo}.{etapa}", milissegundos)
+
+    def limpar(self):
+        with self._lock:
+            self._amostras.clear()
+            self._totais.clear()
+            self._inicio = time.time()
+
+    # ---------- Leitura ----------
+
+    def resumo(self):
+        """{etapa: {n, soma_ms, media_ms, p50_ms, p95_ms, p99_ms, max_ms}} (janela recente)."""
+        with self._lock:
+            etapas = {etapa: (np.array(amostras, dtype=np.float64), tuple(self._totais[etapa]))
+                      for etapa, amostras in self._amostras.items()}
+        saida = {}
+        for etapa, (amostras, (contagem, soma)) in sorted(etapas.items()):
+            if amostras.size == 0:
+                continue
+            p50, p95, p99 = np.percentile(amostras, PERCENTIS)
+            saida[etapa] = {
+                "n": contagem,
+                "soma_ms": soma,
+                "media_ms": float(amostras.mean()),
+                "p50_ms": float(p50),
+                "p95_ms": float(p95),
+                "p99_ms": float(p99),
+                "max_ms": float(amostras.max()),
+            }
+        return saida
+
+    def texto_prometheus(self):
+        """Resumo no formato texto do Prometheus (um summary por etapa)."""
+        linhas = ["# TYPE rf_etapa_ms summary"]
+        for etapa, valores in self.resumo().items():
+            for percentil in PERCENTIS:
+                linhas.append(f'rf_etapa_ms{{etapa="{etapa}",quantile="{percentil / 100}"}} {valores[f"p{percentil}_ms"]:.4f}')
+            linhas.append(f'rf_etapa_ms_sum{{etapa="{etapa}"}} {valores["soma_ms"]:.4f}')
+            linhas.append(f'rf_etapa_ms_count{{etapa="{etapa}"}} {valores["n"]}')
+        return "\n".join(linhas) + "\n"
+
+    def gravar(self, caminho):
+        """Grava o resumo em JSON (troca atômica do arquivo)."""
+        documento = {"inicio": self._inicio, "gerado_em": time.time(), "etapas": self.resumo()}
+        temporario = caminho + ".tmp"
+        with open(temporario, "w", encoding="utf-8") as f:
+            json.dump(documento, f, indent=2, ensure_ascii=False)
+        os.replace(temporario, caminho)
+
+    def linhas_overlay(self, etapas=None):
+        """Linhas curtas "etapa p50/p95/p99" para desenhar sobre o vídeo."""
+        resumo = self.resumo()
+        linhas = []
+        for etapa in etapas or resumo.keys():
+            valores = resumo.get(etapa)
+            if valores is not None:
+                linhas.append(f"{etapa:<22} {valores['p50_ms']:7.1f} {valores['p95_ms']:7.1f} {valores['p99_ms']:7.1f}")
+        return linhas
+
+
+# ---------- Exportação ----------
+
+def _servir(metricas, porta):
+    from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+    class Manipulador(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == "/metrics":
+                corpo, tipo = metricas.texto_prometheus().encode("utf-8"), "text/plain; version=0.0.4"
+            elif self.path == "/metricas.json":
+                corpo, tipo = json.dumps(metricas.resumo()).encode("utf-8"), "application/json"
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", tipo)
+            self.send_header("Content-Length", str(len(corpo)))
+            self.end_headers()
+            self.wfile.write(corpo)
+
+        def log_message(self, *args):
+            pass  # sem uma linha no terminal a cada coleta
+
+    servidor = ThreadingHTTPServer(("127.0.0.1", porta), Manipulador)
+    threading.Thread(target=servidor.serve_forever, name="metricas-http", daemon=True).start()
+    print(f"[métricas] endpoint em http://127.0.0.1:{porta}/metrics")
+    return servidor
+
+
+def _gravar_periodicamente(metricas, caminho):
+    while True:
+        time.sleep(INTERVALO_GRAVACAO_S)
+        try:
+            metricas.gravar(caminho)
+        except OSError as e:
+            print("Erro ao gravar as métricas:", e)
+
+
+def iniciar_exportacao(arquivo=ARQUIVO, porta=PORTA):
+    """
+    Começa a exportar as métricas do processo (arquivo periódico e/ou
+    endpoint HTTP), se elas estiverem ligadas. Chamadas repetidas não fazem nada.
+    """
+    global _exportando
+    metricas = obter_metricas()
+    with _lock_metricas:
+        if not metricas.ativo or _exportando:
+            return
+        _exportando = True
+    if arquivo:
+        threading.Thread(target=_gravar_periodicamente, args=(metricas, arquivo),
+                         name="metricas-arquivo", daemon=True).start()
+        atexit.register(metricas.gravar, arquivo)
+    if porta:
+        _servir(metricas, porta)
+
+
+_metricas = None
+_exportando = False
+_lock_metricas = threading.Lock()
+
+
+def obter_metricas():
+    """Retorna as métricas do processo (ligadas ou não conforme RF_METRICAS)."""
+    global _metricas
+    if _metricas is None:
+        with _lock_metricas:
+            if _metricas is None:
+                _metricas = Metricas(ativo=ATIVO)
+    return _metricas
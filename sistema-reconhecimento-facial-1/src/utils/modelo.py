@@ -0,0 +1,198 @@
+import threading
+import time
+import numpy as np
+import cv2
+from utils.cache_embeddings import obter_cache_embeddings
+
+# ---------- Carga preguiçosa do DeepFace / ArcFace ----------
+#
+# Importar o DeepFace puxa o TensorFlow inteiro (vários segundos). Em vez de
+# importar no topo de cada módulo, todos pedem o módulo por obter_deepface():
+# a janela Tk aparece na hora e o modelo é carregado e aquecido em uma thread.
+
+NOME_MODELO = "ArcFace"
+TAMANHO_ENTRADA = (112, 112)  # entrada do ArcFace (altura, largura)
+TAMANHO_RECORTE = (224, 224)  # rosto recortado, como fica salvo em faces/<cpf>/
+
+_deepface = None
+_lock_import = threading.Lock()
+_pronto = threading.Event()
+_thread_aquecimento = None
+_erro_aquecimento = None
+_tempo_pronto = None
+_rede = None
+_lock_inferencia = threading.Lock()
+_estatisticas_lote = {}
+
+
+def obter_deepface():
+    """Retorna a classe DeepFace, importando o pacote na primeira chamada."""
+    global _deepface
+    if _deepface is None:
+        with _lock_import:
+            if _deepface is None:
+                from deepface import DeepFace
+                _deepface = DeepFace
+    return _deepface
+
+
+def _aquecer(inicio_processo):
+    global _erro_aquecimento, _tempo_pronto
+    try:
+        deepface = obter_deepface()
+        deepface.build_model(NOME_MODELO)
+        # Inferência de mentira: força a criação do grafo e a alocação dos tensores
+        imagem = np.zeros(TAMANHO_RECORTE + (3,), dtype=np.uint8)
+        gerar_embeddings_lote([imagem], usar_cache=False)
+        _tempo_pronto = time.perf_counter()
+        print(f"[inicialização] modelo {NOME_MODELO} pronto em {_tempo_pronto - inicio_processo:.2f}s")
+    except Exception as e:
+        _erro_aquecimento = e
+        print("Erro ao carregar o modelo:", e)
+    finally:
+        _pronto.set()
+
+
+def iniciar_aquecimento(inicio_processo=None):
+    """
+    Importa o DeepFace, constrói o ArcFace e roda uma inferência de
+    aquecimento em segundo plano. Chamadas repetidas não fazem nada.
+    `inicio_processo` (time.perf_counter) é usado só para o log de tempo.
+    """
+    global _thread_aquecimento
+    with _lock_import:
+        if _thread_aquecimento is None:
+            _thread_aquecimento = threading.Thread(
+                target=_aquecer, args=(inicio_processo or time.perf_counter(),), daemon=True)
+            _thread_aquecimento.start()
+
+
+def modelo_pronto():
+    """True quando o aquecimento terminou (com ou sem erro)."""
+    return _pronto.is_set()
+
+
+def aguardar_modelo(timeout=None):
+    """Bloqueia até o aquecimento terminar. Retorna False se estourar o timeout."""
+    return _pronto.wait(timeout)
+
+
+def erro_modelo():
+    """Exceção ocorrida no aquecimento, ou None."""
+    return _erro_aquecimento
+
+
+# ---------- Embeddings em lote ----------
+#
+# Cadastro e login usam o mesmo caminho: o detector compartilhado
+# (utils/detector.py) acha a caixa, recortar_rosto corta e redimensiona para
+# 224x224 e o pré-processamento é feito aqui (o mesmo do DeepFace com
+# detector "skip"), com todas as imagens em um único forward do ArcFace.
+# Embeddings de caminhos diferentes (ex.: DeepFace.represent, que alinha o
+# rosto com outro detector) não são comparáveis com os da galeria.
+
+def obter_rede():
+    """Retorna a rede Keras do ArcFace (construída uma vez pelo DeepFace)."""
+    global _rede
+    if _rede is None:
+        deepface = obter_deepface()
+        with _lock_import:
+            if _rede is None:
+                cliente = deepface.build_model(NOME_MODELO)
+                # Versões novas do DeepFace devolvem um cliente com a rede em .model
+                _rede = getattr(cliente, "model", cliente)
+    return _rede
+
+
+def recortar_rosto(frame, caixa):
+    """Recorte da caixa (x, y, w, h) do detector no tamanho do cadastro (224x224)."""
+    x, y, w, h = caixa
+    return cv2.resize(frame[y:y + h, x:x + w], TAMANHO_RECORTE[::-1])
+
+
+def preprocessar_rosto(imagem):
+    """
+    Rosto recortado (BGR ou cinza, uint8) -> entrada do ArcFace: reduz
+    mantendo a proporção, completa com preto até 112x112 e escala para [0, 1].
+    """
+    if imagem.ndim == 2:
+        imagem = cv2.cvtColor(imagem, cv2.COLOR_GRAY2BGR)
+    altura, largura = TAMANHO_ENTRADA
+    h, w = imagem.shape[:2]
+    fator = min(altura / h, largura / w)
+    novo_h, novo_w = max(1, int(h * fator)), max(1, int(w * fator))
+    reduzida = cv2.resize(imagem, (novo_w, novo_h))
+    entrada = np.zeros((altura, largura, 3), dtype=np.float32)
+    y0, x0 = (altura - novo_h) // 2, (largura - novo_w) // 2
+    entrada[y0:y0 + novo_h, x0:x0 + novo_w] = reduzida
+    if entrada.max() > 1:
+        entrada /= 255.0
+    return entrada
+
+
+def _calcular_embeddings(imagens, tamanho_lote, recortadas):
+    """Passa as imagens pelo modelo. Retorna (embeddings, segundos de pré-processamento, lotes)."""
+    if not recortadas:
+        deepface = obter_deepface()
+        embeddings = [deepface.represent(imagem, model_name=NOME_MODELO)[0]["embedding"] for imagem in imagens]
+        return np.asarray(embeddings, dtype=np.float32).reshape(len(imagens), -1), 0.0, len(imagens)
+    rede = obter_rede()
+    inicio = time.perf_counter()
+    entradas = np.stack([preprocessar_rosto(imagem) for imagem in imagens])
+    preprocessamento = time.perf_counter() - inicio
+    partes = []
+    for i in range(0, len(entradas), tamanho_lote):
+        with _lock_inferencia:
+            partes.append(np.asarray(rede.predict_on_batch(entradas[i:i + tamanho_lote]), dtype=np.float32))
+    return np.concatenate(partes), preprocessamento, len(partes)
+
+
+def gerar_embeddings_lote(imagens, tamanho_lote=32, recortadas=True, usar_cache=True):
+    """
+    Gera os embeddings ArcFace de uma lista de imagens. Retorna um array
+    float32 (n, 512) na mesma ordem das imagens.
+    recortadas=True: as imagens já são só o rosto (recortar_rosto), sem nova
+    detecção, um forward por lote de até `tamanho_lote` imagens. Com False,
+    cada imagem passa pelo DeepFace.represent, que detecta e alinha o rosto
+    por conta própria (não comparável com a galeria; só para diagnóstico).
+    usar_cache=True: imagens já vistas (mesmos pixels) saem do cache de
+    embeddings (utils/cache_embeddings.py) sem passar pelo modelo. Frames
+    ao vivo, que nunca se repetem, devem passar False.
+    Os tempos do último lote ficam em estatisticas_lote().
+    """
+    global _estatisticas_lote
+    inicio = time.perf_counter()
+    cache = obter_cache_embeddings() if usar_cache and len(imagens) else None
+    faltando = list(range(len(imagens)))
+    guardados = None
+    if cache is not None:
+        chaves = [cache.chave(imagem, NOME_MODELO, "recorte" if recortadas else "represent") for imagem in imagens]
+        guardados = cache.obter_muitos(chaves)
+        faltando = [i for i, embedding in enumerate(guardados) if embedding is None]
+    preprocessamento, lotes = 0.0, 0
+    if faltando:
+        calculados, preprocessamento, lotes = _calcular_embeddings(
+            [imagens[i] for i in faltando], tamanho_lote, recortadas)
+    if guardados is None:
+        resultado = calculados if faltando else np.empty((0, 512), dtype=np.float32)
+    else:
+        if faltando:
+            cache.guardar_muitos([chaves[i] for i in faltando], calculados)
+            for i, embedding in zip(faltando, calculados):
+                guardados[i] = embedding
+        resultado = np.stack(guardados).astype(np.float32, copy=False)
+    segundos = time.perf_counter() - inicio
+    _estatisticas_lote = {
+        "imagens": len(imagens),
+        "do_cache": len(imagens) - len(faltando),
+        "lotes": lotes,
+        "segundos": segundos,
+        "preprocessamento_s": preprocessamento,
+        "imagens_por_segundo": len(imagens) / segundos if segundos > 0 else 0.0,
+    }
+    return resultado
+
+
+def estatisticas_lote():
+    """Tempos e vazão (imagens/s) da última chamada de gerar_embeddings_lote."""
+    return dict(_estatisticas_lote)
@@ -0,0 +1,201 @@
+import time
+import threading
+from collections import Counter
+from dataclasses import dataclass
+import numpy as np
+import cv2
+
+# ---------- Filtro de qualidade do rosto ----------
+#
+# Uma inferência do ArcFace custa dezenas/centenas de ms; avaliar o recorte
+# do rosto custa bem menos de 1 ms. Antes de gastar uma inferência, o rosto
+# precisa estar nítido (variância do Laplaciano), bem exposto, grande o
+# bastante no frame, inteiro dentro dele e de frente (simetria esquerda/direita).
+
+LADO_AVALIACAO = 96  # o recorte é reduzido para um tamanho fixo: as medidas ficam comparáveis
+
+MENSAGENS = {
+    "nitidez": "Fique parado",
+    "exposicao": "Melhore a iluminação",
+    "tamanho": "Aproxime o rosto",
+    "cortado": "Centralize o rosto",
+    "frontalidade": "Olhe para a câmera",
+}
+
+
+@dataclass
+class AvaliacaoQualidade:
+    """Medidas de qualidade de um rosto e a decisão do filtro."""
+    nitidez: float = 0.0          # variância do Laplaciano no recorte reduzido
+    brilho: float = 0.0           # média de cinza do rosto (0-255)
+    tamanho: float = 0.0          # largura do rosto / largura do frame
+    frontalidade: float = 0.0     # 1.0 = rosto simétrico (de frente)
+    nota: float = 0.0             # 0-1, usada para escolher o melhor frame
+    aprovado: bool = False
+    motivo: str = ""              # primeiro critério reprovado ("" se aprovado)
+
+    @property
+    def mensagem(self):
+        """Orientação curta para o usuário (vazia se aprovado)."""
+        return MENSAGENS.get(self.motivo, "")
+
+
+class AvaliadorQualidade:
+    """Calcula a AvaliacaoQualidade de um rosto e conta as reprovações por motivo."""
+
+    def __init__(self, nitidez_minima=40.0, brilho_minimo=60.0, brilho_maximo=200.0,
+                 tamanho_minimo=0.12, frontalidade_minima=0.5):
+        self.nitidez_minima = nitidez_minima
+        self.brilho_minimo = brilho_minimo
+        self.brilho_maximo = brilho_maximo
+        self.tamanho_minimo = tamanho_minimo
+        self.frontalidade_minima = frontalidade_minima
+        self.avaliados = 0
+        self.reprovados = Counter()
+
+    def avaliar(self, frame, caixa):
+        """Avalia o rosto `caixa` (x, y, w, h) do frame BGR ou cinza."""
+        altura, largura = frame.shape[:2]
+        x, y, w, h = (int(v) for v in caixa)
+        x0, y0, x1, y1 = max(0, x), max(0, y), min(largura, x + w), min(altura, y + h)
+        avaliacao = AvaliacaoQualidade()
+        if x1 - x0 < 8 or y1 - y0 < 8:
+            avaliacao.motivo = "tamanho"
+            return self._contar(avaliacao)
+
+        recorte = frame[y0:y1, x0:x1]
+        if recorte.ndim == 3:
+            recorte = cv2.cvtColor(recorte, cv2.COLOR_BGR2GRAY)
+        recorte = cv2.resize(recorte, (LADO_AVALIACAO, LADO_AVALIACAO), interpolation=cv2.INTER_AREA)
+
+        avaliacao.nitidez = float(cv2.Laplacian(recorte, cv2.CV_64F).var())
+        avaliacao.brilho = float(recorte.mean())
+        avaliacao.tamanho = w / largura
+        # Rosto de frente é quase simétrico: compara a metade esquerda com a direita espelhada
+        metade = LADO_AVALIACAO // 2
+        diferenca = np.abs(recorte[:, :metade].astype(np.int16) - np.fliplr(recorte)[:, :metade].astype(np.int16))
+        avaliacao.frontalidade = float(max(0.0, 1.0 - diferenca.mean() / 64.0))
+
+        cortado = x <= 1 or y <= 1 or x + w >= largura - 1 or y + h >= altura - 1
+        centro_brilho = (self.brilho_minimo + self.brilho_maximo) / 2
+        componentes = (
+            min(1.0, avaliacao.nitidez / (2 * self.nitidez_minima)),
+            max(0.0, 1.0 - abs(avaliacao.brilho - centro_brilho) / (centro_brilho - self.brilho_minimo + 1e-6) / 2),
+            min(1.0, avaliacao.tamanho / (2 * self.tamanho_minimo)),
+            avaliacao.frontalidade,
+        )
+        avaliacao.nota = float(np.mean(componentes))
+
+        if avaliacao.tamanho < self.tamanho_minimo:
+            avaliacao.motivo = "tamanho"
+        elif cortado:
+            avaliacao.motivo = "cortado"
+        elif not self.brilho_minimo <= avaliacao.brilho <= self.brilho_maximo:
+            avaliacao.motivo = "exposicao"
+        elif avaliacao.nitidez < self.nitidez_minima:
+            avaliacao.motivo = "nitidez"
+        elif avaliacao.frontalidade < self.frontalidade_minima:
+            avaliacao.motivo = "frontalidade"
+        else:
+            avaliacao.aprovado = True
+        return self._contar(avaliacao)
+
+    def _contar(self, avaliacao):
+        self.avaliados += 1
+        if not avaliacao.aprovado:
+            self.reprovados[avaliacao.motivo] += 1
+        return avaliacao
+
+
+class JanelaMelhorFrame:
+    """
+    Guarda o melhor frame aprovado dos últimos `validade_s` segundos. A cópia
+    do frame só é feita quando ele supera o atual (ou o atual expirou).
+    Os instantes são de time.time(), a menos que oferecer e retirar recebam
+    os de outro relógio (ex.: o tempo de um vídeo reproduzido sem ritmo).
+    """
+
+    def __init__(self, validade_s=1.5):
+        self.validade_s = validade_s
+        self._lock = threading.Lock()
+        self._melhor = None  # (nota, instante, frame, caixa, avaliacao)
+
+    def oferecer(self, frame, caixa, avaliacao, instante=None):
+        """Considera um frame; retorna True se ele virou o melhor da janela."""
+        if not avaliacao.aprovado:
+            return False
+        instante = time.time() if instante is None else instante
+        with self._lock:
+            atual = self._melhor
+            if atual is None or instante - atual[1] > self.validade_s or avaliacao.nota >= atual[0]:
+                self._melhor = (avaliacao.nota, instante, frame.copy(), tuple(caixa), avaliacao)
+                return True
+        return False
+
+    def retirar(self, instante=None):
+        """Devolve (frame, caixa, avaliacao) do melhor frame ainda válido e esvazia a janela."""
+        instante = time.time() if instante is None else instante
+        with self._lock:
+            atual, self._melhor = self._melhor, None
+        if atual is None or instante - atual[1] > self.validade_s:
+            return None
+        return atual[2], atual[3], atual[4]
+
+    def limpar(self):
+        with self._lock:
+            self._melhor = None
+
+
+class ContadoresLogin:
+    """Inferências feitas/evitadas pelo filtro e tempo até liberar o acesso."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.inferencias = 0
+        self.evitadas = 0
+        self.tempos_ms_inferencia = []
+        self.tempos_ate_liberar = []
+
+    def registrar_inferencia(self, milissegundos):
+        with self._lock:
+            self.inferencias += 1
+            self.tempos_ms_inferencia.append(milissegundos)
+
+    def registrar_evitada(self):
+        with self._lock:
+            self.evitadas += 1
+
+    def registrar_liberacao(self, segundos):
+        """Tempo entre o rosto aparecer na tela e o acesso ser liberado."""
+        with self._lock:
+            self.tempos_ate_liberar.append(segundos)
+
+    def resumo(self):
+        with self._lock:
+            media_inferencia = float(np.mean(self.tempos_ms_inferencia)) if self.tempos_ms_inferencia else 0.0
+            return {
+                "inferencias": self.inferencias,
+                "inferencias_evitadas": self.evitadas,
+                "tempo_inferencia_economizado_s": self.evitadas * media_inferencia / 1000,
+                "logins": len(self.tempos_ate_liberar),
+                "tempo_ate_liberar_medio_s": float(np.mean(self.tempos_ate_liberar)) if self.tempos_ate_liberar else None,
+            }
+
+
+_avaliador = None
+_contadores = ContadoresLogin()
+_lock_avaliador = threading.Lock()
+
+
+def obter_avaliador():
+    """Retorna o avaliador de qualidade do processo."""
+    global _avaliador
+    with _lock_avaliador:
+        if _avaliador is None:
+            _avaliador = AvaliadorQualidade()
+        return _avaliador
+
+
+def obter_contadores():
+    """Contadores de login do processo (inferências evitadas, tempo até liberar)."""
+    return _contadores
@@ -0,0 +1,170 @@
+import time
+import argparse
+import numpy as np
+import cv2
+
+# ---------- Galeria quantizada (float16 / int8) ----------
+#
+# A matriz da galeria ocupa 512 x 4 bytes por linha em float32. Uma cópia em
+# float16 ocupa metade disso e uma em int8 um quarto. No int8, cada dimensão
+# tem a própria escala (máximo absoluto da coluna / 127). A busca pré-seleciona
+# as `n_reordenar` linhas mais próximas pela cópia quantizada. A distância
+# final (a do limiar `dist < 7`) é recalculada só nessas linhas, em float32.
+
+TIPOS = ("float16", "int8")
+TAMANHO_BLOCO = 65536  # linhas por bloco ao quantizar (limita a memória)
+BLOCO_BUSCA = 512      # linhas convertidas para float32 por vez na busca (1 MB: cabe no cache)
+
+# Não há GEMM rápido em float16 na CPU, e o astype do numpy de float16 para
+# float32 é escalar (mais lento que a própria busca em float32). O
+# convertFp16 do OpenCV usa as instruções F16C; sem ele, fica o numpy.
+_converter_fp16 = getattr(cv2, "convertFp16", None)
+
+
+def calcular_escalas(matriz):
+    """Escala int8 de cada dimensão: maior valor absoluto da coluna / 127."""
+    maximos = np.zeros(matriz.shape[1], dtype=np.float32)
+    for inicio in range(0, len(matriz), TAMANHO_BLOCO):
+        bloco = np.asarray(matriz[inicio:inicio + TAMANHO_BLOCO], dtype=np.float32)
+        np.maximum(maximos, np.abs(bloco).max(axis=0), out=maximos)
+    maximos[maximos == 0] = 1.0
+    return maximos / 127.0
+
+
+def quantizar_linhas(linhas, tipo, escalas=None):
+    """Converte linhas float32 para o tipo quantizado (int8 exige as escalas)."""
+    linhas = np.asarray(linhas, dtype=np.float32)
+    if tipo == "float16":
+        return linhas.astype(np.float16)
+    if tipo == "int8":
+        return np.clip(np.rint(linhas / escalas), -127, 127).astype(np.int8)
+    raise ValueError(f"Tipo de quantização desconhecido: {tipo}")
+
+
+def _para_float32(codigos, saida):
+    """Converte um bloco de códigos para float32 em `saida` (mesma forma) e devolve `saida`."""
+    if codigos.dtype == np.float16 and _converter_fp16 is not None:
+        return _converter_fp16(np.asarray(codigos).view(np.int16), saida)
+    saida[...] = codigos
+    return saida
+
+
+class MatrizQuantizada:
+    """Cópia quantizada (em memória ou memmap) da matriz normalizada de uma GaleriaFacial."""
+
+    def __init__(self, codigos, escalas=None, n_reordenar=64):
+        self.codigos = codigos
+        self.escalas = None if escalas is None else np.asarray(escalas, dtype=np.float32)
+        self.n_reordenar = n_reordenar
+        self.tipo = np.dtype(codigos.dtype).name
+
+    @classmethod
+    def de_matriz(cls, matriz, tipo, n_reordenar=64):
+        """Quantiza em memória uma matriz float32 já normalizada."""
+        escalas = calcular_escalas(matriz) if tipo == "int8" else None
+        codigos = np.empty(matriz.shape, dtype=np.dtype(tipo))
+        for inicio in range(0, len(matriz), TAMANHO_BLOCO):
+            codigos[inicio:inicio + TAMANHO_BLOCO] = quantizar_linhas(
+                matriz[inicio:inicio + TAMANHO_BLOCO], tipo, escalas)
+        return cls(codigos, escalas, n_reordenar)
+
+    def __len__(self):
+        return len(self.codigos)
+
+    @property
+    def nbytes(self):
+        return self.codigos.nbytes + (0 if self.escalas is None else self.escalas.nbytes)
+
+    def cossenos(self, consulta_normalizada, linhas=None):
+        """Cossenos aproximados da consulta com todas as linhas (ou só com `linhas`)."""
+        # No int8 a escala entra na consulta: cos ≈ codigos @ (escalas · q)
+        consulta = consulta_normalizada if self.escalas is None else consulta_normalizada * self.escalas
+        consulta = consulta.astype(np.float32)
+        if linhas is not None:
+            return np.asarray(self.codigos[linhas], dtype=np.float32) @ consulta
+        resultado = np.empty(len(self.codigos), dtype=np.float32)
+        buffer = np.empty((min(BLOCO_BUSCA, len(self.codigos)), self.codigos.shape[1]), dtype=np.float32)
+        for inicio in range(0, len(self.codigos), BLOCO_BUSCA):
+            codigos = self.codigos[inicio:inicio + BLOCO_BUSCA]
+            bloco = _para_float32(codigos, buffer[:len(codigos)])
+            resultado[inicio:inicio + len(bloco)] = bloco @ consulta
+        return resultado
+
+
+# ---------- Relatório de memória / latência / precisão ----------
+
+def relatorio_quantizacao(galeria, consultas, tipos, n_reordenar=64, metrica="euclidiana"):
+    """
+    Compara a busca com a matriz quantizada (mais a reordenação em float32)
+    com a busca exata em float32. Para cada tipo retorna:
+      - paridade_top1: fração das consultas com o mesmo CPF mais próximo;
+      - concordancia: fração em que a decisão do login (dist < 7) é a mesma;
+      - aceites_perdidos: consultas aceitas pela busca exata e rejeitadas/trocadas;
+      - erro_cosseno: maior erro absoluto do cosseno quantizado (antes da reordenação);
+      - latência média (ms) de cada modo e a memória (MB) de cada matriz.
+    """
+    from utils.indice_ivf import decisao_login
+
+    quantizada = galeria.quantizada
+    galeria.quantizada = None
+    inicio = time.perf_counter()
+    exatos = [galeria.buscar(q, metrica) for q in consultas]
+    ms_float32 = (time.perf_counter() - inicio) * 1000 / max(1, len(consultas))
+    decisoes_exatas = [decisao_login(r) for r in exatos]
+    amostra = consultas[:32] / np.linalg.norm(consultas[:32], axis=1, keepdims=True)
+    cossenos_exatos = [galeria.matriz @ q for q in amostra]
+
+    linhas = []
+    for tipo in tipos:
+        galeria.quantizada = MatrizQuantizada.de_matriz(galeria.matriz, tipo, n_reordenar)
+        erro = max(float(np.abs(galeria.quantizada.cossenos(q) - c).max()) for q, c in zip(amostra, cossenos_exatos))
+        inicio = time.perf_counter()
+        quantizados = [galeria.buscar(q, metrica) for q in consultas]
+        ms_tipo = (time.perf_counter() - inicio) * 1000 / max(1, len(consultas))
+        decisoes = [decisao_login(r) for r in quantizados]
+        iguais = sum(1 for e, c in zip(exatos, quantizados) if e is not None and c is not None and e[0] == c[0])
+        concordam = sum(1 for e, c in zip(decisoes_exatas, decisoes) if e == c)
+        perdidos = sum(1 for e, c in zip(decisoes_exatas, decisoes) if e is not None and e != c)
+        linhas.append({
+            "tipo": tipo,
+            "paridade_top1": iguais / max(1, len(consultas)),
+            "concordancia": concordam / max(1, len(consultas)),
+            "aceites_perdidos": perdidos,
+            "erro_cosseno": erro,
+            "ms_float32": ms_float32,
+            "ms_quantizado": ms_tipo,
+            "mb_float32": galeria.matriz.nbytes / 2**20,
+            "mb_quantizado": galeria.quantizada.nbytes / 2**20,
+        })
+    galeria.quantizada = quantizada
+    return linhas
+
+
+if __name__ == "__main__":
+    # Executar a partir de src/:  python -m utils.quantizacao --sintetico 20000
+    from utils.galeria import GaleriaFacial
+    from utils.indice_ivf import gerar_embeddings_sinteticos, gerar_consultas
+
+    parser = argparse.ArgumentParser(description="Galeria float16/int8 + reordenação contra a busca float32 (dist < 7).")
+    parser.add_argument("--pasta", default="faces", help="Pasta do armazém de embeddings")
+    parser.add_argument("--sintetico", type=int, default=0, help="Usa N usuários sintéticos em vez de faces/")
+    parser.add_argument("--consultas", type=int, default=500)
+    parser.add_argument("--reordenar", type=int, default=64, help="Linhas reordenadas em float32 por consulta")
+    args = parser.parse_args()
+
+    if args.sintetico:
+        embeddings, cpfs, _ = gerar_embeddings_sinteticos(args.sintetico)
+        galeria = GaleriaFacial(embeddings, cpfs)
+    else:
+        galeria = GaleriaFacial.carregar_de_pasta(args.pasta)
+    if len(galeria) == 0:
+        raise SystemExit("Galeria vazia.")
+    consultas = gerar_consultas(galeria, args.consultas)
+
+    print(f"{len(galeria)} linhas, reordenando {args.reordenar} por consulta")
+    print(f"{'tipo':>8} {'paridade':>9} {'decisão':>8} {'perdidos':>8} {'erro cos':>9} "
+          f"{'ms f32':>7} {'ms quant.':>9} {'MB f32':>8} {'MB quant.':>9}")
+    for linha in relatorio_quantizacao(galeria, consultas, TIPOS, args.reordenar):
+        print(f"{linha['tipo']:>8} {linha['paridade_top1']:>9.3f} {linha['concordancia']:>8.3f} "
+              f"{linha['aceites_perdidos']:>8} {linha['erro_cosseno']:>9.4f} {linha['ms_float32']:>7.3f} "
+              f"{linha['ms_quantizado']:>9.3f} {linha['mb_float32']:>8.1f} {linha['mb_quantizado']:>9.1f}")
@@ -0,0 +1,172 @@
+import time
+import itertools
+import threading
+from dataclasses import dataclass, field
+from typing import Optional
+import cv2
+from utils.detector import obter_detector
+
+# ---------- Rastreamento de rosto entre frames ----------
+#
+# A detecção completa (Haar Cascade) só roda a cada `intervalo_deteccao`
+# frames ou quando o rosto é perdido. Nos frames intermediários o rosto é
+# seguido por template matching numa janela pequena em volta da última
+# posição, o que custa uma fração da detecção. Cada rosto seguido recebe um
+# id estável, e o resultado do reconhecimento fica guardado na trilha para
+# não identificar a mesma pessoa de novo a cada frame.
+
+_proximo_id = itertools.count(1)
+
+
+@dataclass
+class Trilha:
+    """Um rosto seguido entre frames."""
+    id: int
+    caixa: tuple                      # (x, y, w, h) na resolução do frame
+    inicio: float                     # time.time() em que o rosto apareceu
+    quadros: int = 0                  # frames seguidos desde o início
+    confianca: float = 1.0            # correlação do último template matching (1.0 = detecção)
+    resultado: Optional[object] = None  # ResultadoReconhecimento da última identificação
+    ultima_identificacao: float = 0.0
+    tentativas: int = 0
+    _em_andamento: bool = field(default=False, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    @property
+    def identificada(self):
+        return self.resultado is not None and self.resultado.reconhecido
+
+    def reservar_identificacao(self, intervalo_nova_tentativa, agora=None):
+        """
+        Reserva a próxima identificação da trilha para quem chamou. Retorna
+        False se ela já foi reconhecida, se outra identificação está em
+        andamento ou se a última tentativa foi há menos de
+        `intervalo_nova_tentativa` segundos. Quem reserva termina com
+        concluir_identificacao, mesmo em caso de erro.
+        """
+        agora = time.time() if agora is None else agora
+        with self._lock:
+            if self.identificada or self._em_andamento:
+                return False
+            if self.tentativas and agora - self.ultima_identificacao < intervalo_nova_tentativa:
+                return False
+            self._em_andamento = True
+            return True
+
+    def concluir_identificacao(self, resultado, agora=None):
+        """
+        Guarda o resultado da identificação reservada e conta a tentativa.
+        resultado None (descarte ou erro) só libera a reserva.
+        """
+        with self._lock:
+            self._em_andamento = False
+            if resultado is not None:
+                self.tentativas += 1
+                self.ultima_identificacao = time.time() if agora is None else agora
+                self.resultado = resultado
+
+
+def _iou(a, b):
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    largura = max(0, min(ax + aw, bx + bw) - max(ax, bx))
+    altura = max(0, min(ay + ah, by + bh) - max(ay, by))
+    intersecao = largura * altura
+    uniao = aw * ah + bw * bh - intersecao
+    return intersecao / uniao if uniao > 0 else 0.0
+
+
+def _cinza(imagem):
+    return imagem if imagem.ndim == 2 else cv2.cvtColor(imagem, cv2.COLOR_BGR2GRAY)
+
+
+class RastreadorRosto:
+    """
+    Segue o rosto principal de uma fonte de vídeo. `atualizar(frame)` deve
+    ser chamado a cada frame novo e devolve a Trilha atual (ou None).
+    """
+
+    def __init__(self, detector=None, intervalo_deteccao=10, limiar_correlacao=0.6,
+                 margem_busca=0.5, iou_mesma_trilha=0.3):
+        self.detector = detector or obter_detector()
+        self.intervalo_deteccao = max(1, intervalo_deteccao)
+        self.limiar_correlacao = limiar_correlacao
+        self.margem_busca = margem_busca
+        self.iou_mesma_trilha = iou_mesma_trilha
+        self.trilha = None
+        self._template = None
+        self._desde_deteccao = 0
+        self.deteccoes = 0
+        self.rastreamentos = 0
+        self.perdas = 0
+
+    def _iniciar_ou_manter(self, caixa, gray):
+        x, y, w, h = caixa
+        anterior = self.trilha
+        if anterior is not None and _iou(anterior.caixa, caixa) >= self.iou_mesma_trilha:
+            anterior.caixa = caixa
+            anterior.confianca = 1.0
+        else:
+            self.trilha = Trilha(id=next(_proximo_id), caixa=caixa, inicio=time.time())
+        self._template = gray[y:y + h, x:x + w].copy()
+        self._desde_deteccao = 0
+
+    def _detectar(self, gray):
+        self.deteccoes += 1
+        anterior = self.trilha.caixa if self.trilha is not None else None
+        caixa = self.detector.primeiro_rosto(gray, anterior=anterior)
+        if caixa is None:
+            if self.trilha is not None:
+                self.perdas += 1
+            self.trilha = None
+            self._template = None
+            return None
+        self._iniciar_ou_manter(caixa, gray)
+        return self.trilha
+
+    def _seguir(self, gray):
+        """Template matching em volta da última caixa. Retorna False se perdeu o rosto."""
+        x, y, w, h = self.trilha.caixa
+        altura, largura = gray.shape[:2]
+        mx, my = int(w * self.margem_busca), int(h * self.margem_busca)
+        x0, y0 = max(0, x - mx), max(0, y - my)
+        x1, y1 = min(largura, x + w + mx), min(altura, y + h + my)
+        th, tw = self._template.shape[:2]
+        if x1 - x0 < tw or y1 - y0 < th:
+            return False
+        mapa = cv2.matchTemplate(gray[y0:y1, x0:x1], self._template, cv2.TM_CCOEFF_NORMED)
+        _, correlacao, _, (dx, dy) = cv2.minMaxLoc(mapa)
+        if correlacao < self.limiar_correlacao:
+            return False
+        self.trilha.caixa = (x0 + dx, y0 + dy, tw, th)
+        self.trilha.confianca = float(correlacao)
+        self.rastreamentos += 1
+        return True
+
+    def atualizar(self, frame):
+        """Processa um frame novo e retorna a trilha do rosto principal (ou None)."""
+        gray = _cinza(frame)
+        if self.trilha is None or self._template is None or self._desde_deteccao + 1 >= self.intervalo_deteccao:
+            trilha = self._detectar(gray)
+        else:
+            self._desde_deteccao += 1
+            trilha = self.trilha if self._seguir(gray) else self._detectar(gray)
+        if trilha is not None:
+            trilha.quadros += 1
+        return trilha
+
+    def reiniciar(self):
+        self.trilha = None
+        self._template = None
+        self._desde_deteccao = 0
+
+    def estatisticas(self):
+        """Quantas vezes cada caminho rodou e a fração de frames sem detecção completa."""
+        total = self.deteccoes + self.rastreamentos
+        return {
+            "deteccoes": self.deteccoes,
+            "rastreamentos": self.rastreamentos,
+            "perdas": self.perdas,
+            "fracao_sem_deteccao": self.rastreamentos / total if total else 0.0,
+            "trilha": self.trilha.id if self.trilha is not None else None,
+        }
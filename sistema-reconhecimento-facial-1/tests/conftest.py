@@ -0,0 +1,65 @@
+"""
+Configuração comum dos testes (a partir da raiz do projeto):
+    python -m pytest -q tests
+
+Os testes rodam sem o DeepFace/TensorFlow: a rede do ArcFace é trocada pela
+RedeFalsa de benchmarks/bench_suite.py e o detector por caixas fixas.
+"""
+import os
+import sys
+
+import numpy as np
+import cv2
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(RAIZ, "src"))
+sys.path.insert(0, os.path.join(RAIZ, "benchmarks"))
+
+from utils import modelo, cache_embeddings, database  # noqa: E402
+from bench_suite import RedeFalsa  # noqa: E402
+
+
+class DetectorFixo:
+    """Detector de mentira: devolve sempre a mesma caixa (ou nenhuma)."""
+
+    def __init__(self, caixa):
+        self.caixa = caixa
+
+    def primeiro_rosto(self, frame, *args, **kwargs):
+        return self.caixa
+
+    def detectar(self, frame, *args, **kwargs):
+        if self.caixa is None:
+            return np.empty((0, 4), dtype=np.int32)
+        return np.asarray([self.caixa], dtype=np.int32)
+
+
+@pytest.fixture
+def modelo_falso(monkeypatch, tmp_path):
+    """RedeFalsa no lugar do ArcFace, sem cache de embeddings e com faces/ em tmp_path."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(modelo, "_rede", RedeFalsa())
+    monkeypatch.setattr(cache_embeddings, "ATIVO", False)
+    modelo._pronto.set()
+    return modelo._rede
+
+
+@pytest.fixture
+def banco(monkeypatch, tmp_path):
+    """Banco SQLite novo em tmp_path, com a tabela de usuários criada."""
+    monkeypatch.setattr(database, "DATABASE_PATH", str(tmp_path / "cadastro.db"))
+    database.create_user_table()
+    yield database
+    database.close_connection()
+
+
+def frame_com_rosto(caixa, altura=480, largura=640, semente=0):
+    """Frame BGR de fundo liso com uma região texturizada (o "rosto") na caixa."""
+    rng = np.random.default_rng(semente)
+    frame = np.full((altura, largura, 3), 90, dtype=np.uint8)
+    x, y, w, h = caixa
+    # Textura suave (não ruído branco), para que JPEG e redimensionamento a preservem
+    pequeno = rng.integers(0, 256, size=(8, 8, 3), dtype=np.uint8)
+    frame[y:y + h, x:x + w] = cv2.resize(pequeno, (w, h), interpolation=cv2.INTER_CUBIC)
+    return frame
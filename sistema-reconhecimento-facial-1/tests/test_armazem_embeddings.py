@@ -0,0 +1,67 @@
+"""Armazém em arquivo único: tombstones, gerações da compactação e escrita interrompida."""
+import os
+
+import numpy as np
+
+from utils.armazem_embeddings import ArmazemEmbeddings
+
+DIM = 8
+
+
+def _embeddings(n, semente):
+    return np.random.default_rng(semente).standard_normal((n, DIM)).astype(np.float32)
+
+
+def _ativos(armazem):
+    _, indice = armazem.carregar()
+    return sorted(indice["cpf"][indice["ativo"] == 1].astype(str).tolist())
+
+
+def test_remover_e_substituir_marcam_tombstone(tmp_path):
+    armazem = ArmazemEmbeddings(str(tmp_path))
+    armazem.adicionar("11111111111", _embeddings(2, 1))
+    armazem.adicionar("22222222222", _embeddings(3, 2))
+    assert armazem.remover("11111111111") == 2
+    assert armazem.remover("11111111111") == 0  # já removido
+    assert armazem.contagem() == (3, 2)
+
+    armazem.substituir("22222222222", _embeddings(1, 3))
+    assert armazem.contagem() == (1, 5)  # as linhas só crescem no fim
+    assert _ativos(armazem) == ["22222222222"]
+    matriz, indice = armazem.carregar()
+    np.testing.assert_allclose(np.linalg.norm(matriz, axis=1), 1.0, rtol=1e-5)  # normalizados
+    np.testing.assert_allclose(indice["norma"][-1], np.linalg.norm(_embeddings(1, 3)), rtol=1e-5)
+
+
+def test_compactar_grava_nova_geracao_sem_tocar_no_que_esta_mapeado(tmp_path):
+    armazem = ArmazemEmbeddings(str(tmp_path))
+    armazem.adicionar("11111111111", _embeddings(2, 1))
+    armazem.adicionar("22222222222", _embeddings(3, 2))
+    armazem.remover("11111111111")
+    antiga, _ = armazem.carregar()  # como a galeria em memória, que continua mapeando a geração 0
+    copia_antiga = np.array(antiga)
+
+    assert armazem.compactar() == 2
+    assert armazem.geracao() == 1
+    assert sorted(os.listdir(tmp_path)) == ["galeria.1.f32", "galeria.1.idx", "galeria.json"]
+    assert armazem.contagem() == (3, 0)
+    np.testing.assert_array_equal(armazem.carregar()[0], copia_antiga[2:])
+    np.testing.assert_array_equal(antiga, copia_antiga)  # o mapeamento antigo segue legível
+
+    armazem.adicionar("33333333333", _embeddings(1, 4))  # anexa na geração nova
+    assert armazem.compactar() == 0 and armazem.geracao() == 2
+    assert _ativos(armazem) == ["22222222222"] * 3 + ["33333333333"]
+
+
+def test_linha_parcial_de_escrita_interrompida_e_descartada(tmp_path):
+    armazem = ArmazemEmbeddings(str(tmp_path))
+    armazem.adicionar("11111111111", _embeddings(2, 1))
+    with open(armazem.caminho_matriz, "ab") as f:
+        f.write(b"\0" * (DIM * 4 // 2))  # meia linha, sem registro no índice
+    assert armazem.contagem() == (2, 0)
+
+    armazem.adicionar("22222222222", _embeddings(1, 2))
+    matriz, indice = armazem.carregar()
+    assert os.path.getsize(armazem.caminho_matriz) == 3 * DIM * 4
+    assert indice["cpf"][-1] == b"22222222222"
+    np.testing.assert_allclose(matriz[-1], _embeddings(1, 2)[0] / np.linalg.norm(_embeddings(1, 2)), rtol=1e-5)
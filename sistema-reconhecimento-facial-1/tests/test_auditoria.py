@@ -0,0 +1,86 @@
+"""RegistradorLogins: lotes da thread escritora, encerramento e prazo do encerrar."""
+import time
+import datetime
+import threading
+
+import pytest
+
+from utils import auditoria
+from utils.auditoria import RegistradorLogins
+
+MOMENTO = datetime.datetime(2024, 5, 17, 8, 30)
+
+
+@pytest.fixture
+def gravacoes(banco, monkeypatch):
+    """Tamanho de cada lote gravado no banco; a escritora espera `liberar` no primeiro."""
+    banco.create_login_table()
+    lotes, liberar = [], threading.Event()
+    original = auditoria.insert_logins_bulk
+
+    def inserir(linhas):
+        lotes.append(len(linhas))
+        liberar.wait(5)
+        original(linhas)
+
+    monkeypatch.setattr(auditoria, "insert_logins_bulk", inserir)
+    yield lotes, liberar
+    liberar.set()
+
+
+def _logins_no_banco(banco):
+    return banco.get_connection().execute("SELECT cpf FROM logins ORDER BY id").fetchall()
+
+
+def _aguardar(condicao, segundos=5.0):
+    prazo = time.time() + segundos
+    while not condicao() and time.time() < prazo:
+        time.sleep(0.005)
+    assert condicao()
+
+
+def test_eventos_acumulados_viram_um_lote(gravacoes, banco, tmp_path):
+    lotes, liberar = gravacoes
+    registrador = RegistradorLogins(str(tmp_path / "logins"), lote_maximo=8)
+    registrador.registrar("00000000000", "Primeiro", 90, MOMENTO)
+    _aguardar(lambda: lotes == [1])  # escritora presa no primeiro lote
+    for i in range(1, 11):
+        assert registrador.registrar(f"{i:011d}", f"Pessoa {i}", 90, MOMENTO)
+    liberar.set()
+    registrador.aguardar()
+
+    assert lotes == [1, 8, 2]  # o que se acumulou sai em lotes de até lote_maximo
+    assert registrador.gravados == 11 and len(_logins_no_banco(banco)) == 11
+    with open(tmp_path / "logins" / "17-05-2024.txt", encoding="utf-8") as f:
+        assert len(f.readlines()) == 11
+    registrador.encerrar()
+
+
+def test_encerrar_grava_a_fila_e_recusa_novos_eventos(gravacoes, banco, tmp_path):
+    _, liberar = gravacoes
+    liberar.set()
+    registrador = RegistradorLogins(str(tmp_path / "logins"))
+    for i in range(5):
+        registrador.registrar(f"{i:011d}", "Pessoa", 90, MOMENTO)
+    registrador.encerrar()
+
+    assert not registrador._thread.is_alive()
+    assert len(_logins_no_banco(banco)) == 5
+    assert not registrador.registrar("99999999999", "Tarde", 90, MOMENTO)
+    assert registrador.descartados == 1
+    registrador.encerrar()  # segunda chamada (ex.: atexit) não faz nada
+
+
+@pytest.mark.parametrize("capacidade", [1, 2])
+def test_encerrar_respeita_o_prazo_com_a_escritora_travada(gravacoes, tmp_path, capacidade):
+    """Com 1, a fila fica cheia e nem a sentinela entra; com 2, ela entra mas a escritora não termina."""
+    lotes, _ = gravacoes  # `liberar` só no fim do teste: a escritora fica presa
+    registrador = RegistradorLogins(str(tmp_path / "logins"), capacidade=capacidade)
+    registrador.registrar("00000000000", "Preso", 90, MOMENTO)
+    _aguardar(lambda: lotes == [1])
+    assert registrador.registrar("11111111111", "Na fila", 90, MOMENTO)
+
+    inicio = time.monotonic()
+    registrador.encerrar(timeout=0.2)
+    assert time.monotonic() - inicio < 1.0
+    assert registrador._thread.is_alive()
@@ -0,0 +1,48 @@
+"""Contagem de entradas e despejo por recência do cache de embeddings em disco."""
+import sqlite3
+from types import SimpleNamespace
+
+import numpy as np
+
+from utils import cache_embeddings
+from utils.cache_embeddings import CacheEmbeddings
+
+
+def _vetor(i):
+    return np.full(4, i, dtype=np.float32)
+
+
+def test_contagem_sem_count_a_cada_gravacao(tmp_path):
+    cache = CacheEmbeddings(str(tmp_path / "cache.db"), limite=10, versao="teste")
+    comandos = []
+    cache._conexao().set_trace_callback(comandos.append)
+    for i in range(10):
+        cache.guardar_muitos([bytes([i]) * 16], [_vetor(i)])
+    cache.guardar_muitos([bytes([0]) * 16], [_vetor(0)])  # chave repetida não conta
+    assert cache.estatisticas()["entradas_disco"] == 10
+    assert not any("COUNT" in comando for comando in comandos)
+
+    cache.guardar_muitos([bytes([10]) * 16], [_vetor(10)])  # passou do limite: confere e despeja
+    assert any("COUNT" in comando for comando in comandos)
+    reais = cache._conexao().execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+    assert cache.estatisticas()["entradas_disco"] == reais == 9
+    cache.fechar()
+
+
+def test_acerto_em_memoria_renova_a_entrada_no_disco(tmp_path, monkeypatch):
+    relogio = iter(range(1, 100))
+    monkeypatch.setattr(cache_embeddings, "time", SimpleNamespace(time=lambda: float(next(relogio))))
+    monkeypatch.setattr(cache_embeddings, "LOTE_USOS", 1)
+    arquivo = str(tmp_path / "cache.db")
+    cache = CacheEmbeddings(arquivo, limite=4, versao="teste")
+    chaves = [bytes([i]) * 16 for i in range(5)]
+    for i in range(4):
+        cache.guardar_muitos([chaves[i]], [_vetor(i)])
+    assert cache.obter_muitos([chaves[0]])[0] is not None  # acerto no LRU em memória
+    assert cache.acertos_memoria == 1
+
+    cache.guardar_muitos([chaves[4]], [_vetor(4)])  # despeja a menos usada: a 1, não a 0
+    cache.fechar()
+    with sqlite3.connect(arquivo) as conn:
+        restantes = {bytes(chave) for (chave,) in conn.execute("SELECT chave FROM embeddings")}
+    assert chaves[0] in restantes and chaves[1] not in restantes
@@ -0,0 +1,81 @@
+"""
+Todos os pontos de entrada de consulta do MotorReconhecimento (identificar,
+verificar, reconhecer_lote, identificar_rostos, identificar_trilha e caixas
+vindas do rastreador) precisam gerar o mesmo embedding para o mesmo rosto:
+é um caminho só.
+"""
+import cv2
+import numpy as np
+import pytest
+
+import motor_reconhecimento
+from motor_reconhecimento import MotorReconhecimento
+from utils.galeria import ServicoGaleria
+from utils.rastreador import Trilha
+from utils.modelo import gerar_embeddings_lote, recortar_rosto
+from conftest import DetectorFixo, frame_com_rosto
+
+CPF = "12345678901"
+CAIXA = (220, 130, 180, 200)
+
+
+@pytest.fixture
+def motor(modelo_falso, monkeypatch):
+    monkeypatch.setattr(motor_reconhecimento, "obter_detector", lambda: DetectorFixo(CAIXA))
+    galeria = ServicoGaleria("faces")
+    galeria.adicionar_usuario(CPF, gerar_embeddings_lote([recortar_rosto(frame_com_rosto(CAIXA), CAIXA)]))
+    return MotorReconhecimento(galeria=galeria, limiar=3.0, acuracia_minima=0)
+
+
+def test_pontos_de_entrada_dao_a_mesma_distancia(motor):
+    frame = frame_com_rosto(CAIXA)
+    distancias = [
+        motor.identificar(frame).distancia,
+        motor.verificar(frame, CPF).distancia,
+        motor.reconhecer_lote([frame])[0].distancia,
+        motor.reconhecer_lote([frame], [CPF])[0].distancia,
+        motor.identificar_rostos(frame)[0].distancia,
+    ]
+    assert all(d is not None for d in distancias)
+    np.testing.assert_allclose(distancias, distancias[0], atol=1e-4)
+    assert distancias[0] < 1e-2
+
+
+def test_caixa_do_rastreador_usa_o_mesmo_recorte(motor):
+    frame = frame_com_rosto(CAIXA)
+    detectado = motor.embeddings_de_frames([frame])[0]
+    da_trilha = motor.embeddings_de_frames([frame], caixas=[CAIXA])[0]
+    np.testing.assert_allclose(da_trilha, detectado, rtol=1e-5, atol=1e-4)
+
+
+def test_caixa_em_frame_reduzido_volta_para_as_coordenadas_originais(motor):
+    """A caixa vem nas coordenadas do frame original, mesmo quando ele é reduzido."""
+    # 1280x960 é reduzido para 640x480, onde o detector falso devolve CAIXA
+    frame = cv2.resize(frame_com_rosto(CAIXA), (1280, 960), interpolation=cv2.INTER_NEAREST)
+    caixa_original = tuple(2 * v for v in CAIXA)
+    detectado = motor.embeddings_de_frames([frame])[0]
+    da_trilha = motor.embeddings_de_frames([frame], caixas=[caixa_original])[0]
+    np.testing.assert_allclose(da_trilha, detectado, rtol=1e-5, atol=1e-4)
+    assert motor.identificar_rostos(frame)[0].caixa == caixa_original
+
+
+def test_identificar_trilha_embeda_a_caixa_sem_nova_deteccao(motor, monkeypatch):
+    monkeypatch.setattr(motor_reconhecimento, "obter_detector", lambda: DetectorFixo(None))
+    frame = frame_com_rosto(CAIXA)
+    trilha = Trilha(id=1, caixa=(0, 0, 10, 10), inicio=0.0)
+    resultado = motor.identificar_trilha(frame, trilha, caixa=CAIXA)
+    assert resultado.reconhecido and resultado.distancia < 1e-2
+    assert trilha.tentativas == 1 and trilha.resultado is resultado
+    # Trilha reconhecida: reaproveita o resultado, sem nova inferência
+    assert motor.identificar_trilha(frame, trilha) is resultado
+    assert trilha.tentativas == 1
+
+
+def test_frame_sem_rosto(motor, monkeypatch):
+    monkeypatch.setattr(motor_reconhecimento, "obter_detector", lambda: DetectorFixo(None))
+    frame = frame_com_rosto(CAIXA)
+    assert motor.embeddings_de_frames([frame]) == [None]
+    assert motor.reconhecer_lote([frame])[0].distancia is None
+    assert motor.identificar_rostos(frame) == []
+    with pytest.raises(ValueError):
+        motor.identificar(frame)
@@ -0,0 +1,21 @@
+"""Os comandos documentados no README continuam executáveis."""
+import os
+import sys
+import subprocess
+
+import numpy as np
+
+from conftest import RAIZ
+
+
+def test_migracao_npy_pela_linha_de_comando(tmp_path):
+    pasta_cpf = tmp_path / "faces" / "12345678901"
+    pasta_cpf.mkdir(parents=True)
+    np.save(pasta_cpf / "embedding_1.npy", np.ones(512, dtype=np.float32))
+
+    saida = subprocess.run([sys.executable, "-m", "utils.armazem_embeddings", "--pasta", str(tmp_path / "faces")],
+                           cwd=os.path.join(RAIZ, "src"), capture_output=True, text=True, timeout=60)
+
+    assert saida.returncode == 0, saida.stderr
+    assert "1 usuários, 1 embeddings" in saida.stdout
+    assert (tmp_path / "faces" / "galeria.f32").exists()
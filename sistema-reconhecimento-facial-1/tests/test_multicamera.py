@@ -0,0 +1,57 @@
+"""O trabalhador de inferência do multicamera usa a caixa do rastreador, sem nova detecção."""
+import threading
+
+import pytest
+
+import motor_reconhecimento
+from motor_reconhecimento import MotorReconhecimento
+from multicamera import PedidoReconhecimento, TrabalhadorInferencia
+from utils.galeria import ServicoGaleria
+from utils.modelo import gerar_embeddings_lote, recortar_rosto
+from conftest import frame_com_rosto
+
+CPF = "12345678901"
+CAIXA = (220, 130, 180, 200)
+
+
+class DetectorProibido:
+    def primeiro_rosto(self, *args, **kwargs):
+        raise AssertionError("o trabalhador não deveria detectar de novo")
+
+    detectar = primeiro_rosto
+
+
+class Trilha:
+    def __init__(self, id):
+        self.id = id
+
+
+@pytest.fixture
+def motor(modelo_falso, monkeypatch):
+    monkeypatch.setattr(motor_reconhecimento, "obter_detector", lambda: DetectorProibido())
+    galeria = ServicoGaleria("faces")
+    galeria.adicionar_usuario(CPF, gerar_embeddings_lote([recortar_rosto(frame_com_rosto(CAIXA), CAIXA)]))
+    return MotorReconhecimento(galeria=galeria, limiar=3.0, acuracia_minima=0)
+
+
+def test_lote_recorta_a_caixa_do_pedido(motor):
+    trabalhador = TrabalhadorInferencia(motor, n_fontes=2)
+    resultados, concluidos = [], threading.Event()
+
+    def ao_concluir(pedido, resultado):
+        resultados.append((pedido.fonte, resultado))
+        if len(resultados) == 2:
+            concluidos.set()
+
+    for fonte in range(2):
+        trabalhador.enviar(PedidoReconhecimento(fonte, Trilha(fonte), frame_com_rosto(CAIXA), CAIXA, 0.0), ao_concluir)
+    trabalhador.iniciar()
+    try:
+        assert concluidos.wait(5.0)
+    finally:
+        trabalhador.parar()
+
+    assert trabalhador.erros == 0 and trabalhador.lotes == 1
+    assert sorted(fonte for fonte, _ in resultados) == [0, 1]
+    for _, resultado in resultados:
+        assert resultado.reconhecido and resultado.cpf == CPF
@@ -0,0 +1,103 @@
+"""
+Paridade entre o embedding do cadastro e o do login para a mesma imagem.
+
+O cadastro recorta a caixa do detector (recortar_rosto), salva o JPG 224x224
+e gera o embedding em lote; o login gera o embedding do frame inteiro pelo
+MotorReconhecimento. Os dois precisam cair no mesmo ponto do espaço do ArcFace,
+senão a distância de um usuário para ele mesmo come a margem do limiar.
+"""
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+import motor_reconhecimento
+from motor_reconhecimento import MotorReconhecimento
+from utils.modelo import gerar_embeddings_lote, recortar_rosto
+from conftest import DetectorFixo, frame_com_rosto
+
+CAIXA = (220, 130, 180, 200)
+
+# Tolerância relativa (distância / norma do embedding) com a RedeFalsa: cobre
+# a compressão JPEG do recorte salvo em faces/<cpf>/.
+TOLERANCIA_RELATIVA = 0.02
+
+# Com o ArcFace de verdade, em distância euclidiana: bem abaixo do limiar de
+# aceitação (dist <= 3), para sobrar margem para a variação entre capturas.
+TOLERANCIA_ARCFACE = 1.0
+
+
+def _embedding_do_cadastro(frame, caixa, pasta):
+    """Como no cadastro: recorte 224x224 -> JPG em disco -> embedding em lote."""
+    caminho = os.path.join(pasta, "rosto.jpg")
+    cv2.imwrite(caminho, recortar_rosto(frame, caixa))
+    return gerar_embeddings_lote([cv2.imread(caminho)])[0]
+
+
+def _embedding_do_login(frame):
+    motor = MotorReconhecimento(limiar=3.0, acuracia_minima=0)
+    return np.asarray(motor.gerar_embedding(motor.preprocessar(frame)), dtype=np.float32)
+
+
+def test_cadastro_e_login_ficam_dentro_da_tolerancia(modelo_falso, monkeypatch, tmp_path):
+    monkeypatch.setattr(motor_reconhecimento, "obter_detector", lambda: DetectorFixo(CAIXA))
+    frame = frame_com_rosto(CAIXA)
+
+    cadastro = _embedding_do_cadastro(frame, CAIXA, str(tmp_path))
+    login = _embedding_do_login(frame)
+
+    distancia = float(np.linalg.norm(cadastro - login))
+    assert distancia <= TOLERANCIA_RELATIVA * float(np.linalg.norm(cadastro))
+
+
+def test_recorte_em_memoria_e_identico_ao_do_login(modelo_falso, monkeypatch):
+    monkeypatch.setattr(motor_reconhecimento, "obter_detector", lambda: DetectorFixo(CAIXA))
+    frame = frame_com_rosto(CAIXA)
+
+    cadastro = gerar_embeddings_lote([recortar_rosto(frame, CAIXA)])[0]
+    np.testing.assert_allclose(_embedding_do_login(frame), cadastro, rtol=1e-5, atol=1e-4)
+
+
+def test_recorte_diferente_sai_da_tolerancia(modelo_falso, monkeypatch, tmp_path):
+    """Controle: a tolerância separa um recorte deslocado do recorte do cadastro."""
+    x, y, w, h = CAIXA
+    monkeypatch.setattr(motor_reconhecimento, "obter_detector", lambda: DetectorFixo((x + w // 4, y, w, h)))
+    frame = frame_com_rosto(CAIXA)
+
+    cadastro = _embedding_do_cadastro(frame, CAIXA, str(tmp_path))
+    login = _embedding_do_login(frame)
+
+    assert float(np.linalg.norm(cadastro - login)) > TOLERANCIA_RELATIVA * float(np.linalg.norm(cadastro))
+
+
+def test_login_sem_rosto_levanta_value_error(modelo_falso, monkeypatch):
+    monkeypatch.setattr(motor_reconhecimento, "obter_detector", lambda: DetectorFixo(None))
+    with pytest.raises(ValueError):
+        _embedding_do_login(frame_com_rosto(CAIXA))
+
+
+def test_paridade_com_arcface(tmp_path, monkeypatch):
+    """
+    Com o modelo de verdade e uma foto real (RF_FOTO_PARIDADE=caminho.jpg):
+    detector Haar, ArcFace e o mesmo limite em distância euclidiana.
+    """
+    foto = os.environ.get("RF_FOTO_PARIDADE")
+    if not foto:
+        pytest.skip("defina RF_FOTO_PARIDADE com uma foto de rosto")
+    pytest.importorskip("deepface")
+    from utils import cache_embeddings
+    from utils.detector import obter_detector
+
+    monkeypatch.setattr(cache_embeddings, "ATIVO", False)
+    frame = cv2.imread(foto)
+    assert frame is not None, f"não foi possível ler {foto}"
+    motor = MotorReconhecimento(limiar=3.0, acuracia_minima=0)
+    imagem = motor.preprocessar(frame)
+    caixa = obter_detector().primeiro_rosto(imagem)
+    assert caixa is not None, "nenhum rosto detectado na foto"
+
+    cadastro = _embedding_do_cadastro(imagem, caixa, str(tmp_path))
+    login = _embedding_do_login(frame)
+
+    assert float(np.linalg.norm(cadastro - login)) <= TOLERANCIA_ARCFACE
@@ -0,0 +1,40 @@
+"""Busca na galeria quantizada: conversão em blocos para float32."""
+import numpy as np
+import pytest
+
+from utils import quantizacao
+from utils.quantizacao import MatrizQuantizada
+
+
+@pytest.fixture
+def matriz():
+    # Linhas que não fecham um bloco, para cobrir o último bloco parcial
+    linhas = np.random.default_rng(0).normal(size=(3 * quantizacao.BLOCO_BUSCA + 37, 512)).astype(np.float32)
+    linhas /= np.linalg.norm(linhas, axis=1, keepdims=True)
+    linhas[0, :4] = [0.0, -0.0, 1e-6, -3e-7]  # zeros e subnormais do float16
+    return linhas
+
+
+@pytest.mark.parametrize("tipo", quantizacao.TIPOS)
+def test_cossenos_em_blocos_iguais_a_conversao_direta(matriz, tipo, tmp_path):
+    quantizada = MatrizQuantizada.de_matriz(matriz, tipo)
+    consulta = matriz[5]
+    escalada = consulta if quantizada.escalas is None else consulta * quantizada.escalas
+    esperado = quantizada.codigos.astype(np.float32) @ escalada.astype(np.float32)
+
+    np.testing.assert_allclose(quantizada.cossenos(consulta), esperado, rtol=1e-5, atol=1e-5)
+    np.testing.assert_allclose(quantizada.cossenos(consulta, linhas=np.arange(10)), esperado[:10], rtol=1e-5, atol=1e-5)
+
+    # Mesmo resultado com os códigos mapeados do disco, como no armazém
+    caminho = tmp_path / f"codigos.{tipo}"
+    quantizada.codigos.tofile(caminho)
+    mapeados = np.memmap(caminho, dtype=quantizada.codigos.dtype, mode="r", shape=quantizada.codigos.shape)
+    np.testing.assert_allclose(MatrizQuantizada(mapeados, quantizada.escalas).cossenos(consulta), esperado,
+                               rtol=1e-5, atol=1e-5)
+
+
+def test_float16_sem_opencv(matriz, monkeypatch):
+    monkeypatch.setattr(quantizacao, "_converter_fp16", None)
+    quantizada = MatrizQuantizada.de_matriz(matriz, "float16")
+    esperado = quantizada.codigos.astype(np.float32) @ matriz[5]
+    np.testing.assert_allclose(quantizada.cossenos(matriz[5]), esperado, rtol=1e-5, atol=1e-5)
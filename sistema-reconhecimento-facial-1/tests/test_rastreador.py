@@ -0,0 +1,21 @@
+"""Reserva e conclusão da identificação de uma trilha (utils/rastreador.py)."""
+from motor_reconhecimento import ResultadoReconhecimento
+from utils.rastreador import Trilha
+
+
+def test_uma_identificacao_por_vez_e_intervalo_entre_tentativas():
+    trilha = Trilha(id=1, caixa=(0, 0, 10, 10), inicio=0.0)
+    assert trilha.reservar_identificacao(3.0, agora=10.0)
+    assert not trilha.reservar_identificacao(3.0, agora=10.0)  # outra já em andamento
+    trilha.concluir_identificacao(None)                       # descarte: só libera
+    assert trilha.tentativas == 0
+
+    assert trilha.reservar_identificacao(3.0, agora=10.0)
+    trilha.concluir_identificacao(ResultadoReconhecimento(reconhecido=False), agora=10.0)
+    assert trilha.tentativas == 1 and not trilha.identificada
+    assert not trilha.reservar_identificacao(3.0, agora=12.0)  # antes do intervalo
+    assert trilha.reservar_identificacao(3.0, agora=13.5)
+
+    trilha.concluir_identificacao(ResultadoReconhecimento(cpf="1", reconhecido=True), agora=13.5)
+    assert trilha.identificada and trilha.tentativas == 2
+    assert not trilha.reservar_identificacao(0.0, agora=100.0)  # reconhecida: não há nova inferência
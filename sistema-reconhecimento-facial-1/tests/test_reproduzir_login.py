@@ -0,0 +1,77 @@
+"""
+Login sem interface sobre frames sintéticos, com rastreador e filtro de
+qualidade de mentira: o que vai para o motor é o frame e a caixa que a
+janela do melhor frame aprovou.
+"""
+from motor_reconhecimento import ResultadoReconhecimento
+from reproduzir_login import ReproducaoLogin
+from utils.qualidade import AvaliacaoQualidade
+from utils.rastreador import Trilha
+
+
+class RastreadorAndando:
+    """Uma trilha só, cuja caixa anda 10 px por frame."""
+
+    def __init__(self):
+        self.trilha = Trilha(id=1, caixa=(40, 40, 100, 100), inicio=0.0)
+        self.caixas = []
+
+    def atualizar(self, frame):
+        x, y, w, h = self.trilha.caixa
+        self.trilha.caixa = (x + 10, y, w, h)
+        self.caixas.append(self.trilha.caixa)
+        return self.trilha
+
+    def estatisticas(self):
+        return {}
+
+
+class AvaliadorPrimeiroMelhor:
+    """Aprova todos os frames, com a nota mais alta no primeiro."""
+
+    def __init__(self):
+        self.vistos = 0
+
+    def avaliar(self, frame, caixa):
+        self.vistos += 1
+        return AvaliacaoQualidade(nota=1.0 if self.vistos == 1 else 0.5, aprovado=True)
+
+
+class MotorAnotador:
+    def __init__(self):
+        self.pedidos = []
+
+    def identificar(self, frame, caixa=None):
+        self.pedidos.append(caixa)
+        return ResultadoReconhecimento(cpf="12345678901", reconhecido=True)
+
+
+def _reproducao(motor):
+    reproducao = ReproducaoLogin("sintetico", motor, ritmo=False, tempo_espera=0.25, intervalo_sondagem=0.0)
+    reproducao.rastreador = RastreadorAndando()
+    reproducao.avaliador = AvaliadorPrimeiroMelhor()
+    return reproducao
+
+
+def test_motor_recebe_a_caixa_aprovada_pelo_filtro():
+    motor = MotorAnotador()
+    reproducao = _reproducao(motor)
+    relatorio = reproducao.executar()
+
+    assert relatorio["identificacoes"][0]["cpf"] == "12345678901"
+    # A caixa do melhor frame (o primeiro), e não a posição atual da trilha
+    assert motor.pedidos == [reproducao.rastreador.caixas[0]]
+    assert reproducao.rastreador.trilha.caixa != reproducao.rastreador.caixas[0]
+
+
+def test_sem_ritmo_a_janela_expira_no_tempo_do_video():
+    """O melhor frame vale 1,5 s de vídeo, por mais rápido que o vídeo seja processado."""
+    motor = MotorAnotador()
+    reproducao = _reproducao(motor)
+    reproducao.tempo_espera = 2.0  # sondagem no frame 60 (30 fps): o primeiro frame já expirou
+    reproducao.executar()
+
+    caixas = reproducao.rastreador.caixas
+    # Com o primeiro expirado, as notas empatam e fica o frame mais recente (o da sondagem);
+    # no relógio de parede o primeiro ainda valeria
+    assert motor.pedidos == [caixas[60]]
@@ -0,0 +1,96 @@
+"""ServicoGaleria: atualizações no delta, tombstones na base e compactação em segundo plano."""
+import time
+
+import numpy as np
+
+from utils import galeria as modulo_galeria
+from utils.armazem_embeddings import ArmazemEmbeddings
+from utils.galeria import ServicoGaleria
+
+DIM = 8
+A, B, C = "11111111111", "22222222222", "33333333333"
+
+
+def _embeddings(n, semente):
+    return np.random.default_rng(semente).standard_normal((n, DIM)).astype(np.float32)
+
+
+def _aguardar_compactacao(servico, segundos=5.0):
+    prazo = time.time() + segundos
+    while servico._compactando and time.time() < prazo:
+        time.sleep(0.01)
+    assert not servico._compactando
+
+
+def _mais_proximo(servico, embedding):
+    return servico.buscar(embedding)[0]
+
+
+def test_atualizacoes_vao_para_o_delta_e_tombstones_para_a_base(tmp_path):
+    pasta = str(tmp_path)
+    ArmazemEmbeddings(pasta).adicionar(A, _embeddings(2, 1))
+    servico = ServicoGaleria(pasta, limite_delta=100, fracao_removidas=0.9)
+    assert servico.possui_cpf(A) and len(servico) == 2
+
+    servico.adicionar_usuario(B, _embeddings(2, 2))
+    base, delta = servico._estado
+    assert len(base) == 2 and len(delta) == 2
+    assert _mais_proximo(servico, _embeddings(2, 2)[1]) == B
+
+    servico.substituir_usuario(A, _embeddings(1, 3))
+    base, delta = servico._estado
+    assert base.quantidade_ativa() == 0 and len(base) == 2  # linhas antigas de A desativadas
+    assert _mais_proximo(servico, _embeddings(1, 3)[0]) == A
+    assert servico.verificar(_embeddings(2, 1)[0], A) > 1.0  # o embedding antigo já não conta
+
+    servico.remover_usuario(B)
+    assert not servico.possui_cpf(B) and servico.cpfs_cadastrados() == {A}
+    assert len(servico) == 1 and _mais_proximo(servico, _embeddings(2, 2)[0]) == A
+
+
+def test_delta_cheio_compacta_em_nova_base(tmp_path):
+    servico = ServicoGaleria(str(tmp_path), limite_delta=3)
+    servico.adicionar_usuario(A, _embeddings(2, 1))
+    servico.adicionar_usuario(B, _embeddings(2, 2))  # delta com 4 >= 3: compacta
+    _aguardar_compactacao(servico)
+
+    base, delta = servico._estado
+    assert len(delta) == 0 and len(base) == 4
+    assert _mais_proximo(servico, _embeddings(2, 1)[0]) == A
+    assert _mais_proximo(servico, _embeddings(2, 2)[1]) == B
+
+
+def test_removidas_demais_compactam_tambem_o_armazem(tmp_path):
+    pasta = str(tmp_path)
+    armazem = ArmazemEmbeddings(pasta)
+    armazem.adicionar(A, _embeddings(3, 1))
+    armazem.adicionar(B, _embeddings(1, 2))
+    servico = ServicoGaleria(pasta, fracao_removidas=0.5)
+    armazem.remover(A)  # o fluxo de exclusão marca o disco antes de avisar o serviço
+    servico.remover_usuario(A)
+    _aguardar_compactacao(servico)
+
+    base, _ = servico._estado
+    assert len(base) == base.quantidade_ativa() == 1
+    assert armazem.geracao() == 1 and armazem.contagem() == (1, 0)
+
+
+def test_atualizacao_durante_a_compactacao_nao_se_perde(tmp_path, monkeypatch):
+    servico = ServicoGaleria(str(tmp_path), limite_delta=2)
+    original = modulo_galeria.GaleriaFacial.construir_auxiliares
+    chamadas = []
+
+    def construir_e_atualizar(galeria, *args, **kwargs):
+        chamadas.append(len(galeria))
+        if len(chamadas) == 1:
+            servico.adicionar_usuario(C, _embeddings(1, 3))  # chega no meio da 1ª compactação
+        return original(galeria, *args, **kwargs)
+
+    monkeypatch.setattr(modulo_galeria.GaleriaFacial, "construir_auxiliares", construir_e_atualizar)
+    servico.adicionar_usuario(A, _embeddings(1, 1))
+    servico.adicionar_usuario(B, _embeddings(1, 2))
+    _aguardar_compactacao(servico)
+
+    assert chamadas == [2, 3]  # a compactação refez a base com o que chegou no meio
+    base, delta = servico._estado
+    assert len(delta) == 0 and base.cpfs_cadastrados() == {A, B, C}
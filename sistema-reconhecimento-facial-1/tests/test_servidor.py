@@ -0,0 +1,235 @@
+"""
+Servidor de reconhecimento em 127.0.0.1 (porta livre), com o cliente HTTP
+de verdade e o ArcFace trocado pela rede falsa.
+"""
+import os
+import time
+import socket
+import asyncio
+import threading
+import http.client
+
+import cv2
+import pytest
+
+import motor_reconhecimento
+from motor_reconhecimento import MotorReconhecimento, ResultadoReconhecimento
+from cliente_reconhecimento import ClienteReconhecimento, ErroServidor
+from servidor import ServidorReconhecimento
+from utils.galeria import ServicoGaleria
+from utils.modelo import gerar_embeddings_lote, recortar_rosto
+from conftest import DetectorFixo, frame_com_rosto
+
+CPF = "12345678901"
+CAIXA = (220, 130, 180, 200)
+
+
+def _porta_livre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class ServidorEmThread:
+    """Roda ServidorReconhecimento.servir num laço asyncio próprio, numa thread."""
+
+    def __init__(self, servidor):
+        self.servidor = servidor
+        self.porta = _porta_livre()
+        self.url = f"http://127.0.0.1:{self.porta}"
+        self._loop = asyncio.new_event_loop()
+        self._tarefa = None
+        self._thread = threading.Thread(target=self._executar, daemon=True)
+
+    def _executar(self):
+        asyncio.set_event_loop(self._loop)
+        self._tarefa = self._loop.create_task(self.servidor.servir("127.0.0.1", self.porta))
+        try:
+            self._loop.run_until_complete(self._tarefa)
+        except asyncio.CancelledError:
+            pass
+        # Atendimentos de conexões que os clientes já fecharam terminam sozinhos
+        pendentes = asyncio.all_tasks(self._loop)
+        if pendentes:
+            self._loop.run_until_complete(asyncio.wait(pendentes, timeout=1.0))
+        self._loop.close()
+
+    def __enter__(self):
+        self._thread.start()
+        for _ in range(200):
+            try:
+                socket.create_connection(("127.0.0.1", self.porta), timeout=0.05).close()
+                return self
+            except OSError:
+                threading.Event().wait(0.01)
+        raise RuntimeError("o servidor não subiu")
+
+    def __exit__(self, *erro):
+        self._loop.call_soon_threadsafe(self._tarefa.cancel)
+        self._thread.join(5.0)
+
+
+@pytest.fixture
+def servidor_local(modelo_falso, banco, monkeypatch):
+    monkeypatch.setattr(motor_reconhecimento, "obter_detector", lambda: DetectorFixo(CAIXA))
+    motor = MotorReconhecimento(galeria=ServicoGaleria("faces"), limiar=3.0, acuracia_minima=0)
+    with ServidorEmThread(ServidorReconhecimento(motor)) as servidor:
+        yield servidor
+
+
+@pytest.fixture
+def cliente(servidor_local):
+    cliente = ClienteReconhecimento(servidor_local.url, tentativas_ocupado=0)
+    yield cliente
+    cliente._conexao().close()  # antes de o servidor parar: o atendimento termina sozinho
+
+
+def test_reenroll_troca_fotos_banco_e_embeddings(cliente, banco):
+    antigas = [recortar_rosto(frame_com_rosto(CAIXA, semente=1), CAIXA)] * 2
+    assert cliente.cadastrar("Fulano", "01/01/1990", CPF, antigas)
+    novas = [recortar_rosto(frame_com_rosto(CAIXA, semente=2), CAIXA)] * 4
+    assert cliente.substituir_fotos(CPF, novas)
+
+    caminhos = banco.get_user_by_cpf(CPF)[4].split(";")
+    assert len(caminhos) == 4 and all(os.path.exists(c) for c in caminhos)
+    assert sorted(os.listdir(os.path.join("faces", CPF))) == sorted(os.path.basename(c) for c in caminhos)
+    # O armazém ficou só com os embeddings das fotos novas (que chegaram em JPEG)
+    galeria = ServicoGaleria("faces")
+    distancia_novas = galeria.verificar(gerar_embeddings_lote(novas[:1])[0], CPF)
+    distancia_antigas = galeria.verificar(gerar_embeddings_lote(antigas[:1])[0], CPF)
+    assert distancia_novas < distancia_antigas / 5
+
+    assert not cliente.substituir_fotos("98765432100", novas)  # 404: CPF fora do servidor
+
+
+def test_tela_de_edicao_pelo_servidor(cliente, servidor_local, banco):
+    rostos = [recortar_rosto(frame_com_rosto(CAIXA, semente=1), CAIXA)] * 2
+    assert cliente.cadastrar("Fulano", "01/01/1990", CPF, rostos)
+    galeria = servidor_local.servidor.motor.galeria
+    galeria.adicionar_usuario(CPF, gerar_embeddings_lote(rostos[:1]))  # como a galeria de um servidor no ar
+
+    assert cliente.buscar_usuario(CPF)[1:4] == ("Fulano", "01/01/1990", CPF)
+    assert [(nome, cpf) for _, nome, cpf in cliente.listar_usuarios()] == [("Fulano", CPF)]
+    assert cliente.alterar_usuario(CPF, "Beltrano", "02/02/1992")
+    assert banco.get_user_by_cpf(CPF)[1:3] == ("Beltrano", "02/02/1992")
+
+    assert cliente.excluir_usuario(CPF)
+    assert banco.get_user_by_cpf(CPF) is None and not os.path.exists(os.path.join("faces", CPF))
+    assert not galeria.possui_cpf(CPF)
+    assert not ServicoGaleria("faces").possui_cpf(CPF)  # nem no armazém em disco
+    assert cliente.buscar_usuario(CPF) is None
+    assert not cliente.alterar_usuario(CPF, "Ciclano") and not cliente.excluir_usuario(CPF)
+
+
+# ---------- Micro-lotes e fila limitada (motor de mentira) ----------
+
+class MotorLento:
+    """Motor de mentira: cada chamada demora `segundos` e registra o tamanho do lote."""
+
+    def __init__(self, segundos):
+        self.segundos = segundos
+        self.lotes = []
+        self.caixas = []
+
+    def pronto(self):
+        return True
+
+    def reconhecer_lote(self, frames, cpfs=None, caixas=None):
+        self.lotes.append(len(frames))
+        self.caixas += caixas or [None] * len(frames)
+        time.sleep(self.segundos)
+        return [ResultadoReconhecimento() for _ in frames]
+
+    def identificar_rostos(self, frame):
+        self.lotes.append(1)
+        time.sleep(self.segundos)
+        return [ResultadoReconhecimento(caixa=(0, 0, 10, 10))]
+
+
+def _jpeg():
+    return cv2.imencode(".jpg", frame_com_rosto(CAIXA))[1].tobytes()
+
+
+def _simultaneos(servidor, rotas):
+    """Dispara um POST por rota ao mesmo tempo. Retorna [(status, Retry-After, json)]."""
+    corpo, barreira, respostas = _jpeg(), threading.Barrier(len(rotas)), [None] * len(rotas)
+
+    def enviar(i, rota):
+        conexao = http.client.HTTPConnection("127.0.0.1", servidor.porta, timeout=10)
+        barreira.wait()
+        conexao.request("POST", rota, body=corpo, headers={"Content-Type": "image/jpeg"})
+        resposta = conexao.getresponse()
+        respostas[i] = (resposta.status, resposta.getheader("Retry-After"), resposta.read())
+        conexao.close()
+
+    threads = [threading.Thread(target=enviar, args=(i, rota)) for i, rota in enumerate(rotas)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    return respostas
+
+
+def test_pedidos_simultaneos_viram_um_lote():
+    motor = MotorLento(0.05)
+    servidor = ServidorReconhecimento(motor, lote_maximo=16, espera_maxima_ms=100, capacidade=64)
+    rotas = ["/identify"] * 6 + ["/verify/" + CPF] * 2 + ["/identify/all"] * 2
+    with ServidorEmThread(servidor) as local:
+        respostas = _simultaneos(local, rotas)
+
+    assert [status for status, _, _ in respostas] == [200] * len(rotas)
+    estatisticas = servidor.agrupador.estatisticas()
+    assert estatisticas["pedidos"] == len(rotas)  # identify/all também passa pela fila
+    assert estatisticas["maior_lote"] > 1
+    assert max(motor.lotes) > 1  # identify e verify do mesmo lote num único reconhecer_lote
+
+
+def test_fila_cheia_responde_503_tambem_no_identify_all():
+    motor = MotorLento(0.3)
+    servidor = ServidorReconhecimento(motor, lote_maximo=1, espera_maxima_ms=0, capacidade=1)
+    with ServidorEmThread(servidor) as local:
+        respostas = _simultaneos(local, ["/identify/all"] * 5)
+
+    status = [s for s, _, _ in respostas]
+    assert 200 in status and 503 in status
+    assert all(retry == "1" for s, retry, _ in respostas if s == 503)
+    assert servidor.agrupador.estatisticas()["rejeitados"] == status.count(503)
+
+
+def test_cliente_envia_as_caixas_do_lote():
+    motor = MotorLento(0)
+    with ServidorEmThread(ServidorReconhecimento(motor, espera_maxima_ms=0)) as local:
+        cliente = ClienteReconhecimento(local.url, tentativas_ocupado=0)
+        # Frame de 1280x960: o cliente reduz para 640x480 e a caixa acompanha
+        frames = [cv2.resize(frame_com_rosto(CAIXA), (1280, 960))] * 3
+        cliente.reconhecer_lote(frames, [None, CPF, None], [(440, 260, 360, 400), (440, 260, 360, 400), None])
+        with pytest.raises(ErroServidor) as erro:
+            cliente._requisitar("POST", "/identify?caixa=1,2,3", _jpeg())
+        cliente._conexao().close()
+
+    assert motor.caixas == [CAIXA, CAIXA, None]
+    assert erro.value.status == 400
+
+
+def _resposta_crua(servidor, content_length):
+    with socket.create_connection(("127.0.0.1", servidor.porta), timeout=5) as conexao:
+        conexao.sendall(f"POST /identify HTTP/1.1\r\nContent-Length: {content_length}\r\n\r\n".encode("latin-1"))
+        resposta = http.client.HTTPResponse(conexao)
+        resposta.begin()
+        return resposta.status, resposta.getheader("Connection")
+
+
+def test_content_length_negativo_invalido_ou_grande_demais():
+    with ServidorEmThread(ServidorReconhecimento(MotorLento(0))) as local:
+        assert _resposta_crua(local, -5) == (400, "close")
+        assert _resposta_crua(local, "abc") == (400, "close")
+        assert _resposta_crua(local, 64 * 1024 * 1024) == (413, "close")
+
+
+def test_cliente_nao_carrega_a_configuracao_do_motor_local(monkeypatch):
+    def proibido(*args, **kwargs):
+        raise AssertionError("o cliente não deve ler o limiar.json local")
+
+    monkeypatch.setattr(motor_reconhecimento, "carregar_limiar", proibido)
+    cliente = ClienteReconhecimento("http://127.0.0.1:1")
+    assert cliente.galeria is None and cliente.pronto()